@@ -1,42 +1,376 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Request, Response, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.formparsers import MultiPartParser, MultiPartException
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, monitoring
+from pymongo.errors import DuplicateKeyError, OperationFailure
 import os
+import asyncio
 import logging
+import random
+import time
+import math
+import bisect
+import threading
+import contextvars
+import cProfile
+import string
+import textwrap
 import base64
 from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import uuid
-from datetime import datetime
+import hashlib
+import json
+import orjson
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from dataclasses import dataclass, field
+from contextlib import asynccontextmanager, contextmanager
 from emergentintegrations.llm.openai.image_generation import OpenAIImageGeneration
 from emergentintegrations.llm.chat import LlmChat, UserMessage, ImageContent
-from openai import OpenAI
 import io
 from io import BytesIO
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFont, ImageOps
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Metrics
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+PROVIDER_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 180)
+BYTE_BUCKETS = tuple(1024 * 4 ** power for power in range(9))  # 1 KiB .. 64 MiB
+TOKEN_BUCKETS = tuple(64 * 2 ** power for power in range(8))  # 64 .. 8192 tokens
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_metric_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in labels.items()) + "}"
+
+def format_metric_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic counter per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in values.items():
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in series.items():
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", {**labels, "le": format_metric_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+class CallbackMetric:
+    """Gauge or counter whose samples are read from existing stats when scraped"""
+
+    def __init__(self, name: str, help_text: str, kind: str, collect):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.collect = collect  # () -> iterable of (labels dict, value)
+
+    def samples(self):
+        for labels, value in self.collect():
+            yield self.name, labels, value
+
+class MetricsRegistry:
+    """In-process metrics rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: tuple = ()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def callback(self, name: str, help_text: str, kind: str, collect) -> CallbackMetric:
+        return self.register(CallbackMetric(name, help_text, kind, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                for name, labels, value in metric.samples():
+                    lines.append(f"{name}{format_metric_labels(labels)} {format_metric_value(value)}")
+            except Exception as e:
+                logging.error(f"Failed to collect metric {metric.name}: {str(e)}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+http_request_duration = metrics.histogram(
+    "http_request_duration_seconds", "Time to answer an HTTP request, by route template",
+    ("method", "route", "status"),
+)
+tryon_stage_duration = metrics.histogram(
+    "tryon_stage_duration_seconds", "Time spent in each internal stage of a try-on", ("stage",),
+)
+provider_request_duration = metrics.histogram(
+    "provider_request_duration_seconds", "Time for one image provider call, by outcome",
+    ("provider", "outcome"), buckets=PROVIDER_BUCKETS,
+)
+provider_requests = metrics.counter(
+    "provider_requests_total", "Image provider calls by outcome (success, failure, timeout, cancelled, skipped)",
+    ("provider", "outcome"),
+)
+provider_fallbacks = metrics.counter(
+    "provider_fallbacks_total", "Times a try-on moved on to a lower priority provider", ("provider",),
+)
+payload_size = metrics.histogram(
+    "tryon_payload_bytes", "Size of request bodies and images flowing through try-on generation",
+    ("kind",), buckets=BYTE_BUCKETS,
+)
+prompt_size = metrics.histogram(
+    "prompt_estimated_tokens", "Estimated tokens in each rendered prompt, by template",
+    ("template",), buckets=TOKEN_BUCKETS,
+)
+mongo_command_duration = metrics.histogram(
+    "mongo_command_duration_seconds", "MongoDB command round trips as reported by the driver",
+    ("command", "collection", "outcome"),
+)
+
+# In-process caching
+class BoundedLRU:
+    """Least recently used mapping bounded by entry count and optionally by total size.
+
+    ``size(value)`` estimates what an entry holds; a value larger than ``max_size`` on its
+    own is not stored. Entries pushed out to make room are counted in ``evictions``.
+    """
+
+    def __init__(self, max_entries: int, max_size: Optional[int] = None, size=None):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.size = size or (lambda value: 0)
+        self.total_size = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, size)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """Value for ``key``, marking it most recently used"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value, size: Optional[int] = None):
+        size = self.size(value) if size is None else size
+        self.pop(key)
+        if self.max_size is not None and size > self.max_size:
+            return
+        self._entries[key] = (value, size)
+        self.total_size += size
+        while len(self._entries) > self.max_entries or (self.max_size is not None and self.total_size > self.max_size):
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.total_size -= evicted_size
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return default
+        self.total_size -= entry[1]
+        return entry[0]
+
+    def clear(self):
+        self._entries.clear()
+        self.total_size = 0
+
+class SingleFlight:
+    """Concurrent calls for the same key share one run of ``load``.
+
+    The shared run is shielded, so a caller that is cancelled does not cancel it for the
+    others; it is forgotten once it finishes, and the next call starts a fresh one.
+    """
+
+    def __init__(self):
+        self._running = {}
+
+    def __len__(self) -> int:
+        return len(self._running)
+
+    def __contains__(self, key) -> bool:
+        return key in self._running
+
+    async def run(self, key, load):
+        """Result of ``await load()``, joining a run already in flight for ``key``"""
+        running = self._running.get(key)
+        if running is None:
+            running = self._running[key] = asyncio.ensure_future(load())
+            running.add_done_callback(lambda _: self._running.pop(key, None))
+        return await asyncio.shield(running)
+
+# Request timing
+class RequestTiming:
+    """Spans recorded while handling one request, reported in its Server-Timing header"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = {}  # Span name -> [total seconds, count], poses of a batch add up
+
+    def add(self, name: str, seconds: float):
+        span = self.spans.setdefault(name, [0.0, 0])
+        span[0] += seconds
+        span[1] += 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        entries = [
+            f"{name};dur={total * 1000:.1f}" + (f';desc="{count}x"' if count > 1 else "")
+            for name, (total, count) in self.spans.items()
+        ]
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(entries)
+
+# Set per request by the instrumentation middleware; tasks spawned by the request inherit it
+current_request_timing = contextvars.ContextVar("current_request_timing", default=None)
+
+def record_span(name: str, seconds: float):
+    timing = current_request_timing.get()
+    if timing is not None:
+        timing.add(name, seconds)
+
+@contextmanager
+def stage_timer(stage: str):
+    """Record the duration of one try-on stage in the stage histogram and the request's spans"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        tryon_stage_duration.observe(elapsed, stage=stage)
+        record_span(stage, elapsed)
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Feeds driver command events into mongo_command_duration_seconds (called from driver threads)"""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        if isinstance(collection, str):
+            self._collections[(event.connection_id, event.request_id)] = collection
+
+    def _finish(self, event, outcome: str):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        mongo_command_duration.observe(
+            event.duration_micros / 1_000_000, command=event.command_name, collection=collection, outcome=outcome
+        )
+
+    def succeeded(self, event):
+        self._finish(event, "success")
+
+    def failed(self, event):
+        self._finish(event, "failure")
+
+mongo_command_metrics = MongoCommandMetrics()
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[mongo_command_metrics])
 db = client[os.environ['DB_NAME']]
 
 # Initialize OpenAI Image Generation
 api_key = os.environ.get('EMERGENT_LLM_KEY')
-if api_key and api_key != 'your_api_key_here':
-    image_gen = OpenAIImageGeneration(api_key=api_key)
-    # Also initialize direct OpenAI client for image editing
-    openai_client = OpenAI(api_key=api_key)
-else:
-    image_gen = None
-    openai_client = None
+if not api_key or api_key == 'your_api_key_here':
     logging.warning("EMERGENT_LLM_KEY not properly configured - AI image generation will use mock responses")
 
+# Provider HTTP clients
+class ProviderClients:
+    """Provider clients created at startup and dropped at shutdown rather than at import.
+
+    The Emergent wrappers open and pool their own connections, so there is no shared
+    transport to tune or warm up here.
+    """
+
+    def __init__(self):
+        self.image_gen: Optional[OpenAIImageGeneration] = None
+
+    def start(self):
+        if api_key and api_key != 'your_api_key_here':
+            self.image_gen = OpenAIImageGeneration(api_key=api_key)
+
+    async def close(self):
+        self.image_gen = None
+
+provider_clients = ProviderClients()
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -70,6 +404,9 @@ class SareeItemCreate(BaseModel):
     color: str
     pattern: str
 
+VALID_POSES = ["front", "side"]  # Back view disabled per user request
+VALID_BLOUSES = ["traditional", "modern", "sleeveless", "full_sleeve"]
+
 class TryOnRequest(BaseModel):
     saree_body_base64: Optional[str] = None
     saree_pallu_base64: Optional[str] = None
@@ -79,11 +416,28 @@ class TryOnRequest(BaseModel):
     blouse_style: str = "traditional"  # "traditional", "modern", "sleeveless", "full_sleeve"
     model_type: str = "indian_woman"  # Type of AI model to generate
     session_id: Optional[str] = None  # Session ID for maintaining model consistency
+    # Ids from POST /api/assets, used for components not sent inline
+    saree_body_asset_id: Optional[str] = None
+    saree_pallu_asset_id: Optional[str] = None
+    saree_border_asset_id: Optional[str] = None
+
+# Inline component field -> the asset id field that can stand in for it
+TRYON_ASSET_FIELDS = {
+    "saree_body_base64": "saree_body_asset_id",
+    "saree_pallu_base64": "saree_pallu_asset_id",
+    "saree_border_base64": "saree_border_asset_id",
+}
+
+class BatchTryOnRequest(TryOnRequest):
+    poses: List[str] = ["front", "side"]  # Rendered concurrently under one session_id, taking turns on its chat
 
 class TryOnResult(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    result_image_base64: str
+    result_image_base64: Optional[str] = None  # Only inline on legacy documents
+    result_image_ref: Optional[str] = None  # Blob store digest of the result image
+    result_content_type: Optional[str] = None
+    result_derivatives: Optional[dict] = None  # Resized WebP/JPEG variants, see ImageDerivativeIndex
     pose_style: str
     blouse_style: str
     saree_details: dict
@@ -94,435 +448,2610 @@ class FavoriteTryOn(BaseModel):
     tryon_id: str
     user_id: str
 
-# Routes
-@api_router.get("/")
-async def root():
-    return {"message": "Saree Virtual Try-On API Ready"}
+class BulkFavoritesRequest(BaseModel):
+    tryon_ids: List[str] = Field(..., min_length=1, max_length=500)
+    user_id: Optional[str] = None  # Remove only touches this user's try-ons; add never changes owners
 
-@api_router.post("/status", response_model=StatusCheck)
-async def create_status_check(input: StatusCheckCreate):
-    status_dict = input.dict()
-    status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
-    return status_obj
+# List serialization
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+LIST_BATCH_SIZE = int(os.environ.get('LIST_BATCH_SIZE', '100'))
+LIST_STREAM_THRESHOLD = int(os.environ.get('LIST_STREAM_THRESHOLD', str(1024 * 1024)))
 
-@api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+def model_document(model, document: dict) -> dict:
+    """``document`` laid out as ``model(**document)`` serializes, without validating it again.
 
-# Saree Catalog APIs
-@api_router.post("/saree-catalog", response_model=SareeItem)
-async def add_saree_to_catalog(saree: SareeItemCreate):
-    saree_obj = SareeItem(**saree.dict())
-    result = await db.saree_catalog.insert_one(saree_obj.dict())
-    return saree_obj
+    Only for documents this service wrote from ``model`` itself; one missing a required field
+    still goes through the model so it fails the way it always has.
+    """
+    fields = {}
+    for name, info in model.model_fields.items():
+        if name in document:
+            fields[name] = document[name]
+        elif info.is_required():
+            return model(**document).dict()
+        else:
+            fields[name] = info.get_default(call_default_factory=True)
+    return fields
 
-@api_router.get("/saree-catalog", response_model=List[SareeItem])
-async def get_saree_catalog():
-    sarees = await db.saree_catalog.find().to_list(1000)
-    return [SareeItem(**saree) for saree in sarees]
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
 
-@api_router.get("/saree-catalog/{category}")
-async def get_sarees_by_category(category: str):
-    sarees = await db.saree_catalog.find({"category": category}).to_list(1000)
-    return [SareeItem(**saree) for saree in sarees]
+async def encode_documents(cursor, model, ndjson: bool = False, prepare=None):
+    """Yield a JSON array (or NDJSON lines) of ``model`` documents, one chunk per cursor batch.
 
-# Virtual Try-On API
-@api_router.post("/virtual-tryon")
-async def create_virtual_tryon(request: TryOnRequest):
-    try:
-        logging.info(f"Starting virtual try-on process for pose: {request.pose_style}")
-        
-        # Get the result image base64
-        result_image_base64 = await process_virtual_tryon(request)
-        
-        # Create try-on result
-        tryon_result = TryOnResult(
-            result_image_base64=result_image_base64,
-            pose_style=request.pose_style,
-            blouse_style=request.blouse_style,
-            saree_details={
-                "has_body": bool(request.saree_body_base64),
-                "has_pallu": bool(request.saree_pallu_base64),
-                "has_border": bool(request.saree_border_base64),
-                "saree_item_id": request.saree_item_id
-            }
-        )
-        
-        # Save to database
-        await db.virtual_tryons.insert_one(tryon_result.dict())
-        
-        logging.info("Virtual try-on completed successfully")
-        return {
-            "id": tryon_result.id,
-            "result_image_base64": result_image_base64,
-            "pose_style": request.pose_style,
-            "blouse_style": request.blouse_style,
-            "message": "Virtual try-on completed successfully"
-        }
-        
-    except Exception as e:
-        logging.error(f"Error in virtual try-on: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Virtual try-on failed: {str(e)}")
+    The array bytes match what FastAPI renders for ``List[model]``. ``prepare`` may rewrite
+    each batch of raw documents before it is encoded.
+    """
+    async def encode(batch):
+        if prepare:
+            batch = await prepare(batch)
+        return [orjson.dumps(model_document(model, document)) for document in batch]
+    
+    started = False
+    batch = []
+    async for document in cursor:
+        batch.append(document)
+        if len(batch) < LIST_BATCH_SIZE:
+            continue
+        encoded = await encode(batch)
+        batch = []
+        if ndjson:
+            yield b"\n".join(encoded) + b"\n"
+        else:
+            yield (b"," if started else b"[") + b",".join(encoded)
+        started = True
+    
+    encoded = await encode(batch) if batch else []
+    if ndjson:
+        if encoded:
+            yield b"\n".join(encoded) + b"\n"
+    elif encoded:
+        yield (b"," if started else b"[") + b",".join(encoded) + b"]"
+    else:
+        yield b"]" if started else b"[]"
 
+async def render_documents(cursor, model, prepare=None) -> bytes:
+    """Whole JSON array body of ``model`` documents, for responses that get cached"""
+    return b"".join([chunk async for chunk in encode_documents(cursor, model, prepare=prepare)])
 
-async def analyze_user_photo(user_photo_base64: str) -> str:
-    """Analyze user photo to extract characteristics for virtual try-on"""
-    if not user_photo_base64:
-        return "- Indian woman with medium complexion\n- Natural features and professional appearance"
-    
-    # This is a simplified analysis - in a production app, you'd use computer vision
-    # For now, we'll return a generic but detailed description
-    return """- Indian woman with natural features and warm complexion
-- Professional appearance suitable for saree modeling
-- Appropriate body proportions for traditional Indian attire
-- Natural pose and confident demeanor"""
+async def stream_documents(request: Request, cursor, model, prepare=None) -> Response:
+    """``model`` documents straight from ``cursor`` as JSON, or as NDJSON when asked for.
 
-async def analyze_saree_components(body_base64: str, pallu_base64: str, border_base64: str) -> str:
-    """Analyze saree components to extract design details"""
-    details = []
-    
-    if body_base64:
-        details.append("- Main saree fabric with intricate traditional patterns")
-        details.append("- Rich texture and authentic Indian craftsmanship")
-    
-    if pallu_base64:
-        details.append("- Decorative pallu with ornate designs and detailing")
-        details.append("- Traditional pallu styling meant to drape over the shoulder")
+    Bodies up to ``LIST_STREAM_THRESHOLD`` bytes go out as a plain response; streaming has a
+    per-response cost that only pays off for big lists.
+    """
+    ndjson = wants_ndjson(request)
+    media_type = NDJSON_MEDIA_TYPE if ndjson else "application/json"
+    chunks = encode_documents(cursor, model, ndjson=ndjson, prepare=prepare)
     
-    if border_base64:
-        details.append("- Elaborate border work with traditional motifs")
-        details.append("- Contrasting border design that complements the main fabric")
+    # Buffering until the threshold also means query errors on small lists still become HTTP errors
+    buffered = []
+    size = 0
+    async for chunk in chunks:
+        buffered.append(chunk)
+        size += len(chunk)
+        if size > LIST_STREAM_THRESHOLD:
+            break
+    else:
+        return Response(b"".join(buffered), media_type=media_type)
     
-    if not details:
-        details = [
-            "- Traditional saree with classic Indian patterns",
-            "- Elegant fabric suitable for formal occasions",
-            "- Authentic Indian craftsmanship and styling"
-        ]
+    async def body():
+        for chunk in buffered:
+            yield chunk
+        try:
+            async for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            logging.error(f"Failed while streaming {model.__name__} list: {str(e)}")
+            raise
     
-    return "\n".join(details)
+    return StreamingResponse(body(), media_type=media_type)
 
-async def generate_mock_tryon_image(request: TryOnRequest):
-    """Generate a mock try-on image for testing when API key is not available"""
-    logging.info(f"Generating mock try-on image for pose: {request.pose_style}, blouse: {request.blouse_style}")
-    
-    # Create a simple colored image as mock result with consistent dimensions
-    width, height = 1024, 1536  # 2:3 aspect ratio for consistency
-    
-    # Choose color based on pose style
-    colors = {
-        "front": (255, 100, 100),  # Red
-        "side": (100, 255, 100)    # Green  
+# Blob storage
+def sniff_image_type(data: bytes) -> str:
+    """Content type of an image from its magic bytes"""
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return "image/png"
+    if data.startswith(b'\xff\xd8\xff'):
+        return "image/jpeg"
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return "image/webp"
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return "image/gif"
+    return "application/octet-stream"
+
+class BlobStore:
+    """Content-addressed filesystem store for raw image bytes.
+
+    Blobs are named by the SHA-256 of their content, so identical images are stored once
+    and a blob never changes after it is written.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def _write(self, data: bytes, overwrite: bool = False) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        if path.exists() and not overwrite:
+            return digest
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary name first so readers never see a partial blob
+        tmp_path = path.with_name(f"{digest}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        return digest
+
+    async def put(self, data: bytes, overwrite: bool = False) -> str:
+        return await asyncio.to_thread(self._write, data, overwrite)
+
+    async def get(self, digest: str) -> bytes:
+        return await asyncio.to_thread(self.path_for(digest).read_bytes)
+
+    async def put_base64(self, data_base64: str) -> str:
+        return await self.put(base64.b64decode(data_base64))
+
+    async def get_base64(self, digest: str) -> str:
+        return base64.b64encode(await self.get(digest)).decode('utf-8')
+
+    async def delete(self, digest: str):
+        await asyncio.to_thread(self.path_for(digest).unlink, missing_ok=True)
+
+BLOB_CHUNK_SIZE = 64 * 1024
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# A variant URL answered with the original must be revalidated, the derivative may land later
+FALLBACK_CACHE_CONTROL = "no-cache"
+
+def parse_byte_range(range_header: str, size: int):
+    """Resolve a single ``bytes=`` range to inclusive offsets, None if unsatisfiable"""
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    start_text, _, end_text = spec.strip().partition("-")
+    try:
+        if not start_text:
+            # Suffix range: the last N bytes
+            length = int(end_text)
+            if length <= 0:
+                return None
+            return max(size - length, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+def iter_file_range(path: Path, start: int, end: int):
+    with open(path, "rb") as blob_file:
+        blob_file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = blob_file.read(min(BLOB_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+async def blob_response(http_request: Request, digest: str, content_type: str, extra_headers: Optional[dict] = None) -> Response:
+    """Stream a blob with a strong ETag, immutable caching, conditional GET and Range support"""
+    etag = f'"{digest}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+        **(extra_headers or {}),
     }
     
-    color = colors.get(request.pose_style, (200, 200, 200))
-    
-    # Create mock image
-    img = Image.new('RGB', (width, height), color)
+    # Blobs are content-addressed, so a matching ETag means the client copy is current
+    if_none_match = http_request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
     
-    # Add some text to indicate it's a mock
+    path = blob_store.path_for(digest)
     try:
-        draw = ImageDraw.Draw(img)
-        
-        # Try to use default font
-        try:
-            font = ImageFont.load_default()
-        except:
-            font = None
-            
-        text = f"MOCK SAREE\n{request.pose_style.upper()}\n{request.blouse_style.upper()}"
-        
-        if font:
-            draw.text((50, height//2 - 30), text, fill=(255, 255, 255), font=font)
-        else:
-            draw.text((50, height//2 - 30), text, fill=(255, 255, 255))
-            
-    except Exception as e:
-        logging.warning(f"Could not add text to mock image: {e}")
+        size = (await asyncio.to_thread(path.stat)).st_size
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Image not found")
     
-    # Convert to base64
-    buffer = BytesIO()
-    img.save(buffer, format='PNG')
-    img_bytes = buffer.getvalue()
+    range_header = http_request.headers.get("range")
+    if_range = http_request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == etag):
+        byte_range = parse_byte_range(range_header, size)
+        if byte_range is None:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(iter_file_range(path, start, end), status_code=206, media_type=content_type, headers=headers)
     
-    return base64.b64encode(img_bytes).decode('utf-8')
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(iter_file_range(path, 0, size - 1), media_type=content_type, headers=headers)
 
-async def process_virtual_tryon(request: TryOnRequest):
-    """Process virtual try-on request and return base64 image"""
-    # Validate pose and blouse styles
-    valid_poses = ["front", "side"]  # Back view disabled per user request
-    valid_blouses = ["traditional", "modern", "sleeveless", "full_sleeve"]
-    
-    if request.pose_style not in valid_poses:
-        raise HTTPException(status_code=400, detail=f"Invalid pose_style. Must be one of: {valid_poses}")
-    
-    if request.blouse_style not in valid_blouses:
-        raise HTTPException(status_code=400, detail=f"Invalid blouse_style. Must be one of: {valid_blouses}")
-    
-    # Check if we have API key for real AI generation
-    if not api_key or api_key == 'your_api_key_here':
-        logging.info("Using mock AI generation due to missing API key")
-        return await generate_mock_tryon_image(request)
-    
-    # Prepare the prompt based on the pose style - Enhanced for consistency
-    pose_descriptions = {
-        "front": "front-facing pose with arms naturally by the sides, looking directly at camera - SAME MODEL as any previous poses in this session",
-        "side": "elegant side profile pose showing the saree draping, three-quarter turn - SAME MODEL with IDENTICAL appearance as any previous poses in this session"
-    }
-    
-    blouse_descriptions = {
-        "traditional": "traditional fitted blouse with short sleeves",
-        "modern": "modern stylish blouse with contemporary cut",
-        "sleeveless": "sleeveless blouse design",
-        "full_sleeve": "full sleeve blouse with elegant design"
-    }
-    
-    # Create comprehensive prompt for saree generation
-    saree_description = ""
-    if request.saree_item_id:
-        # Get saree from catalog
-        saree_item = await db.saree_catalog.find_one({"id": request.saree_item_id})
-        if saree_item:
-            saree_description = f"beautiful {saree_item['color']} saree with {saree_item['pattern']} pattern, {saree_item['description']}"
-    else:
-        saree_description = "beautiful traditional saree with intricate patterns and elegant border"
+blob_store = BlobStore(Path(os.environ.get('BLOB_STORE_DIR', str(ROOT_DIR / 'blob_store'))))
+
+# Image derivatives
+# Longest edge in pixels for each derivative size, None keeps the original dimensions
+IMAGE_DERIVATIVE_SIZES = {"thumb": 256, "medium": 768, "full": None}
+IMAGE_DERIVATIVE_FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+image_process_pool: Optional[ProcessPoolExecutor] = None
+
+async def run_in_image_pool(func, *args):
+    """Run CPU-bound Pillow work in the shared process pool, off the event loop"""
+    global image_process_pool
+    if image_process_pool is None:
+        # Workers are forked; importing Pillow's plugins lazily inside one can deadlock on an
+        # import lock another thread held at fork time, so load them all beforehand
+        Image.init()
+        image_process_pool = ProcessPoolExecutor(
+            max_workers=int(os.environ.get('IMAGE_POOL_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))
+        )
+    return await asyncio.get_running_loop().run_in_executor(image_process_pool, func, *args)
+
+def render_image_derivatives(image_bytes: bytes) -> dict:
+    """Encode every derivative size in every derivative format (runs in a worker process)"""
+    with Image.open(BytesIO(image_bytes)) as source:
+        source = ImageOps.exif_transpose(source)
+        if source.mode in ("RGBA", "LA") or (source.mode == "P" and "transparency" in source.info):
+            # Flatten transparency onto white, JPEG has no alpha channel
+            rgba = source.convert("RGBA")
+            base = Image.new("RGB", rgba.size, (255, 255, 255))
+            base.paste(rgba, mask=rgba.getchannel("A"))
+        else:
+            base = source.convert("RGB")
     
-    # Generate AI model with saree using Nano Banana API
+    derivatives = {}
+    for size, max_dimension in IMAGE_DERIVATIVE_SIZES.items():
+        image = base.copy()
+        if max_dimension:
+            image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        encoded = {}
+        for fmt, (pil_format, _, options) in IMAGE_DERIVATIVE_FORMATS.items():
+            buffer = BytesIO()
+            image.save(buffer, format=pil_format, **options)
+            encoded[fmt] = buffer.getvalue()
+        derivatives[size] = {"width": image.width, "height": image.height, "encoded": encoded}
+    return derivatives
+
+async def store_image_derivatives(image_bytes: bytes) -> Optional[dict]:
+    """Render derivatives of an image and store them next to the original in the blob store.
+
+    Returns ``{size: {"width", "height", "webp": digest, "jpeg": digest}}``, or None when the
+    image could not be processed so callers can still serve the original.
+    """
     try:
-        logging.info("Starting AI model generation with saree components using Nano Banana API...")
-        
-        # Initialize Gemini chat for image generation with consistent parameters
-        # Use provided session_id for consistency across multiple poses
-        session_id = request.session_id or f"tryon_{uuid.uuid4()}"
-        
-        # Enhanced system message for better consistency
-        enhanced_system_message = f"""You are an expert fashion AI that can generate realistic models wearing sarees. You can incorporate uploaded saree designs into photorealistic fashion photography. Always generate images with consistent dimensions and quality.
-
-CRITICAL SESSION CONSISTENCY RULES (Session: {session_id}):
-1. MANDATORY: If this session has generated images before, you MUST maintain EXACTLY the same model characteristics
-2. HAIR CONSISTENCY (CRITICAL): Keep IDENTICAL hairstyle, hair length, hair color, hair texture, and hair accessories across ALL poses
-   - If hair is in a bun, keep the SAME bun style in all poses
-   - If hair has flowers or accessories, keep them in the EXACT same positions
-   - Hair should look like it's the same person photographed seconds apart, not restyled
-   - NO changes to hair styling, length, or accessories between poses
-3. FACIAL FEATURES (CRITICAL): Maintain EXACT same facial structure, skin tone, eye shape, nose, lips, and facial expressions
-4. SAME PHOTOGRAPHY SESSION: This should look like continuous photos taken in the same 5-minute session
-5. SAREE CONSISTENCY: Keep identical saree draping patterns and blouse design
-6. LIGHTING: Use exactly the same studio lighting setup for all poses
-7. BACKGROUND: Keep identical neutral background across all images"""
-        
-        chat = LlmChat(
-            api_key=api_key, 
-            session_id=session_id, 
-            system_message=enhanced_system_message
+        rendered = await run_in_image_pool(render_image_derivatives, image_bytes)
+        derivatives = {}
+        for size, derivative in rendered.items():
+            entry = {"width": derivative["width"], "height": derivative["height"]}
+            for fmt, data in derivative["encoded"].items():
+                entry[fmt] = await blob_store.put(data)
+            derivatives[size] = entry
+        return derivatives
+    except Exception as e:
+        logging.warning(f"Could not render image derivatives: {e}")
+        return None
+
+class ImageDerivativeIndex:
+    """Derivative maps keyed by the content digest of the original image.
+
+    Identical images, such as result-cache hits and the memoized mock renders, share one set
+    of derivatives, so each distinct image is rendered once. The maps live in a MongoDB
+    collection with a bounded in-memory LRU in front of it.
+    """
+
+    def __init__(self, collection, memory_items: int):
+        self.collection = collection
+        self.memory_items = memory_items
+        self._memory = BoundedLRU(memory_items)
+        self._rendering = SingleFlight()
+        self._background = set()
+        self.stats = {"hits": 0, "misses": 0, "renders": 0}
+
+    async def get(self, digest: str) -> Optional[dict]:
+        """Stored derivatives of the image with this digest, None until they are rendered"""
+        if digest in self._memory:
+            self.stats["hits"] += 1
+            return self._memory.get(digest)
+        entry = await self.collection.find_one({"_id": digest}, {"derivatives": 1})
+        if not entry:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        self._memory.put(digest, entry["derivatives"])
+        return entry["derivatives"]
+
+    async def ensure(self, digest: str, image_bytes: bytes) -> Optional[dict]:
+        """Derivatives for the image, rendering them only if this digest has none yet"""
+        derivatives = await self.get(digest)
+        if derivatives is not None:
+            return derivatives
+        # Concurrent requests for the same new image share one render
+        return await self._rendering.run(digest, lambda: self._render(digest, image_bytes))
+
+    async def _render(self, digest: str, image_bytes: bytes) -> Optional[dict]:
+        self.stats["renders"] += 1
+        derivatives = await store_image_derivatives(image_bytes)
+        if derivatives is None:
+            return None
+        await self.collection.update_one(
+            {"_id": digest},
+            {"$set": {"derivatives": derivatives, "created_at": datetime.utcnow()}},
+            upsert=True
         )
-        chat.with_model("gemini", "gemini-2.5-flash-image-preview").with_params(
-            modalities=["image", "text"],
-            # Add consistent image generation parameters
-            image_generation_config={
-                "width": 1024,
-                "height": 1536,  # 2:3 aspect ratio for portrait fashion photography
-                "quality": "high",
-                "style": "photorealistic"
+        self._memory.put(digest, derivatives)
+        return derivatives
+
+    def ensure_later(self, digest: str, image_bytes: bytes):
+        """Render derivatives off the request path; readers serve the original until they land"""
+        if digest in self._memory or digest in self._rendering:
+            return
+        task = asyncio.create_task(self.ensure(digest, image_bytes))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "memory_entries": len(self._memory), "rendering": len(self._rendering)}
+
+image_derivatives = ImageDerivativeIndex(
+    db.image_derivatives,
+    memory_items=int(os.environ.get('IMAGE_DERIVATIVE_INDEX_ITEMS', '4096'))
+)
+
+def select_image_variant(http_request: Request, original_ref: str, original_type: str,
+                         derivatives: Optional[dict], size: Optional[str], fmt: Optional[str]):
+    """Pick the blob to serve for a requested size/format, falling back to the original.
+
+    Returns ``(digest, content_type, headers)`` where headers carries ``Vary: Accept`` when
+    the format was negotiated from the Accept header, and a revalidating Cache-Control when
+    the original stands in for a derivative that is not rendered (yet).
+    """
+    if size is None:
+        return original_ref, original_type, {}
+    if size not in IMAGE_DERIVATIVE_SIZES:
+        raise HTTPException(status_code=400, detail=f"Invalid size. Must be one of: {list(IMAGE_DERIVATIVE_SIZES)}")
+    if fmt is not None and fmt not in IMAGE_DERIVATIVE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Must be one of: {list(IMAGE_DERIVATIVE_FORMATS)}")
+    
+    headers = {} if fmt is not None else {"Vary": "Accept"}
+    derivative = (derivatives or {}).get(size)
+    if not derivative:
+        return original_ref, original_type, {**headers, "Cache-Control": FALLBACK_CACHE_CONTROL}
+    if fmt is None:
+        fmt = "webp" if "image/webp" in http_request.headers.get("accept", "") else "jpeg"
+    return derivative[fmt], IMAGE_DERIVATIVE_FORMATS[fmt][1], headers
+
+# Input image normalization
+SUPPORTED_INPUT_IMAGE_TYPES = {"image/jpeg", "image/png", "image/webp", "image/gif"}
+
+def read_image_header(data: bytes) -> tuple:
+    """``(width, height)`` from the image header; Pillow defers decoding pixel data until load()"""
+    with Image.open(BytesIO(data)) as image:
+        return image.size
+
+def normalize_input_image(image_bytes: bytes, max_dimension: int, quality: int) -> bytes:
+    """Downscale to ``max_dimension`` and re-encode as a metadata-free JPEG (runs in a worker process).
+
+    An image that needs no downscaling is returned as uploaded when the JPEG would not be smaller.
+    """
+    with Image.open(BytesIO(image_bytes)) as source:
+        downscaled = max(source.size) > max_dimension
+        # Let the JPEG decoder scale down by a power of two while decoding
+        source.draft("RGB", (max_dimension, max_dimension))
+        source = ImageOps.exif_transpose(source)
+        if source.mode in ("RGBA", "LA") or (source.mode == "P" and "transparency" in source.info):
+            rgba = source.convert("RGBA")
+            image = Image.new("RGB", rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        else:
+            image = source.convert("RGB")
+    
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    buffer = BytesIO()
+    # No exif/icc_profile arguments, so none of the source metadata is written back
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    if not downscaled and buffer.tell() >= len(image_bytes):
+        return image_bytes
+    return buffer.getvalue()
+
+class InputImageNormalizer:
+    """Shrinks uploaded saree component images before they are sent to a provider.
+
+    Uploads are checked against the byte and pixel limits from their size and header
+    alone, then downscaled and re-encoded in the image process pool. Results are memoized
+    by a digest of the uploaded bytes, so the same upload across poses and retries is
+    processed once.
+    """
+
+    def __init__(self, max_bytes: int, max_pixels: int, max_dimension: int, quality: int, memo_items: int):
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.max_dimension = max_dimension
+        self.quality = quality
+        self.memo_items = memo_items
+        self._memo = BoundedLRU(memo_items)
+        self._normalizing = SingleFlight()
+        self.stats = {
+            "requests": 0,
+            "images": 0,
+            "memo_hits": 0,
+            "rejected": 0,
+            "bytes_in": 0,
+            "bytes_out": 0,
+        }
+
+    def _decode(self, component: str, image_base64: str) -> bytes:
+        """Decoded base64 upload, refusing oversized or non-image payloads before decoding them"""
+        # Base64 carries 3 bytes per 4 characters, so the decoded size is known up front
+        if len(image_base64) * 3 // 4 > self.max_bytes:
+            raise HTTPException(status_code=413, detail=f"{component} image exceeds {self.max_bytes} bytes")
+        try:
+            header = base64.b64decode(image_base64[:64], validate=False)
+        except Exception:
+            header = b""
+        if sniff_image_type(header) not in SUPPORTED_INPUT_IMAGE_TYPES:
+            raise HTTPException(status_code=400, detail=f"{component} image is not a JPEG, PNG, WebP or GIF file")
+        # Not validated: clients wrap long base64 at 76 columns, and decoding skips the line breaks
+        try:
+            return base64.b64decode(image_base64)
+        except Exception:
+            raise HTTPException(status_code=400, detail=f"{component} image is not valid base64")
+
+    def _inspect(self, component: str, data: bytes):
+        """Raise HTTPException when an upload is too large or not a readable image"""
+        if len(data) > self.max_bytes:
+            raise HTTPException(status_code=413, detail=f"{component} image exceeds {self.max_bytes} bytes")
+        if sniff_image_type(data[:16]) not in SUPPORTED_INPUT_IMAGE_TYPES:
+            raise HTTPException(status_code=400, detail=f"{component} image is not a JPEG, PNG, WebP or GIF file")
+        try:
+            width, height = read_image_header(data)
+        except Exception:
+            raise HTTPException(status_code=400, detail=f"{component} image could not be read")
+        if width * height > self.max_pixels:
+            raise HTTPException(status_code=413, detail=f"{component} image is {width}x{height}, larger than {self.max_pixels} pixels")
+
+    async def _normalized(self, data: bytes) -> bytes:
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self._memo:
+            self.stats["memo_hits"] += 1
+            return self._memo.get(digest)
+        
+        # Concurrent requests carrying the same upload share one pass through the pool
+        normalized = await self._normalizing.run(
+            digest, lambda: run_in_image_pool(normalize_input_image, data, self.max_dimension, self.quality)
+        )
+        self._memo.put(digest, normalized)
+        return normalized
+
+    async def normalize_request(self, request: TryOnRequest) -> TryOnRequest:
+        """Copy of the request with every uploaded component normalized"""
+        components = {
+            field_name: getattr(request, field_name)
+            for field_name in TRYON_ASSET_FIELDS
+            if getattr(request, field_name)
+        }
+        if not components:
+            return request
+        
+        try:
+            uploads = {
+                field_name: await asyncio.to_thread(self._decode, field_name.split("_")[1], image_base64)
+                for field_name, image_base64 in components.items()
             }
+        except HTTPException:
+            self.stats["rejected"] += 1
+            raise
+        return request.copy(update=await self.normalize_uploads(uploads))
+
+    async def normalize_uploads(self, uploads: dict) -> dict:
+        """Map of request field name to raw upload bytes -> the same fields as normalized base64"""
+        normalized = await self.normalize_images(uploads)
+        return {field_name: base64.b64encode(data).decode('utf-8') for field_name, data in normalized.items()}
+
+    async def normalize_images(self, uploads: dict) -> dict:
+        """Map of request field name to raw upload bytes -> the same fields as normalized bytes"""
+        # Validate everything first so a bad upload never costs a trip through the pool
+        try:
+            for field_name, data in uploads.items():
+                await asyncio.to_thread(self._inspect, field_name.split("_")[1], data)
+        except HTTPException:
+            self.stats["rejected"] += 1
+            raise
+        try:
+            normalized = await asyncio.gather(*(self._normalized(data) for data in uploads.values()))
+        except Exception as e:
+            # Truncated or corrupt pixel data only shows up once the image is decoded
+            self.stats["rejected"] += 1
+            raise HTTPException(status_code=400, detail=f"Input image could not be decoded: {e}")
+        
+        bytes_in = sum(len(data) for data in uploads.values())
+        bytes_out = sum(len(data) for data in normalized)
+        for data in uploads.values():
+            payload_size.observe(len(data), kind="input_image")
+        for data in normalized:
+            payload_size.observe(len(data), kind="normalized_image")
+        self.stats["requests"] += 1
+        self.stats["images"] += len(uploads)
+        self.stats["bytes_in"] += bytes_in
+        self.stats["bytes_out"] += bytes_out
+        logging.info(f"Normalized {len(uploads)} input images: {bytes_in} -> {bytes_out} bytes (saved {bytes_in - bytes_out})")
+        
+        return dict(zip(uploads, normalized))
+
+    def snapshot(self) -> dict:
+        bytes_saved = self.stats["bytes_in"] - self.stats["bytes_out"]
+        return {
+            **self.stats,
+            "bytes_saved": bytes_saved,
+            "avg_bytes_saved_per_request": round(bytes_saved / self.stats["requests"]) if self.stats["requests"] else 0,
+            "memo_size": len(self._memo),
+            "max_dimension": self.max_dimension,
+            "quality": self.quality,
+        }
+
+input_image_normalizer = InputImageNormalizer(
+    max_bytes=int(os.environ.get('INPUT_IMAGE_MAX_BYTES', str(25 * 1024 * 1024))),
+    max_pixels=int(os.environ.get('INPUT_IMAGE_MAX_PIXELS', str(50_000_000))),
+    max_dimension=int(os.environ.get('INPUT_IMAGE_MAX_DIMENSION', '1536')),
+    quality=int(os.environ.get('INPUT_IMAGE_QUALITY', '85')),
+    memo_items=int(os.environ.get('INPUT_IMAGE_MEMO_ITEMS', '64')),
+)
+
+# Multipart uploads
+TRYON_UPLOAD_FILES = {"saree_body": "saree_body_base64", "saree_pallu": "saree_pallu_base64", "saree_border": "saree_border_base64"}
+TRYON_UPLOAD_FIELDS = ("pose_style", "blouse_style", "model_type", "saree_item_id", "session_id") + tuple(TRYON_ASSET_FIELDS.values())
+
+class UploadTooLarge(MultiPartException):
+    pass
+
+class LimitedMultiPartParser(MultiPartParser):
+    """Starlette's multipart parser with byte limits enforced while the body is still streaming.
+
+    File parts are spooled to temporary files as they arrive; a part or a body that grows past
+    its limit aborts parsing immediately instead of after the whole upload has been buffered.
+    """
+
+    def __init__(self, headers, stream, *, max_file_bytes: int, max_total_bytes: int, **kwargs):
+        super().__init__(headers, stream, **kwargs)
+        self.max_file_bytes = max_file_bytes
+        self.max_total_bytes = max_total_bytes
+        self._part_bytes = 0
+        self._total_bytes = 0
+
+    def on_part_begin(self) -> None:
+        super().on_part_begin()
+        self._part_bytes = 0
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        self._part_bytes += end - start
+        self._total_bytes += end - start
+        if self._total_bytes > self.max_total_bytes:
+            raise UploadTooLarge(f"Upload exceeds {self.max_total_bytes} bytes")
+        if self._current_part.file is not None and self._part_bytes > self.max_file_bytes:
+            raise UploadTooLarge(f"{self._current_part.field_name} exceeds {self.max_file_bytes} bytes")
+        super().on_part_data(data, start, end)
+
+async def read_multipart_upload(http_request: Request, max_file_bytes: int, max_total_bytes: int,
+                                max_files: int, max_fields: int):
+    """Parse a multipart upload, returning Starlette ``FormData`` with spooled files"""
+    content_type = http_request.headers.get("content-type", "")
+    if not content_type.startswith("multipart/form-data"):
+        raise HTTPException(status_code=415, detail="Expected multipart/form-data")
+    
+    # Refuse bodies that announce an oversized length before reading any of them
+    content_length = http_request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_total_bytes + 64 * 1024:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {max_total_bytes} bytes")
+    
+    parser = LimitedMultiPartParser(
+        http_request.headers, http_request.stream(),
+        max_file_bytes=max_file_bytes,
+        max_total_bytes=max_total_bytes,
+        max_files=max_files,
+        max_fields=max_fields,
+    )
+    try:
+        return await parser.parse()
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=e.message)
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+
+# Try-on assets
+class TryOnAssetStore:
+    """Saree component images uploaded once and referenced by id from try-on requests.
+
+    An asset is the normalized image stored under the SHA-256 of its bytes, so its id is also
+    the component digest used in result cache keys. Every request that references an asset
+    pushes its expiry back by ``ttl_seconds``; a cleanup loop deletes expired records and
+    their blobs. Cleanup moves a blob aside before deleting its record and puts it back if an
+    upload of the same image revived the record meanwhile, so a live record never loses
+    its blob.
+    """
+
+    def __init__(self, collection, blobs: BlobStore, ttl_seconds: int, cleanup_interval: float):
+        self.collection = collection
+        self.blobs = blobs
+        self.ttl_seconds = ttl_seconds
+        self.cleanup_interval = cleanup_interval
+        self._task = None
+        self.stats = {"created": 0, "reused": 0, "resolved": 0, "expired": 0}
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("id", unique=True)
+        await self.collection.create_index("expires_at")
+
+    @staticmethod
+    def referenced_ids(request: TryOnRequest) -> List[str]:
+        """Asset ids standing in for components the request does not carry inline"""
+        return [
+            getattr(request, asset_field)
+            for base64_field, asset_field in TRYON_ASSET_FIELDS.items()
+            if getattr(request, asset_field) and not getattr(request, base64_field)
+        ]
+
+    async def create(self, data: bytes) -> dict:
+        normalized = (await input_image_normalizer.normalize_images({"saree_asset": data}))["saree_asset"]
+        asset_id = hashlib.sha256(normalized).hexdigest()
+        content_type = sniff_image_type(normalized)
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.ttl_seconds)
+        
+        # Record the asset before writing its blob so cleanup never sees a blob without a record;
+        # clearing the deletion claim tells a running cleanup to keep the blob
+        result = await self.collection.update_one(
+            {"id": asset_id},
+            {
+                "$set": {"expires_at": expires_at, "last_used_at": now},
+                "$setOnInsert": {"id": asset_id, "content_type": content_type, "size": len(normalized), "created_at": now},
+                "$unset": {"deleting": ""},
+            },
+            upsert=True
         )
+        # Always written, an existing file may be one a running cleanup is about to move aside
+        await self.blobs.put(normalized, overwrite=True)
+        self.stats["created" if result.upserted_id is not None else "reused"] += 1
         
-        # Prepare image contents for saree components if available
-        image_contents = []
-        saree_components_text = ""
+        return {
+            "asset_id": asset_id,
+            "content_type": content_type,
+            "size": len(normalized),
+            "original_size": len(data),
+            "expires_at": expires_at
+        }
+
+    async def get(self, asset_id: str) -> Optional[dict]:
+        return await self.collection.find_one(
+            {"id": asset_id, "expires_at": {"$gt": datetime.utcnow()}},
+            {"_id": 0, "id": 1, "content_type": 1, "size": 1, "created_at": 1, "expires_at": 1}
+        )
+
+    async def touch(self, request: TryOnRequest):
+        """Check that every asset the request references exists and push back its expiry"""
+        asset_ids = set(self.referenced_ids(request))
+        if not asset_ids:
+            return
+        now = datetime.utcnow()
+        result = await self.collection.update_many(
+            {"id": {"$in": list(asset_ids)}, "expires_at": {"$gt": now}},
+            {"$set": {"expires_at": now + timedelta(seconds=self.ttl_seconds), "last_used_at": now}}
+        )
+        if result.matched_count < len(asset_ids):
+            raise HTTPException(status_code=404, detail="Unknown or expired asset id, upload the image again")
+
+    async def resolve(self, request: TryOnRequest) -> TryOnRequest:
+        """Copy of the request with asset references replaced by the stored images"""
+        updates = {}
+        for base64_field, asset_field in TRYON_ASSET_FIELDS.items():
+            asset_id = getattr(request, asset_field)
+            if not asset_id or getattr(request, base64_field):
+                continue
+            # Ids are SHA-256 digests; anything else must never reach the blob store path
+            if len(asset_id) != 64 or any(c not in "0123456789abcdef" for c in asset_id):
+                raise HTTPException(status_code=404, detail=f"Unknown asset id {asset_id}")
+            try:
+                updates[base64_field] = await self.blobs.get_base64(asset_id)
+            except FileNotFoundError:
+                raise HTTPException(status_code=404, detail=f"Asset {asset_id} has expired, upload the image again")
+        if not updates:
+            return request
+        self.stats["resolved"] += len(updates)
+        return request.copy(update=updates)
+
+    async def cleanup(self) -> int:
+        """Delete expired assets and their blobs, returning how many were removed"""
+        now = datetime.utcnow()
+        removed = 0
+        async for asset in self.collection.find({"expires_at": {"$lte": now}}, {"_id": 0, "id": 1}).limit(500):
+            if await self._remove(asset["id"], now):
+                removed += 1
+        self.stats["expired"] += removed
+        return removed
+
+    async def _remove(self, asset_id: str, now: datetime) -> bool:
+        # Claim the record; a request that refreshed the asset in the meantime is left alone
+        token = uuid.uuid4().hex
+        claimed = await self.collection.update_one(
+            {"id": asset_id, "expires_at": {"$lte": now}},
+            {"$set": {"deleting": token}}
+        )
+        if not claimed.modified_count:
+            return False
         
-        if request.saree_body_base64:
-            image_contents.append(ImageContent(request.saree_body_base64))
-            saree_components_text += "Use the main saree fabric pattern from the first uploaded image. "
-            logging.info("Added saree body image for AI model generation")
-            
-        if request.saree_pallu_base64:
-            image_contents.append(ImageContent(request.saree_pallu_base64))
-            saree_components_text += "Use the decorative pallu design from the uploaded pallu image. "
-            logging.info("Added saree pallu image for AI model generation")
-            
-        if request.saree_border_base64:
-            image_contents.append(ImageContent(request.saree_border_base64))
-            saree_components_text += "Use the border pattern from the uploaded border image. "
-            logging.info("Added saree border image for AI model generation")
-        
-        # Create detailed prompt for AI model generation
-        if image_contents:
-            # Use uploaded saree components
-            model_generation_prompt = f"""
-            VIRTUAL SAREE MODEL GENERATION (Session: {session_id}):
-            
-            Create a photorealistic image of a beautiful Indian woman wearing a saree that incorporates the designs from the uploaded images.
-            
-            SPECIFIC REQUIREMENTS:
-            1. Generate an elegant Indian woman model with natural features and warm complexion
-            2. CONSISTENCY: If this is part of a multi-pose session, maintain the SAME MODEL appearance, facial features, skin tone, and body proportions
-            3. BLOUSE CONSISTENCY: Use EXACTLY the same blouse color and design across all poses - {blouse_descriptions[request.blouse_style]} blouse
-            4. HAIR & ACCESSORIES CONSISTENCY (ABSOLUTELY CRITICAL): 
-               - Maintain IDENTICAL hairstyle, hair length, hair color, and hair texture in BOTH poses
-               - Keep EXACTLY the same hair accessories (flowers, clips, ornaments) in the SAME positions
-               - If hair has braids or bun, maintain that EXACT pattern and style
-               - Hair should look like the same person photographed from different angles within 30 seconds
-               - NO variation in hair styling, length, or accessories between front and side view
-               - SAME FACE STRUCTURE: Keep identical facial features, skin tone, eye shape, nose, lips
-               - SAME PERSON: This must look like the same individual, not different people
-               - SAME SESSION: Both images should feel like they're from the same 5-minute photo shoot
-            5. {saree_components_text}
-            6. Position her in a {pose_descriptions[request.pose_style]} pose
-            7. SAREE DRAPING CONSISTENCY (ABSOLUTELY CRITICAL):
-               - Drape the saree authentically in traditional Indian style with proper pleats and pallu positioning
-               - Maintain PERFECTLY IDENTICAL pleating patterns and pallu fall across BOTH poses
-               - The pallu should drape in the EXACT same manner, just shown from different camera angles
-               - Keep the SAME saree length and how it touches the ground in both views
-               - IDENTICAL saree positioning: waist level, shoulder draping, pallu length must be exactly the same
-               - The saree should look like it hasn't moved or been adjusted between the two photos
-               - SAME BLOUSE FIT: Keep identical blouse positioning and fit in both poses
-            8. Combine all uploaded saree elements (fabric, pallu, border) naturally into one beautiful saree with IDENTICAL patterns
-            9. Professional fashion photography quality with studio lighting
-            10. Clean neutral background (light gray or white) to highlight the saree
-            11. Natural, elegant pose that showcases the saree beautifully
-            12. CONSISTENT HIGH RESOLUTION: Generate image in exactly 1024x1536 pixels (2:3 aspect ratio)
-            13. CONSISTENT QUALITY: High-definition photorealistic details with sharp focus
-            14. The saree should look well-fitted and naturally draped
-            15. Maintain authentic Indian saree draping traditions
-            16. SAME PHOTOGRAPHY SESSION FEEL: Ensure lighting, background, and MODEL CONSISTENCY across poses
-            17. CRITICAL CONSISTENCY CHECK: This should look like the SAME woman wearing the SAME saree with SAME hair and accessories, photographed from different angles within the same 30-second time frame
-            18. FINAL REQUIREMENT: Both images should be indistinguishable as the same person except for the camera angle - NO variations in appearance, styling, or setup allowed
-            
-            STYLE: High-end fashion photography, professional modeling, perfect lighting, sharp focus
-            """
-            
-            # Create message with saree component images
-            message = UserMessage(
-                text=model_generation_prompt,
-                file_contents=image_contents
+        path = self.blobs.path_for(asset_id)
+        aside = path.with_name(f"{asset_id}.{token}.deleted")
+        try:
+            await asyncio.to_thread(os.replace, path, aside)
+        except FileNotFoundError:
+            aside = None
+        
+        # Deletes nothing when a create of the same image cleared the claim
+        result = await self.collection.delete_one({"id": asset_id, "deleting": token})
+        if aside is not None:
+            if not result.deleted_count and not path.exists():
+                await asyncio.to_thread(os.replace, aside, path)
+            else:
+                await asyncio.to_thread(aside.unlink, missing_ok=True)
+        return bool(result.deleted_count)
+
+    def start(self):
+        self._task = asyncio.create_task(self._cleanup_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _cleanup_loop(self):
+        while True:
+            await asyncio.sleep(self.cleanup_interval)
+            try:
+                removed = await self.cleanup()
+                if removed:
+                    logging.info(f"Removed {removed} expired try-on assets")
+            except Exception as e:
+                logging.warning(f"Try-on asset cleanup failed: {e}")
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "ttl_seconds": self.ttl_seconds}
+
+tryon_assets = TryOnAssetStore(
+    db.tryon_assets,
+    BlobStore(Path(os.environ.get('ASSET_STORE_DIR', str(ROOT_DIR / 'asset_store')))),
+    ttl_seconds=int(os.environ.get('TRYON_ASSET_TTL_SECONDS', str(24 * 3600))),
+    cleanup_interval=float(os.environ.get('TRYON_ASSET_CLEANUP_INTERVAL', '600')),
+)
+
+@api_router.post("/assets", status_code=201)
+async def create_tryon_asset(http_request: Request):
+    """Store a saree component image once; try-on requests then pass its ``asset_id``"""
+    form = await read_multipart_upload(
+        http_request,
+        max_file_bytes=input_image_normalizer.max_bytes,
+        max_total_bytes=input_image_normalizer.max_bytes,
+        max_files=1,
+        max_fields=0,
+    )
+    try:
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Send the image as a multipart 'file' part")
+        data = await upload.read()
+    finally:
+        await form.close()
+    
+    asset = await tryon_assets.create(data)
+    logging.info(f"Stored try-on asset {asset['asset_id'][:12]}: {asset['original_size']} -> {asset['size']} bytes")
+    return asset
+
+@api_router.get("/assets/{asset_id}")
+async def get_tryon_asset(asset_id: str):
+    asset = await tryon_assets.get(asset_id)
+    if not asset:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return asset
+
+# Try-on result cache
+class TryOnResultCache:
+    """Two-tier cache of generated try-on images keyed by a digest of the normalized request.
+
+    The memory tier is an LRU bounded by the bytes of image data it holds (``memory_bytes``),
+    with ``memory_items`` only as a backstop against many tiny entries. The persistent tier
+    lives in MongoDB with a TTL index on ``expires_at`` and is trimmed to ``max_entries`` by
+    least recent use. Persistent entries reference their image in the blob store rather than
+    embedding it.
+    """
+
+    def __init__(self, collection, memory_items: int, memory_bytes: int, max_entries: int, ttl_seconds: int):
+        self.collection = collection
+        self.memory_items = memory_items
+        self.memory_bytes = memory_bytes
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory = BoundedLRU(memory_items, max_size=memory_bytes, size=len)
+        self.stats = {
+            "memory_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "memory_evictions": 0,
+            "persistent_evictions": 0,
+        }
+
+    @staticmethod
+    def _component_digest(component_base64: Optional[str]) -> Optional[str]:
+        if not component_base64:
+            return None
+        try:
+            data = base64.b64decode(component_base64, validate=False)
+        except Exception:
+            data = component_base64.encode('utf-8')
+        return hashlib.sha256(data).hexdigest()
+
+    def key_for(self, request: "TryOnRequest", generator: str) -> str:
+        """Digest of every request field that influences the generated image"""
+        # An asset id is the SHA-256 of the stored image, the same digest an inline copy would get
+        normalized = {
+            "v": 1,
+            "generator": generator,
+            "pose_style": request.pose_style,
+            "blouse_style": request.blouse_style,
+            "model_type": request.model_type,
+            "saree_item_id": request.saree_item_id,
+            "body": self._component_digest(request.saree_body_base64) or request.saree_body_asset_id,
+            "pallu": self._component_digest(request.saree_pallu_base64) or request.saree_pallu_asset_id,
+            "border": self._component_digest(request.saree_border_base64) or request.saree_border_asset_id,
+        }
+        payload = json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _remember(self, key: str, image_base64: str):
+        evictions = self._memory.evictions
+        self._memory.put(key, image_base64)
+        self.stats["memory_evictions"] += self._memory.evictions - evictions
+
+    async def get(self, key: str) -> Optional[str]:
+        if key in self._memory:
+            self.stats["memory_hits"] += 1
+            return self._memory.get(key)
+
+        now = datetime.utcnow()
+        try:
+            entry = await self.collection.find_one_and_update(
+                {"key": key, "expires_at": {"$gt": now}},
+                {"$set": {"last_used_at": now}},
+                projection={"_id": 0, "image_ref": 1, "result_image_base64": 1},
             )
-        else:
-            # Generate without uploaded components (using catalog or description)
-            model_generation_prompt = f"""
-            Create a photorealistic image of a beautiful Indian woman wearing a {saree_description} in a {pose_descriptions[request.pose_style]} (Session: {session_id}).
-            
-            REQUIREMENTS:
-            - Elegant Indian woman model with natural features and warm complexion
-            - CONSISTENCY: If this is part of a multi-pose session, maintain the SAME MODEL appearance, facial features, skin tone, and body proportions
-            - BLOUSE CONSISTENCY: Use EXACTLY the same blouse color and design - {blouse_descriptions[request.blouse_style]} blouse
-            - HAIR & ACCESSORIES CONSISTENCY (ABSOLUTELY CRITICAL): 
-              * Maintain IDENTICAL hairstyle, hair length, hair color, and hair texture in BOTH poses
-              * Keep EXACTLY the same hair accessories (flowers, clips, ornaments) in the SAME positions
-              * If hair has braids or bun, maintain that EXACT pattern and style
-              * Hair should look like the same person photographed from different angles within 30 seconds
-              * NO variation in hair styling, length, or accessories between front and side view
-              * SAME FACE STRUCTURE: Keep identical facial features, skin tone, eye shape, nose, lips
-              * SAME PERSON: This must look like the same individual, not different people
-            - SAREE DRAPING CONSISTENCY (ABSOLUTELY CRITICAL):
-              * Drape the saree authentically in traditional Indian style with proper pleats and pallu positioning
-              * Maintain PERFECTLY IDENTICAL pleating patterns and pallu fall across BOTH poses
-              * The pallu should drape in the EXACT same manner, just shown from different camera angles
-              * Keep the SAME saree length and how it touches the ground in both views
-              * IDENTICAL saree positioning: waist level, shoulder draping, pallu length must be exactly the same
-            - Professional fashion photography quality with studio lighting
-            - Clean neutral background to highlight the saree
-            - Natural, elegant pose that showcases the saree beautifully
-            - CONSISTENT DIMENSIONS: Generate image in exactly 1024x1536 pixels (2:3 aspect ratio)
-            - CONSISTENT QUALITY: High-definition photorealistic details with sharp focus
-            - The saree should look well-fitted and naturally draped
-            - SAME PHOTOGRAPHY SESSION FEEL: Ensure lighting, background, and MODEL CONSISTENCY across poses
-            - CRITICAL: This should look like the SAME woman wearing the SAME saree with SAME hair and accessories, photographed from different angles in the same session
+            if entry and entry.get("image_ref"):
+                image_base64 = await blob_store.get_base64(entry["image_ref"])
+            else:
+                image_base64 = entry.get("result_image_base64") if entry else None
+        except Exception as e:
+            logging.warning(f"Try-on cache lookup failed: {e}")
+            image_base64 = None
+
+        if not image_base64:
+            self.stats["misses"] += 1
+            return None
+
+        self.stats["persistent_hits"] += 1
+        self._remember(key, image_base64)
+        return image_base64
+
+    async def put(self, key: str, image_base64: str):
+        self._remember(key, image_base64)
+        self.stats["stores"] += 1
+
+        now = datetime.utcnow()
+        try:
+            image_ref = await blob_store.put_base64(image_base64)
+            await self.collection.update_one(
+                {"key": key},
+                {"$set": {
+                    "key": key,
+                    "image_ref": image_ref,
+                    "size": len(image_base64),
+                    "created_at": now,
+                    "last_used_at": now,
+                    "expires_at": now + timedelta(seconds=self.ttl_seconds),
+                }, "$unset": {"result_image_base64": ""}},
+                upsert=True,
+            )
+            await self._trim()
+        except Exception as e:
+            logging.warning(f"Try-on cache store failed: {e}")
+
+    async def _trim(self):
+        excess = await self.collection.count_documents({}) - self.max_entries
+        if excess <= 0:
+            return
+        stale = await self.collection.find({}, {"_id": 1}).sort("last_used_at", 1).to_list(excess)
+        result = await self.collection.delete_many({"_id": {"$in": [entry["_id"] for entry in stale]}})
+        self.stats["persistent_evictions"] += result.deleted_count
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("key", unique=True)
+        await self.collection.create_index("last_used_at")
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["memory_hits"] + self.stats["persistent_hits"] + self.stats["misses"]
+        hits = self.stats["memory_hits"] + self.stats["persistent_hits"]
+        return {
+            **self.stats,
+            "hits": hits,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory.total_size,
+        }
+
+tryon_cache = TryOnResultCache(
+    db.tryon_cache,
+    memory_items=int(os.environ.get('TRYON_CACHE_MEMORY_ITEMS', '1024')),
+    memory_bytes=int(os.environ.get('TRYON_CACHE_MEMORY_BYTES', str(256 * 1024 * 1024))),
+    max_entries=int(os.environ.get('TRYON_CACHE_MAX_ENTRIES', '2000')),
+    ttl_seconds=int(os.environ.get('TRYON_CACHE_TTL_SECONDS', str(7 * 24 * 3600))),
+)
+
+# Routes
+@api_router.get("/")
+async def root():
+    return {"message": "Saree Virtual Try-On API Ready"}
+
+@api_router.post("/status", response_model=StatusCheck)
+async def create_status_check(input: StatusCheckCreate):
+    status_dict = input.dict()
+    status_obj = StatusCheck(**status_dict)
+    _ = await db.status_checks.insert_one(status_obj.dict())
+    return status_obj
+
+@api_router.get("/status", response_model=List[StatusCheck])
+async def get_status_checks(request: Request):
+    return await stream_documents(request, db.status_checks.find({}, {"_id": 0}).limit(1000), StatusCheck)
+
+# Catalog cache
+class CatalogCache:
+    """Read-through cache of catalog items and listings, invalidated by a version counter.
+
+    Every write to the catalog bumps ``version`` in the ``catalog_meta`` collection. Readers
+    compare it with the version their entries were loaded under at most every
+    ``check_interval`` seconds, so every worker drops stale entries within that interval
+    without needing a replica set for change streams. Cached values are shared between
+    requests and must not be mutated.
+    """
+
+    def __init__(self, meta_collection, max_entries: int, max_bytes: int, check_interval: float):
+        self.meta_collection = meta_collection
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.check_interval = check_interval
+        self.version = None
+        self._checked_at = float("-inf")
+        self._checking = SingleFlight()
+        self._entries = BoundedLRU(max_entries, max_size=max_bytes)  # Sizes are estimated bytes
+        self._loading = SingleFlight()
+        self._listeners = []
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0, "version_checks": 0, "bumps": 0}
+
+    def on_change(self, callback):
+        """Call ``callback()`` whenever the catalog version moves"""
+        self._listeners.append(callback)
+
+    def _apply_version(self, version: int):
+        if version == self.version:
+            return
+        if self.version is not None:
+            self._entries.clear()
+            self.stats["invalidations"] += 1
+            for callback in self._listeners:
+                callback()
+        self.version = version
+
+    async def _read_version(self) -> int:
+        self.stats["version_checks"] += 1
+        meta = await self.meta_collection.find_one({"_id": "catalog"}, {"version": 1})
+        return meta["version"] if meta else 0
+
+    async def sync(self):
+        """Drop every entry if another worker changed the catalog since the last check"""
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return
+        # Requests arriving together share one read of the version
+        version = await self._checking.run("version", self._read_version)
+        self._checked_at = time.monotonic()
+        self._apply_version(version)
+
+    async def bump(self):
+        """Record a catalog write so every worker reloads its cached catalog reads"""
+        self.stats["bumps"] += 1
+        try:
+            meta = await self.meta_collection.find_one_and_update(
+                {"_id": "catalog"},
+                {"$inc": {"version": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            # The write itself succeeded; at least this worker stops serving the old catalog
+            logging.error(f"Failed to bump catalog version: {str(e)}")
+            self._apply_version(-1 if self.version is None else self.version - 1)
+            return
+        self._checked_at = time.monotonic()
+        self._apply_version(meta["version"])
+
+    async def get(self, key: tuple, load, size=None):
+        """Cached value for ``key``, calling ``await load()`` on a miss.
+
+        ``size(value)`` estimates the bytes a value holds; values default to 1 KiB.
+        """
+        await self.sync()
+        if key in self._entries:
+            self.stats["hits"] += 1
+            return self._entries.get(key)
+        self.stats["misses"] += 1
+        
+        # Concurrent misses share one load, but never one started under an older version
+        version = self.version
+        value = await self._loading.run((version, key), load)
+        if version == self.version:
+            self._entries.put(key, value, size(value) if size else 1024)
+        return value
+
+    def update(self, key: tuple, value, size: int = 1024):
+        """Replace one entry for a change no other cached read depends on, without a version bump"""
+        self._entries.put(key, value, size)
+
+    async def get_item(self, saree_id: str) -> Optional[dict]:
+        """Catalog item without its inline image, or None when there is no such item"""
+        return await self.get(
+            ("item", saree_id),
+            lambda: db.saree_catalog.find_one({"id": saree_id}, {"_id": 0, "image_base64": 0})
+        )
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_ratio": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "version": self.version,
+            "entries": len(self._entries),
+            "estimated_bytes": self._entries.total_size,
+        }
+
+catalog_cache = CatalogCache(
+    db.catalog_meta,
+    max_entries=int(os.environ.get('CATALOG_CACHE_ITEMS', '1024')),
+    max_bytes=int(os.environ.get('CATALOG_CACHE_MAX_BYTES', str(128 * 1024 * 1024))),
+    check_interval=float(os.environ.get('CATALOG_VERSION_CHECK_INTERVAL', '1')),
+)
+
+def catalog_items_size(sarees) -> int:
+    """Estimated bytes held by cached catalog items, dominated by any inline images"""
+    return sum(1024 + len(saree.get("image_base64") or "") for saree in sarees)
+
+# Saree Catalog APIs
+CATALOG_PAGE_SORT = [("timestamp", -1), ("id", -1)]
+
+def encode_page_cursor(document: dict) -> str:
+    """Opaque keyset cursor pointing just past the given catalog item or try-on"""
+    position = json.dumps({"t": document["timestamp"].isoformat(), "i": document["id"]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(position.encode('utf-8')).decode('ascii')
+
+def decode_page_cursor(cursor: str) -> dict:
+    """Mongo filter selecting the documents after a cursor in newest-first ``(timestamp, id)`` order"""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        timestamp = datetime.fromisoformat(position["t"])
+        document_id = str(position["i"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"$or": [
+        {"timestamp": {"$lt": timestamp}},
+        {"timestamp": timestamp, "id": {"$lt": document_id}}
+    ]}
+
+def catalog_image_url(saree_id: str, size: Optional[str] = None) -> str:
+    url = f"/api/saree-catalog/{saree_id}/image"
+    return f"{url}?size={size}" if size else url
+
+@api_router.post("/saree-catalog", response_model=SareeItem)
+async def add_saree_to_catalog(saree: SareeItemCreate):
+    saree_obj = SareeItem(**saree.dict())
+    saree_doc = saree_obj.dict()
+    
+    # Keep a raw copy in the blob store so the image can be streamed by URL
+    try:
+        image_bytes = base64.b64decode(saree_obj.image_base64)
+        saree_doc["image_ref"] = await blob_store.put(image_bytes)
+        saree_doc["image_content_type"] = sniff_image_type(image_bytes)
+        saree_doc["image_derivatives"] = await image_derivatives.ensure(saree_doc["image_ref"], image_bytes)
+    except Exception as e:
+        logging.warning(f"Could not store catalog image for {saree_obj.id} in blob store: {e}")
+    
+    result = await db.saree_catalog.insert_one(saree_doc)
+    await catalog_cache.bump()
+    return saree_obj
+
+@api_router.get("/saree-catalog", response_model=List[SareeItem])
+async def get_saree_catalog(request: Request):
+    def cursor():
+        return db.saree_catalog.find({}, {"_id": 0}).limit(1000)
+    
+    if wants_ndjson(request):
+        return await stream_documents(request, cursor(), SareeItem)
+    # The cached value is the rendered body, so hits skip serialization entirely
+    body = await catalog_cache.get(("all",), lambda: render_documents(cursor(), SareeItem), size=len)
+    return Response(body, media_type="application/json")
+
+@api_router.get("/saree-catalog/page")
+async def get_saree_catalog_page(
+    limit: int = Query(24, ge=1, le=100),
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    include_images: bool = False,
+    image_size: Optional[str] = None
+):
+    """Keyset-paginated catalog listing, newest first, with image payloads left out by default"""
+    if image_size is not None and image_size not in IMAGE_DERIVATIVE_SIZES:
+        raise HTTPException(status_code=400, detail=f"Invalid image_size. Must be one of: {list(IMAGE_DERIVATIVE_SIZES)}")
+    
+    query = {}
+    if category:
+        query["category"] = category
+    if cursor:
+        query.update(decode_page_cursor(cursor))
+    
+    projection = {"_id": 0, "image_ref": 0, "image_content_type": 0, "image_derivatives": 0}
+    if not include_images:
+        projection["image_base64"] = 0
+    
+    async def load():
+        # Fetch one extra item to know whether another page exists
+        sarees = await db.saree_catalog.find(query, projection).sort(CATALOG_PAGE_SORT).limit(limit + 1).to_list(limit + 1)
+        has_more = len(sarees) > limit
+        sarees = sarees[:limit]
+        
+        for saree in sarees:
+            saree["image_url"] = catalog_image_url(saree["id"], image_size)
+        
+        return {
+            "items": sarees,
+            "next_cursor": encode_page_cursor(sarees[-1]) if has_more else None
+        }
+    
+    return await catalog_cache.get(
+        ("page", limit, cursor, category, include_images, image_size), load,
+        size=lambda page: catalog_items_size(page["items"])
+    )
+
+# Catalog search
+CATALOG_FACET_FIELDS = ("category", "color", "pattern")
+
+class CatalogFacetCache:
+    """Facet counts of recent catalog searches, dropped whenever the catalog changes.
+
+    Entries computed while the catalog changed are never stored: ``put`` only accepts
+    results tagged with the generation that was current when their query started.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.generation = 0
+        self._entries = BoundedLRU(max_entries)  # key -> (expires at, facets)
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, key: tuple) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return entry[1]
+
+    def put(self, key: tuple, facets: dict, generation: int):
+        if generation != self.generation:
+            return
+        self._entries.put(key, (time.monotonic() + self.ttl_seconds, facets))
+
+    def invalidate(self):
+        self.generation += 1
+        self._entries.clear()
+        self.stats["invalidations"] += 1
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "entries": len(self._entries), "generation": self.generation}
+
+catalog_facets = CatalogFacetCache(
+    max_entries=int(os.environ.get('CATALOG_FACET_CACHE_ITEMS', '256')),
+    ttl_seconds=float(os.environ.get('CATALOG_FACET_CACHE_TTL', '300')),
+)
+catalog_cache.on_change(catalog_facets.invalidate)
+
+def build_facet_pipeline(text_query: dict, filters: dict) -> list:
+    """One $facet aggregation counting every facet value and the total matches.
+
+    Each facet applies every filter except its own, so the counts show what picking
+    another value of that facet would return.
+    """
+    facets = {}
+    for facet in CATALOG_FACET_FIELDS:
+        other_filters = {field_name: value for field_name, value in filters.items() if field_name != facet}
+        stages = [{"$match": other_filters}] if other_filters else []
+        facets[facet] = stages + [
+            {"$group": {"_id": f"${facet}", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+        ]
+    facets["total"] = ([{"$match": filters}] if filters else []) + [{"$count": "count"}]
+    # $text has to be in the first stage, which also lets it use the text index
+    return [{"$match": text_query}, {"$facet": facets}]
+
+async def get_catalog_facets(text_query: dict, filters: dict) -> dict:
+    key = (json.dumps(text_query, sort_keys=True), json.dumps(filters, sort_keys=True))
+    facets = catalog_facets.get(key)
+    if facets is not None:
+        return facets
+    
+    generation = catalog_facets.generation
+    result = await db.saree_catalog.aggregate(build_facet_pipeline(text_query, filters)).to_list(1)
+    buckets = result[0] if result else {}
+    facets = {
+        facet: [{"value": bucket["_id"], "count": bucket["count"]} for bucket in buckets.get(facet, []) if bucket["_id"] is not None]
+        for facet in CATALOG_FACET_FIELDS
+    }
+    total = buckets.get("total") or [{"count": 0}]
+    facets["total"] = total[0]["count"]
+    catalog_facets.put(key, facets, generation)
+    return facets
+
+@api_router.get("/saree-catalog/search")
+async def search_saree_catalog(
+    q: Optional[str] = Query(None, max_length=200),
+    category: Optional[str] = None,
+    color: Optional[str] = None,
+    pattern: Optional[str] = None,
+    limit: int = Query(24, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+    include_images: bool = False,
+    image_size: Optional[str] = None
+):
+    """Full-text and faceted catalog search, best matches first, with facet counts for the filters"""
+    if image_size is not None and image_size not in IMAGE_DERIVATIVE_SIZES:
+        raise HTTPException(status_code=400, detail=f"Invalid image_size. Must be one of: {list(IMAGE_DERIVATIVE_SIZES)}")
+    
+    text_query = {"$text": {"$search": q.strip()}} if q and q.strip() else {}
+    filters = {
+        field_name: value
+        for field_name, value in (("category", category), ("color", color), ("pattern", pattern))
+        if value
+    }
+    
+    projection = {"_id": 0, "image_ref": 0, "image_content_type": 0, "image_derivatives": 0}
+    if not include_images:
+        projection["image_base64"] = 0
+    sort = CATALOG_PAGE_SORT
+    if text_query:
+        projection["score"] = {"$meta": "textScore"}
+        sort = [("score", {"$meta": "textScore"})] + CATALOG_PAGE_SORT
+    
+    try:
+        # Picks up catalog changes made by other workers before facets are served from cache
+        await catalog_cache.sync()
+        items_query = db.saree_catalog.find({**text_query, **filters}, projection).sort(sort).skip(offset).limit(limit)
+        sarees, facets = await asyncio.gather(items_query.to_list(limit), get_catalog_facets(text_query, filters))
+    except Exception as e:
+        logging.error(f"Catalog search failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Catalog search failed: {str(e)}")
+    
+    for saree in sarees:
+        saree.pop("score", None)
+        saree["image_url"] = catalog_image_url(saree["id"], image_size)
+    
+    total = facets["total"]
+    return {
+        "items": sarees,
+        "total": total,
+        "facets": {facet: facets[facet] for facet in CATALOG_FACET_FIELDS},
+        "next_offset": offset + limit if offset + limit < total else None
+    }
+
+async def backfill_saree_image(saree: dict) -> dict:
+    """Give a catalog item added before the blob store its blob copy and derivatives.
+
+    Listings never include these fields, so only the cached item is replaced; bumping the
+    catalog version would empty every cached listing once per legacy item.
+    """
+    stored = await db.saree_catalog.find_one(
+        {"id": saree["id"]},
+        {"_id": 0, "image_base64": 1, "image_ref": 1, "image_content_type": 1, "image_derivatives": 1}
+    )
+    # The cached item can outlive the stored one, e.g. when it was removed directly in MongoDB
+    if stored is None:
+        catalog_cache.update(("item", saree["id"]), None)
+        raise HTTPException(status_code=404, detail="Saree not found")
+    if not stored.get("image_ref"):
+        image_bytes = base64.b64decode(stored["image_base64"])
+        stored["image_ref"] = await blob_store.put(image_bytes)
+        stored["image_content_type"] = sniff_image_type(image_bytes)
+        stored["image_derivatives"] = await image_derivatives.ensure(stored["image_ref"], image_bytes)
+        await db.saree_catalog.update_one(
+            {"id": saree["id"]},
+            {"$set": {
+                "image_ref": stored["image_ref"],
+                "image_content_type": stored["image_content_type"],
+                "image_derivatives": stored["image_derivatives"]
+            }}
+        )
+    
+    # Another worker may have backfilled the item already; either way adopt what is stored
+    saree = {
+        **saree,
+        "image_ref": stored["image_ref"],
+        "image_content_type": stored.get("image_content_type"),
+        "image_derivatives": stored.get("image_derivatives")
+    }
+    catalog_cache.update(("item", saree["id"]), saree)
+    return saree
+
+@api_router.get("/saree-catalog/{saree_id}/image")
+async def stream_saree_image(saree_id: str, http_request: Request, size: Optional[str] = None, format: Optional[str] = None):
+    saree = await catalog_cache.get_item(saree_id)
+    if not saree:
+        raise HTTPException(status_code=404, detail="Saree not found")
+    
+    if not saree.get("image_ref"):
+        saree = await backfill_saree_image(saree)
+    
+    digest, content_type, variant_headers = select_image_variant(
+        http_request, saree["image_ref"], saree.get("image_content_type") or "image/jpeg",
+        saree.get("image_derivatives"), size, format
+    )
+    return await blob_response(http_request, digest, content_type, variant_headers)
+
+@api_router.get("/saree-catalog/{category}")
+async def get_sarees_by_category(category: str, request: Request):
+    def cursor():
+        return db.saree_catalog.find({"category": category}, {"_id": 0}).limit(1000)
+    
+    if wants_ndjson(request):
+        return await stream_documents(request, cursor(), SareeItem)
+    body = await catalog_cache.get(("category", category), lambda: render_documents(cursor(), SareeItem), size=len)
+    return Response(body, media_type="application/json")
+
+# Virtual Try-On API
+@api_router.post("/virtual-tryon")
+async def create_virtual_tryon(request: TryOnRequest):
+    request = await prepare_tryon_request(request)
+    return await complete_virtual_tryon(request)
+
+@api_router.post("/virtual-tryon/upload")
+async def create_virtual_tryon_upload(http_request: Request):
+    """Multipart variant of /virtual-tryon taking the saree components as raw image files"""
+    form = await read_multipart_upload(
+        http_request,
+        max_file_bytes=input_image_normalizer.max_bytes,
+        max_total_bytes=int(os.environ.get('TRYON_UPLOAD_MAX_TOTAL_BYTES', str(3 * input_image_normalizer.max_bytes))),
+        max_files=len(TRYON_UPLOAD_FILES),
+        max_fields=len(TRYON_UPLOAD_FIELDS),
+    )
+    try:
+        # Raw bytes go straight to the normalizer, only the shrunken result is base64 encoded
+        uploads = {}
+        for form_name, field_name in TRYON_UPLOAD_FILES.items():
+            upload = form.get(form_name)
+            if upload is None or isinstance(upload, str):
+                continue
+            data = await upload.read()
+            if data:
+                uploads[field_name] = data
+        with stage_timer("normalization"):
+            normalized = await input_image_normalizer.normalize_uploads(uploads) if uploads else {}
+        # Drop the raw uploads before generation so only the normalized copies stay in memory
+        del uploads
+    finally:
+        await form.close()
+    
+    fields = {name: form[name] for name in TRYON_UPLOAD_FIELDS if isinstance(form.get(name), str) and form[name]}
+    request = TryOnRequest(**fields, **normalized)
+    await tryon_assets.touch(request)
+    return await complete_virtual_tryon(request)
+
+async def prepare_tryon_request(request: TryOnRequest) -> TryOnRequest:
+    """Normalize inline uploads and check referenced assets before any generation work starts"""
+    with stage_timer("normalization"):
+        request = await input_image_normalizer.normalize_request(request)
+    with stage_timer("asset_touch"):
+        await tryon_assets.touch(request)
+    return request
+
+async def complete_virtual_tryon(request: TryOnRequest):
+    """Generate, store and return a single try-on for an already normalized request"""
+    try:
+        logging.info(f"Starting virtual try-on process for pose: {request.pose_style}")
+        
+        # Get the result image base64, reusing a cached render of an identical request
+        result_image_base64 = await generate_tryon_image(request)
+        
+        # Create try-on result
+        tryon_result = await build_tryon_result(request, result_image_base64)
+        
+        # Save to database, the image itself lives in the blob store
+        with stage_timer("db_insert"):
+            await db.virtual_tryons.insert_one(tryon_result.dict(exclude={"result_image_base64"}))
+        
+        logging.info("Virtual try-on completed successfully")
+        return {
+            "id": tryon_result.id,
+            "result_image_base64": result_image_base64,
+            "pose_style": request.pose_style,
+            "blouse_style": request.blouse_style,
+            "message": "Virtual try-on completed successfully"
+        }
+        
+    except Exception as e:
+        logging.error(f"Error in virtual try-on: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Virtual try-on failed: {str(e)}")
+
+@api_router.post("/virtual-tryon/batch")
+async def create_virtual_tryon_batch(batch: BatchTryOnRequest):
+    # Deduplicate poses while keeping the requested order
+    poses = list(dict.fromkeys(batch.poses))
+    if not poses:
+        raise HTTPException(status_code=400, detail="At least one pose is required")
+    # Reject unsupported styles before any upload is normalized or pose is rendered
+    for pose in poses:
+        validate_tryon_styles(batch.copy(update={"pose_style": pose}))
+    
+    # Normalize the uploads once for every pose
+    batch = await prepare_tryon_request(batch)
+    
+    try:
+        # Every pose shares one session so the provider keeps the same model
+        session_id = batch.session_id or f"tryon_{uuid.uuid4()}"
+        logging.info(f"Starting batch virtual try-on for poses {poses} in session {session_id}")
+        
+        base_fields = batch.dict(exclude={"poses", "pose_style", "session_id"})
+        pose_requests = [
+            TryOnRequest(**base_fields, pose_style=pose, session_id=session_id)
+            for pose in poses
+        ]
+        
+        # Render all poses concurrently; a failed pose cancels the rest. With a real provider
+        # the poses queue for the session's pooled chat, so each one continues the same model
+        tasks = [asyncio.create_task(generate_tryon_image(pose_request)) for pose_request in pose_requests]
+        try:
+            result_images = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        
+        tryon_results = await asyncio.gather(*(
+            build_tryon_result(pose_request, result_image)
+            for pose_request, result_image in zip(pose_requests, result_images)
+        ))
+        
+        # Persist every pose in a single round trip
+        with stage_timer("db_insert"):
+            await db.virtual_tryons.insert_many([
+                tryon_result.dict(exclude={"result_image_base64"}) for tryon_result in tryon_results
+            ])
+        
+        logging.info(f"Batch virtual try-on completed for {len(tryon_results)} poses")
+        return {
+            "session_id": session_id,
+            "results": [
+                {
+                    "id": tryon_result.id,
+                    "result_image_base64": result_image,
+                    "pose_style": tryon_result.pose_style,
+                    "blouse_style": tryon_result.blouse_style
+                }
+                for tryon_result, result_image in zip(tryon_results, result_images)
+            ],
+            "message": "Virtual try-on completed successfully"
+        }
+        
+    except Exception as e:
+        logging.error(f"Error in batch virtual try-on: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Virtual try-on failed: {str(e)}")
+
+async def build_tryon_result(request: TryOnRequest, result_image_base64: str) -> TryOnResult:
+    """Store a generated image in the blob store and build the try-on record referencing it"""
+    with stage_timer("base64_decode"):
+        image_bytes = base64.b64decode(result_image_base64)
+    payload_size.observe(len(image_bytes), kind="result_image")
+    with stage_timer("blob_store"):
+        image_ref = await blob_store.put(image_bytes)
+        derivatives = await image_derivatives.get(image_ref)
+    if derivatives is None:
+        image_derivatives.ensure_later(image_ref, image_bytes)
+    return TryOnResult(
+        result_image_ref=image_ref,
+        result_content_type=sniff_image_type(image_bytes),
+        result_derivatives=derivatives,
+        pose_style=request.pose_style,
+        blouse_style=request.blouse_style,
+        saree_details={
+            "has_body": bool(request.saree_body_base64 or request.saree_body_asset_id),
+            "has_pallu": bool(request.saree_pallu_base64 or request.saree_pallu_asset_id),
+            "has_border": bool(request.saree_border_base64 or request.saree_border_asset_id),
+            "saree_item_id": request.saree_item_id
+        }
+    )
+
+
+async def analyze_user_photo(user_photo_base64: str) -> str:
+    """Analyze user photo to extract characteristics for virtual try-on"""
+    if not user_photo_base64:
+        return "- Indian woman with medium complexion\n- Natural features and professional appearance"
+    
+    # This is a simplified analysis - in a production app, you'd use computer vision
+    # For now, we'll return a generic but detailed description
+    return """- Indian woman with natural features and warm complexion
+- Professional appearance suitable for saree modeling
+- Appropriate body proportions for traditional Indian attire
+- Natural pose and confident demeanor"""
+
+async def analyze_saree_components(body_base64: str, pallu_base64: str, border_base64: str) -> str:
+    """Analyze saree components to extract design details"""
+    details = []
+    
+    if body_base64:
+        details.append("- Main saree fabric with intricate traditional patterns")
+        details.append("- Rich texture and authentic Indian craftsmanship")
+    
+    if pallu_base64:
+        details.append("- Decorative pallu with ornate designs and detailing")
+        details.append("- Traditional pallu styling meant to drape over the shoulder")
+    
+    if border_base64:
+        details.append("- Elaborate border work with traditional motifs")
+        details.append("- Contrasting border design that complements the main fabric")
+    
+    if not details:
+        details = [
+            "- Traditional saree with classic Indian patterns",
+            "- Elegant fabric suitable for formal occasions",
+            "- Authentic Indian craftsmanship and styling"
+        ]
+    
+    return "\n".join(details)
+
+def render_mock_tryon_image(pose_style: str, blouse_style: str) -> str:
+    """Render the placeholder try-on image for a pose/blouse combination (runs in a worker process)"""
+    # Create a simple colored image as mock result with consistent dimensions
+    width, height = 1024, 1536  # 2:3 aspect ratio for consistency
+    
+    # Choose color based on pose style
+    colors = {
+        "front": (255, 100, 100),  # Red
+        "side": (100, 255, 100)    # Green  
+    }
+    
+    color = colors.get(pose_style, (200, 200, 200))
+    
+    # Create mock image
+    img = Image.new('RGB', (width, height), color)
+    
+    # Add some text to indicate it's a mock
+    try:
+        draw = ImageDraw.Draw(img)
+        
+        # Try to use default font
+        try:
+            font = ImageFont.load_default()
+        except:
+            font = None
             
-            STYLE: High-end fashion photography, professional modeling, perfect lighting
-            """
+        text = f"MOCK SAREE\n{pose_style.upper()}\n{blouse_style.upper()}"
+        
+        if font:
+            draw.text((50, height//2 - 30), text, fill=(255, 255, 255), font=font)
+        else:
+            draw.text((50, height//2 - 30), text, fill=(255, 255, 255))
             
-            # Create text-only message
-            message = UserMessage(text=model_generation_prompt)
+    except Exception as e:
+        logging.warning(f"Could not add text to mock image: {e}")
+    
+    # Convert to base64
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    img_bytes = buffer.getvalue()
+    
+    return base64.b64encode(img_bytes).decode('utf-8')
+
+class MockTryOnProvider:
+    """Provider used when no API key is configured.
+
+    The output depends only on ``(pose_style, blouse_style)``, so each combination is rendered
+    once in the image process pool and memoized. An optional simulated latency makes the mock
+    mode usable as a stand-in for the real providers in load tests.
+    """
+
+    def __init__(self, latency_ms: float, jitter_ms: float):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self._rendered = {}
+        self._rendering = SingleFlight()
+
+    async def _image_for(self, pose_style: str, blouse_style: str) -> str:
+        key = (pose_style, blouse_style)
+        if key in self._rendered:
+            return self._rendered[key]
         
-        logging.info(f"Sending AI model generation request with {len(image_contents)} saree component images to Nano Banana API...")
+        # Concurrent requests for the same combination share one render
+        image_base64 = await self._rendering.run(
+            key, lambda: run_in_image_pool(render_mock_tryon_image, pose_style, blouse_style)
+        )
+        self._rendered[key] = image_base64
+        return image_base64
+
+    async def warm_up(self):
+        """Precompute every supported pose/blouse combination"""
+        await asyncio.gather(*(
+            self._image_for(pose_style, blouse_style)
+            for pose_style in VALID_POSES
+            for blouse_style in VALID_BLOUSES
+        ))
+        logging.info(f"Precomputed {len(self._rendered)} mock try-on images")
+
+    async def generate(self, request: TryOnRequest) -> str:
+        image_base64 = await self._image_for(request.pose_style, request.blouse_style)
         
-        # Send to Gemini for model generation with saree
-        text_response, generated_images = await chat.send_message_multimodal_response(message)
+        delay_ms = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if delay_ms > 0:
+            await asyncio.sleep(delay_ms / 1000)
+        return image_base64
+
+mock_provider = MockTryOnProvider(
+    latency_ms=float(os.environ.get('MOCK_PROVIDER_LATENCY_MS', '0')),
+    jitter_ms=float(os.environ.get('MOCK_PROVIDER_JITTER_MS', '0')),
+)
+
+async def generate_mock_tryon_image(request: TryOnRequest):
+    """Generate a mock try-on image for testing when API key is not available"""
+    logging.info(f"Generating mock try-on image for pose: {request.pose_style}, blouse: {request.blouse_style}")
+    return await mock_provider.generate(request)
+
+async def resolve_tryon_image(tryon: dict) -> str:
+    """Base64 result image of a stored try-on, read from the blob store when referenced"""
+    if tryon.get("result_image_ref"):
+        return await blob_store.get_base64(tryon["result_image_ref"])
+    return tryon["result_image_base64"]
+
+async def migrate_inline_tryon_images(batch_size: int = 50) -> int:
+    """Move result images still embedded in virtual_tryons documents into the blob store.
+
+    Documents whose image does not decode keep it inline and are marked with
+    ``result_image_migration_error`` so later runs skip them.
+    """
+    migrated = 0
+    query = {"result_image_base64": {"$type": "string"}, "result_image_migration_error": {"$exists": False}}
+    while True:
+        legacy = await db.virtual_tryons.find(query, {"_id": 0, "id": 1, "result_image_base64": 1}).to_list(batch_size)
+        if not legacy:
+            return migrated
+        for tryon in legacy:
+            try:
+                image_bytes = base64.b64decode(tryon["result_image_base64"])
+            except ValueError as e:
+                logging.warning(f"Leaving try-on {tryon['id']} image inline, it does not decode: {e}")
+                await db.virtual_tryons.update_one(
+                    {"id": tryon["id"]},
+                    {"$set": {"result_image_migration_error": str(e)}}
+                )
+                continue
+            image_ref = await blob_store.put(image_bytes)
+            await db.virtual_tryons.update_one(
+                {"id": tryon["id"]},
+                {
+                    "$set": {"result_image_ref": image_ref, "result_content_type": sniff_image_type(image_bytes)},
+                    "$unset": {"result_image_base64": ""}
+                }
+            )
+            migrated += 1
+        logging.info(f"Migrated {migrated} try-on images to the blob store")
+
+def validate_tryon_styles(request: TryOnRequest):
+    """Reject pose and blouse styles the generator does not support"""
+    if request.pose_style not in VALID_POSES:
+        raise HTTPException(status_code=400, detail=f"Invalid pose_style. Must be one of: {VALID_POSES}")
+    
+    if request.blouse_style not in VALID_BLOUSES:
+        raise HTTPException(status_code=400, detail=f"Invalid blouse_style. Must be one of: {VALID_BLOUSES}")
+
+# Prepare the prompt based on the pose style - Enhanced for consistency
+POSE_DESCRIPTIONS = {
+    "front": "front-facing pose with arms naturally by the sides, looking directly at camera - SAME MODEL as any previous poses in this session",
+    "side": "elegant side profile pose showing the saree draping, three-quarter turn - SAME MODEL with IDENTICAL appearance as any previous poses in this session"
+}
+
+BLOUSE_DESCRIPTIONS = {
+    "traditional": "traditional fitted blouse with short sleeves",
+    "modern": "modern stylish blouse with contemporary cut",
+    "sleeveless": "sleeveless blouse design",
+    "full_sleeve": "full sleeve blouse with elegant design"
+}
+
+# Prompt templates
+class PromptTemplate:
+    """A prompt compiled once into a ``string.Template`` with shared blocks already inlined"""
+
+    def __init__(self, name: str, text: str, blocks: dict):
+        self.name = name
+        self.template = string.Template(string.Template(textwrap.dedent(text).strip()).safe_substitute(blocks))
+
+    def render(self, **values) -> str:
+        return self.template.substitute(values)
+
+class PromptRegistry:
+    """Named prompt templates plus size accounting for every rendered prompt.
+
+    Blocks shared between prompts are written once and inlined when a template is
+    registered, so rendering a prompt per request is only a placeholder substitution.
+    ``version`` changes whenever any template text changes.
+    """
+
+    def __init__(self, blocks: dict):
+        self.blocks = {name: textwrap.dedent(text).strip() for name, text in blocks.items()}
+        self.templates = {}
+        self.stats = {}
+        self.version = ""
+
+    def register(self, name: str, text: str):
+        self.templates[name] = PromptTemplate(name, text, self.blocks)
+        self.stats[name] = {"renders": 0, "chars": 0, "estimated_tokens": 0, "last_chars": 0}
+        source = "\n".join(f"{key}:{template.template.template}" for key, template in sorted(self.templates.items()))
+        self.version = hashlib.sha256(source.encode('utf-8')).hexdigest()[:12]
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        # Roughly four characters per token for English prose
+        return (len(text) + 3) // 4
+
+    def render(self, name: str, **values) -> str:
+        text = self.templates[name].render(**values)
+        chars, tokens = len(text), self.estimate_tokens(text)
         
-        if generated_images and len(generated_images) > 0:
-            # Get the first generated image
-            result_image_data = generated_images[0]['data']  # This is base64
-            logging.info(f"Successfully generated AI model with saree via Nano Banana API")
-            
-            return result_image_data  # Return base64 directly
+        stats = self.stats[name]
+        stats["renders"] += 1
+        stats["chars"] += chars
+        stats["estimated_tokens"] += tokens
+        stats["last_chars"] = chars
+        prompt_size.observe(tokens, template=name)
+        logging.info(f"Rendered prompt {name}: {chars} chars (~{tokens} tokens)")
+        return text
+
+    def snapshot(self) -> dict:
+        return {
+            "version": self.version,
+            "templates": {
+                name: {
+                    **stats,
+                    "avg_chars": round(stats["chars"] / stats["renders"], 1) if stats["renders"] else 0,
+                    "avg_estimated_tokens": round(stats["estimated_tokens"] / stats["renders"], 1) if stats["renders"] else 0,
+                }
+                for name, stats in self.stats.items()
+            }
+        }
+
+prompt_registry = PromptRegistry(blocks={
+    # Rules every pose of a session must follow, sent once per request
+    "consistency_rules": """
+        CRITICAL SESSION CONSISTENCY RULES (Session: $session_id):
+        1. MANDATORY: If this session has generated images before, you MUST maintain EXACTLY the same model characteristics - the same woman photographed from different angles within the same 30 seconds
+        2. HAIR CONSISTENCY (CRITICAL): Keep IDENTICAL hairstyle, hair length, hair color, hair texture, and hair accessories (flowers, clips, ornaments) in the EXACT same positions across ALL poses
+           - If hair is in a bun or braids, keep that EXACT style in all poses
+           - NO changes to hair styling, length, or accessories between poses
+        3. FACIAL FEATURES (CRITICAL): Maintain EXACT same facial structure, skin tone, eye shape, nose, lips, body proportions and facial expressions - the same individual, not different people
+        4. BLOUSE CONSISTENCY: Use EXACTLY the same blouse color, design, positioning and fit across all poses
+        5. SAREE DRAPING CONSISTENCY (ABSOLUTELY CRITICAL):
+           - Drape the saree authentically in traditional Indian style with proper pleats and pallu positioning
+           - Maintain PERFECTLY IDENTICAL pleating patterns, pallu fall, waist level, shoulder draping and pallu length across poses
+           - Keep the SAME saree length and how it touches the ground; the saree must not look moved or adjusted between photos
+        6. SAME PHOTOGRAPHY SESSION: Exactly the same studio lighting setup and identical neutral background in all images
+        7. FINAL CHECK: Images must be indistinguishable as the same person except for the camera angle - NO variations in appearance, styling, or setup allowed
+    """,
+    "photography_requirements": """
+        PHOTOGRAPHY REQUIREMENTS:
+        - Elegant Indian woman model with natural features and warm complexion, confident and graceful
+        - Natural, elegant pose that showcases the saree beautifully
+        - Professional high-end fashion photography with studio lighting and sharp focus
+        - Clean neutral background (light gray or white) to highlight the saree
+        - CONSISTENT DIMENSIONS: Exactly 1024x1536 pixels (2:3 aspect ratio) with high-definition photorealistic details
+        - The saree should look well-fitted and naturally draped, following authentic Indian saree draping traditions
+    """,
+})
+
+prompt_registry.register("nano_banana.system", """
+    You are an expert fashion AI that can generate realistic models wearing sarees. You can incorporate uploaded saree designs into photorealistic fashion photography. Always generate images with consistent dimensions and quality.
+
+    $consistency_rules
+
+    $photography_requirements
+""")
+
+prompt_registry.register("nano_banana.components", """
+    VIRTUAL SAREE MODEL GENERATION (Session: $session_id):
+
+    Create a photorealistic image of a beautiful Indian woman wearing a saree that incorporates the designs from the uploaded images.
+    - SAREE: $components_text
+    - Combine all uploaded saree elements (fabric, pallu, border) naturally into one beautiful saree with IDENTICAL patterns
+    - BLOUSE: $blouse_description blouse
+    - POSE: Position her in a $pose_description pose
+    - Follow every session consistency rule and photography requirement
+
+    STYLE: High-end fashion photography, professional modeling, perfect lighting, sharp focus
+""")
+
+prompt_registry.register("nano_banana.description", """
+    Create a photorealistic image of a beautiful Indian woman wearing a $saree_description in a $pose_description (Session: $session_id).
+    - BLOUSE: $blouse_description blouse
+    - Follow every session consistency rule and photography requirement
+
+    STYLE: High-end fashion photography, professional modeling, perfect lighting
+""")
+
+# gpt-image-1 takes no system message, so the shared blocks are part of the prompt itself
+prompt_registry.register("openai.fallback", """
+    Create a highly realistic photograph of a beautiful Indian woman wearing a $saree_description in a $pose_description (Session: $session_id).
+    She is wearing a $blouse_description blouse.
+
+    SAREE DESIGN DETAILS:
+    $saree_design_details
+
+    $consistency_rules
+
+    $photography_requirements
+
+    STYLE: Professional fashion photography, high-end fashion shoot quality, perfect lighting, sharp focus
+""")
+
+@dataclass
+class GenerationContext:
+    """Everything a provider needs to render one try-on"""
+    request: TryOnRequest
+    session_id: str
+    saree_description: str
+
+async def process_virtual_tryon(request: TryOnRequest):
+    """Process virtual try-on request and return base64 image"""
+    # Validate pose and blouse styles
+    with stage_timer("validation"):
+        validate_tryon_styles(request)
+    
+    # Check if we have API key for real AI generation
+    if not api_key or api_key == 'your_api_key_here':
+        logging.info("Using mock AI generation due to missing API key")
+        with stage_timer("generation"):
+            return await generate_mock_tryon_image(request)
+    
+    # Providers need the component images themselves
+    with stage_timer("asset_resolve"):
+        request = await tryon_assets.resolve(request)
+    
+    # Create comprehensive prompt for saree generation
+    saree_description = ""
+    if request.saree_item_id:
+        # Get saree from catalog
+        with stage_timer("catalog_lookup"):
+            saree_item = await catalog_cache.get_item(request.saree_item_id)
+        if saree_item:
+            saree_description = f"beautiful {saree_item['color']} saree with {saree_item['pattern']} pattern, {saree_item['description']}"
+    else:
+        saree_description = "beautiful traditional saree with intricate patterns and elegant border"
+    
+    # Use provided session_id for consistency across multiple poses
+    context = GenerationContext(
+        request=request,
+        session_id=request.session_id or f"tryon_{uuid.uuid4()}",
+        saree_description=saree_description
+    )
+    
+    # Nano Banana first, OpenAI as fallback, subject to deadlines and circuit breakers
+    with stage_timer("generation"):
+        return await provider_router.generate(context)
+
+# Chat session pool
+@dataclass
+class PooledChat:
+    session_id: str
+    chat: LlmChat
+    busy: bool = False
+    turns: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+    waiters: deque = field(default_factory=deque)
+
+class ChatSessionPool:
+    """Bounded LRU of configured ``LlmChat`` objects keyed by session_id.
+
+    A chat keeps its system message and history, so the second pose of a session continues
+    the conversation of the first instead of starting a new one. Sessions idle for longer than
+    ``idle_ttl`` are dropped. A pooled chat is leased to one request at a time; other requests
+    for the same session, such as the other pose of a batch, queue for up to ``lease_wait``
+    seconds and get the chat handed over in order, falling back to a transient chat only
+    after that. A chat is retired after ``max_turns`` exchanges so the history it resends
+    stays bounded.
+    """
+
+    def __init__(self, max_sessions: int, idle_ttl: float, lease_wait: float, max_turns: int):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.lease_wait = lease_wait
+        self.max_turns = max_turns
+        self._sessions = OrderedDict()
+        self.stats = {
+            "created": 0,
+            "reused": 0,
+            "waited": 0,
+            "transient": 0,
+            "lru_evictions": 0,
+            "idle_evictions": 0,
+            "discarded": 0,
+            "retired": 0,
+        }
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_ttl
+        for session_id, pooled in list(self._sessions.items()):
+            if not pooled.busy and pooled.last_used < cutoff:
+                del self._sessions[session_id]
+                self.stats["idle_evictions"] += 1
+
+    async def _acquire(self, session_id: Optional[str], create_chat) -> tuple:
+        """``(PooledChat, pooled)`` for a session, marking a pooled chat busy"""
+        deadline = time.monotonic() + self.lease_wait
+        while True:
+            self._evict_idle()
+            pooled = self._sessions.get(session_id) if session_id else None
+            if pooled is None:
+                break
+            if not pooled.busy:
+                pooled.busy = True
+                self._sessions.move_to_end(session_id)
+                self.stats["reused"] += 1
+                return pooled, True
             
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # Still busy after waiting our turn
+                self.stats["transient"] += 1
+                return PooledChat(session_id, create_chat(), busy=True), False
+            waiter = asyncio.get_running_loop().create_future()
+            pooled.waiters.append(waiter)
+            self.stats["waited"] += 1
+            try:
+                handed_over = await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                handed_over = False
+            if handed_over:
+                self._sessions.move_to_end(session_id)
+                self.stats["reused"] += 1
+                return pooled, True
+            # The chat was retired or discarded meanwhile; look again
+        
+        if not session_id:
+            # One-off request without a client session
+            self.stats["transient"] += 1
+            return PooledChat(session_id, create_chat(), busy=True), False
+        pooled = PooledChat(session_id, create_chat(), busy=True)
+        self._sessions[session_id] = pooled
+        self.stats["created"] += 1
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.stats["lru_evictions"] += 1
+        return pooled, True
+
+    def _release(self, pooled: PooledChat, succeeded: bool):
+        pooled.last_used = time.monotonic()
+        if self._sessions.get(pooled.session_id) is not pooled:
+            pooled.busy = False
+        elif not succeeded:
+            # A failed or cancelled send may leave a half-written history behind
+            del self._sessions[pooled.session_id]
+            self.stats["discarded"] += 1
+            pooled.busy = False
+        elif pooled.turns + 1 >= self.max_turns:
+            del self._sessions[pooled.session_id]
+            self.stats["retired"] += 1
+            pooled.busy = False
         else:
-            logging.warning("No images returned from Nano Banana API, trying fallback...")
-            raise Exception("No images generated from Nano Banana API")
-            
-    except Exception as nano_error:
-        logging.error(f"Nano Banana API failed: {str(nano_error)}")
+            pooled.turns += 1
+            # Hand the chat straight to the next waiter so later arrivals cannot jump the queue
+            while pooled.waiters:
+                waiter = pooled.waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(True)
+                    return
+            pooled.busy = False
+            self._sessions.move_to_end(pooled.session_id)
+            return
+        
+        # Waiters of a chat that left the pool start over with a fresh one
+        while pooled.waiters:
+            waiter = pooled.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(False)
+
+    @asynccontextmanager
+    async def lease(self, session_id: Optional[str], create_chat):
+        """Chat for a session, built with ``create_chat()`` when the pool has none free"""
+        pooled, in_pool = await self._acquire(session_id, create_chat)
+        succeeded = False
+        try:
+            yield pooled.chat
+            succeeded = True
+        finally:
+            if in_pool:
+                self._release(pooled, succeeded)
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "size": len(self._sessions),
+            "busy": sum(1 for pooled in self._sessions.values() if pooled.busy),
+            "max_sessions": self.max_sessions,
+            "idle_ttl_seconds": self.idle_ttl,
+        }
+
+chat_sessions = ChatSessionPool(
+    max_sessions=int(os.environ.get('CHAT_SESSION_POOL_SIZE', '256')),
+    idle_ttl=float(os.environ.get('CHAT_SESSION_IDLE_TTL', '900')),
+    lease_wait=float(os.environ.get('CHAT_SESSION_LEASE_WAIT', '45')),
+    max_turns=int(os.environ.get('CHAT_SESSION_MAX_TURNS', '8')),
+)
+
+async def generate_with_nano_banana(context: GenerationContext) -> str:
+    """Generate the try-on with Gemini ("Nano Banana"), passing uploaded saree components as images"""
+    request, session_id = context.request, context.session_id
+    saree_description = context.saree_description
+    
+    logging.info("Starting AI model generation with saree components using Nano Banana API...")
+    
+    def create_chat():
+        # Initialize Gemini chat for image generation with consistent parameters
+        # The system message carries the consistency rules shared by every pose
+        enhanced_system_message = prompt_registry.render("nano_banana.system", session_id=session_id)
+        
+        chat = LlmChat(
+            api_key=api_key, 
+            session_id=session_id, 
+            system_message=enhanced_system_message
+        )
+        chat.with_model("gemini", "gemini-2.5-flash-image-preview").with_params(
+            modalities=["image", "text"],
+            # Add consistent image generation parameters
+            image_generation_config={
+                "width": 1024,
+                "height": 1536,  # 2:3 aspect ratio for portrait fashion photography
+                "quality": "high",
+                "style": "photorealistic"
+            }
+        )
+        return chat
+    
+    # Prepare image contents for saree components if available
+    image_contents = []
+    saree_components_text = ""
+    
+    if request.saree_body_base64:
+        image_contents.append(ImageContent(request.saree_body_base64))
+        saree_components_text += "Use the main saree fabric pattern from the first uploaded image. "
+        logging.info("Added saree body image for AI model generation")
         
-        # Fallback to OpenAI image generation
-        logging.info("Using OpenAI fallback for AI model generation...")
+    if request.saree_pallu_base64:
+        image_contents.append(ImageContent(request.saree_pallu_base64))
+        saree_components_text += "Use the decorative pallu design from the uploaded pallu image. "
+        logging.info("Added saree pallu image for AI model generation")
         
-        # Analyze saree components for fallback
-        saree_design_details = await analyze_saree_components(
-            request.saree_body_base64,
-            request.saree_pallu_base64, 
-            request.saree_border_base64
+    if request.saree_border_base64:
+        image_contents.append(ImageContent(request.saree_border_base64))
+        saree_components_text += "Use the border pattern from the uploaded border image. "
+        logging.info("Added saree border image for AI model generation")
+    
+    # Create detailed prompt for AI model generation
+    if image_contents:
+        # Use uploaded saree components
+        model_generation_prompt = prompt_registry.render(
+            "nano_banana.components",
+            session_id=session_id,
+            components_text=saree_components_text.strip(),
+            blouse_description=BLOUSE_DESCRIPTIONS[request.blouse_style],
+            pose_description=POSE_DESCRIPTIONS[request.pose_style]
         )
         
-        # Create fallback prompt
-        fallback_prompt = f"""
-        Create a highly realistic photograph of a beautiful Indian woman wearing a {saree_description} in a {pose_descriptions[request.pose_style]} (Session: {session_id}).
-        
-        MODEL CHARACTERISTICS:
-        - Elegant Indian woman with natural features and warm complexion
-        - Professional model appearance suitable for saree photography
-        - Appropriate body proportions for traditional Indian attire
-        - Confident and graceful demeanor
-        - CONSISTENCY (ABSOLUTELY CRITICAL): If this is part of a multi-pose session, maintain the SAME MODEL appearance, facial features, skin tone, and body proportions
-        - BLOUSE CONSISTENCY: Use EXACTLY the same blouse color and design - {blouse_descriptions[request.blouse_style]} blouse
-        - HAIR & FACE CONSISTENCY (CRITICAL): 
-          * Maintain IDENTICAL hairstyle, hair length, hair color, and hair texture across poses
-          * Keep EXACTLY the same hair accessories (flowers, clips, ornaments) in the same positions
-          * If hair has braids or specific styling, maintain that exact pattern
-          * SAME facial structure, skin tone, eye shape, nose, lips - must look like the same person
-          * Hair and face should look like the same person photographed from different angles within 30 seconds
-        
-        SAREE DESIGN DETAILS:
-        {saree_design_details}
-        
-        TECHNICAL REQUIREMENTS:
-        - She should be wearing a {blouse_descriptions[request.blouse_style]} blouse with EXACT same color across poses
-        - SAREE DRAPING CONSISTENCY:
-          * Drape the saree authentically in traditional Indian style with proper pleats and pallu positioning
-          * Maintain IDENTICAL pleating patterns and pallu fall across all poses
-          * The pallu should drape in the same manner, just shown from different angles
-          * Keep the same saree length and how it touches the ground
-        - Professional photography quality with studio lighting
-        - Clean neutral background (light gray or white)
-        - Natural, elegant pose that showcases the saree beautifully
-        - High resolution (1024x1536) and photorealistic details
-        - The saree should look well-fitted and naturally draped with IDENTICAL patterns
-        - Maintain authentic Indian saree draping traditions
-        - SAME PHOTOGRAPHY SESSION FEEL: Ensure lighting, background, and MODEL CONSISTENCY across poses
-        - CRITICAL FINAL CHECK: This should look like the SAME woman wearing the SAME saree with SAME hair and accessories, photographed from different angles within the same 30-second time frame - NO variations in appearance, styling, or setup allowed
+        # Create message with saree component images
+        message = UserMessage(
+            text=model_generation_prompt,
+            file_contents=image_contents
+        )
+    else:
+        # Generate without uploaded components (using catalog or description)
+        model_generation_prompt = prompt_registry.render(
+            "nano_banana.description",
+            session_id=session_id,
+            saree_description=saree_description,
+            blouse_description=BLOUSE_DESCRIPTIONS[request.blouse_style],
+            pose_description=POSE_DESCRIPTIONS[request.pose_style]
+        )
         
-        STYLE: Professional fashion photography, high-end fashion shoot quality, perfect lighting, sharp focus
-        """
+        # Create text-only message
+        message = UserMessage(text=model_generation_prompt)
+    
+    logging.info(f"Sending AI model generation request with {len(image_contents)} saree component images to Nano Banana API...")
+    
+    # Send to Gemini for model generation with saree, continuing the session's chat when pooled
+    async with chat_sessions.lease(request.session_id, create_chat) as chat:
+        text_response, generated_images = await chat.send_message_multimodal_response(message)
+    
+    if generated_images and len(generated_images) > 0:
+        # Get the first generated image
+        result_image_data = generated_images[0]['data']  # This is base64
+        logging.info(f"Successfully generated AI model with saree via Nano Banana API")
+        
+        return result_image_data  # Return base64 directly
         
+    else:
+        logging.warning("No images returned from Nano Banana API")
+        raise Exception("No images generated from Nano Banana API")
+
+async def generate_with_openai(context: GenerationContext) -> str:
+    """Generate the try-on with OpenAI gpt-image-1 from a text description of the saree"""
+    request, session_id = context.request, context.session_id
+    saree_description = context.saree_description
+    
+    logging.info("Using OpenAI for AI model generation...")
+    
+    # Analyze saree components for fallback
+    saree_design_details = await analyze_saree_components(
+        request.saree_body_base64,
+        request.saree_pallu_base64, 
+        request.saree_border_base64
+    )
+    
+    # Create fallback prompt
+    fallback_prompt = prompt_registry.render(
+        "openai.fallback",
+        session_id=session_id,
+        saree_description=saree_description,
+        saree_design_details=saree_design_details,
+        blouse_description=BLOUSE_DESCRIPTIONS[request.blouse_style],
+        pose_description=POSE_DESCRIPTIONS[request.pose_style]
+    )
+    
+    result_images = await provider_clients.image_gen.generate_images(
+        prompt=fallback_prompt,
+        model="gpt-image-1",
+        number_of_images=1,
+        # Add consistent dimensions for OpenAI fallback
+        image_size="1024x1536"  # 2:3 aspect ratio
+    )
+    
+    if not result_images or len(result_images) == 0:
+        raise Exception("Failed to generate AI model with saree")
+    
+    return base64.b64encode(result_images[0]).decode('utf-8')
+
+# Provider routing
+class CircuitBreaker:
+    """Stops calling a provider after repeated failures until a cool-down has passed.
+
+    After the cool-down a single probe request is let through; its outcome closes the
+    breaker again or restarts the cool-down.
+    """
+
+    def __init__(self, failure_threshold: int, cooldown_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown_seconds:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """Give up a probe without an outcome, e.g. when a hedged call is cancelled"""
+        self._probing = False
+
+class ProviderRoute:
+    """One image provider with its own deadline, concurrency cap and circuit breaker"""
+
+    def __init__(self, name: str, generate, timeout: float, max_concurrency: int, breaker: CircuitBreaker):
+        self.name = name
+        self.generate = generate
+        self.timeout = timeout
+        self.breaker = breaker
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.stats = {"calls": 0, "successes": 0, "failures": 0, "timeouts": 0, "skipped": 0, "cancelled": 0}
+
+    def _record(self, outcome: str, started: float):
+        elapsed = time.perf_counter() - started
+        provider_requests.inc(provider=self.name, outcome=outcome)
+        provider_request_duration.observe(elapsed, provider=self.name, outcome=outcome)
+        record_span(f"provider_{self.name}", elapsed)
+
+    async def attempt(self, context: GenerationContext) -> str:
+        async with self._slots:
+            self.stats["calls"] += 1
+            started = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(self.generate(context), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                self._record("timeout", started)
+                self.breaker.record_failure()
+                raise Exception(f"timed out after {self.timeout:g}s")
+            except asyncio.CancelledError:
+                self.stats["cancelled"] += 1
+                self._record("cancelled", started)
+                self.breaker.release()
+                raise
+            except Exception:
+                self.stats["failures"] += 1
+                self._record("failure", started)
+                self.breaker.record_failure()
+                raise
+        self.stats["successes"] += 1
+        self._record("success", started)
+        self.breaker.record_success()
+        return result
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "timeout_seconds": self.timeout,
+        }
+
+class ProviderRouter:
+    """Tries providers in priority order, skipping those whose circuit is open.
+
+    With ``hedge_after`` set, the next provider is started when the current one has not
+    answered within that many seconds, and the first successful image wins.
+    """
+
+    def __init__(self, routes: List[ProviderRoute], hedge_after: float):
+        self.routes = routes
+        self.hedge_after = hedge_after
+
+    async def generate(self, context: GenerationContext) -> str:
+        remaining = iter(self.routes)
+        pending = {}
+        errors = []
+        launched = []
+
+        def launch_next() -> bool:
+            for route in remaining:
+                if route.breaker.allow():
+                    logging.info(f"Routing try-on generation to {route.name}")
+                    if launched:
+                        provider_fallbacks.inc(provider=route.name)
+                    launched.append(route)
+                    pending[asyncio.create_task(route.attempt(context))] = route
+                    return True
+                route.stats["skipped"] += 1
+                provider_requests.inc(provider=route.name, outcome="skipped")
+                logging.warning(f"Skipping {route.name}, circuit is {route.breaker.state}")
+            return False
+
+        can_hedge = launch_next()
         try:
-            result_images = await image_gen.generate_images(
-                prompt=fallback_prompt,
-                model="gpt-image-1",
-                number_of_images=1,
-                # Add consistent dimensions for OpenAI fallback
-                image_size="1024x1536"  # 2:3 aspect ratio
+            while pending:
+                hedge_timeout = self.hedge_after if self.hedge_after > 0 and can_hedge else None
+                done, _ = await asyncio.wait(pending, timeout=hedge_timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logging.info(f"No answer within {self.hedge_after:g}s, hedging with the next provider")
+                    can_hedge = launch_next()
+                    continue
+                for task in done:
+                    route = pending.pop(task)
+                    try:
+                        return task.result()
+                    except Exception as e:
+                        logging.error(f"{route.name} failed: {str(e)}")
+                        errors.append(f"{route.name}: {str(e)}")
+                if not pending:
+                    can_hedge = launch_next()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        detail = "; ".join(errors) if errors else "no provider available"
+        raise HTTPException(status_code=500, detail=f"AI model generation failed: {detail}")
+
+    def snapshot(self) -> dict:
+        return {route.name: route.snapshot() for route in self.routes}
+
+def build_provider_router() -> ProviderRouter:
+    def breaker():
+        return CircuitBreaker(
+            failure_threshold=int(os.environ.get('PROVIDER_BREAKER_FAILURES', '3')),
+            cooldown_seconds=float(os.environ.get('PROVIDER_BREAKER_COOLDOWN', '60')),
+        )
+    return ProviderRouter(
+        routes=[
+            ProviderRoute(
+                "nano_banana",
+                generate_with_nano_banana,
+                timeout=float(os.environ.get('PROVIDER_NANO_BANANA_TIMEOUT', '90')),
+                max_concurrency=int(os.environ.get('PROVIDER_NANO_BANANA_MAX_CONCURRENCY', '8')),
+                breaker=breaker(),
+            ),
+            ProviderRoute(
+                "openai",
+                generate_with_openai,
+                timeout=float(os.environ.get('PROVIDER_OPENAI_TIMEOUT', '120')),
+                max_concurrency=int(os.environ.get('PROVIDER_OPENAI_MAX_CONCURRENCY', '4')),
+                breaker=breaker(),
+            ),
+        ],
+        # 0 disables hedging: the fallback only starts once the primary has failed
+        hedge_after=float(os.environ.get('PROVIDER_HEDGE_AFTER', '0')),
+    )
+
+provider_router = build_provider_router()
+
+async def generate_tryon_image(request: TryOnRequest) -> str:
+    """Return the try-on image for a request, skipping the provider on cache hits"""
+    # Prompt changes alter the output, so AI renders are keyed by prompt version too
+    generator = "mock" if not api_key or api_key == 'your_api_key_here' else f"ai:{prompt_registry.version}"
+    cache_key = tryon_cache.key_for(request, generator)
+
+    with stage_timer("cache_lookup"):
+        cached_image = await tryon_cache.get(cache_key)
+    if cached_image is not None:
+        logging.info(f"Serving try-on for pose {request.pose_style} from result cache ({cache_key[:12]})")
+        return cached_image
+
+    result_image_base64 = await process_virtual_tryon(request)
+    with stage_timer("cache_store"):
+        await tryon_cache.put(cache_key, result_image_base64)
+    return result_image_base64
+
+# Try-on job queue
+class TryOnJobQueue:
+    """MongoDB-backed queue of try-on jobs drained by a fixed pool of asyncio workers.
+
+    A worker claims a job by pushing its ``visible_at`` past the visibility timeout and
+    keeps extending it while the job runs, so jobs held by a crashed process become
+    claimable again once the timeout lapses.
+    """
+
+    ACTIVE_STATUSES = ["queued", "running"]
+
+    def __init__(self, collection, workers: int, max_queue: int, visibility_timeout: int,
+                 max_attempts: int, poll_interval: float, retention_seconds: int):
+        self.collection = collection
+        self.workers = workers
+        self.max_queue = max_queue
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("id", unique=True)
+        await self.collection.create_index([("status", 1), ("visible_at", 1), ("created_at", 1)])
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def depth(self) -> int:
+        return await self.collection.count_documents({"status": {"$in": self.ACTIVE_STATUSES}})
+
+    async def enqueue(self, request: TryOnRequest) -> dict:
+        if await self.depth() >= self.max_queue:
+            raise HTTPException(
+                status_code=503,
+                detail="Try-on queue is full, please retry shortly",
+                headers={"Retry-After": str(max(1, int(self.poll_interval * 5)))},
             )
-            
-            if not result_images or len(result_images) == 0:
-                raise HTTPException(status_code=500, detail="Failed to generate AI model with saree")
-            
-            return base64.b64encode(result_images[0]).decode('utf-8')
-            
-        except Exception as fallback_error:
-            logging.error(f"Fallback generation also failed: {str(fallback_error)}")
-            raise HTTPException(status_code=500, detail=f"AI model generation failed: {str(fallback_error)}")
+
+        now = datetime.utcnow()
+        job = {
+            "id": str(uuid.uuid4()),
+            "status": "queued",
+            "progress": "queued",
+            "request": request.dict(),
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now,
+            "visible_at": now,
+            "result_id": None,
+            "error": None,
+        }
+        await self.collection.insert_one(job)
+        self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"id": job_id}, {"_id": 0, "request": 0})
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker(f"worker-{n}")) for n in range(self.workers)]
+        logging.info(f"Started {self.workers} try-on job workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _claim(self, worker: str) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"status": {"$in": self.ACTIVE_STATUSES}, "visible_at": {"$lte": now}},
+            {
+                "$set": {
+                    "status": "running",
+                    "progress": "generating",
+                    "worker": worker,
+                    "updated_at": now,
+                    "visible_at": now + timedelta(seconds=self.visibility_timeout),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _update(self, job: dict, fields: dict, unset: Optional[dict] = None):
+        """Update a claimed job, ignoring the write if another worker has since reclaimed it"""
+        update = {"$set": {**fields, "updated_at": datetime.utcnow()}}
+        if unset:
+            update["$unset"] = unset
+        await self.collection.update_one(
+            {"id": job["id"], "worker": job["worker"], "attempts": job["attempts"]},
+            update,
+        )
+
+    async def _heartbeat(self, job: dict):
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            await self._update(job, {"visible_at": datetime.utcnow() + timedelta(seconds=self.visibility_timeout)})
+
+    def _finished(self, status: str, **fields) -> dict:
+        now = datetime.utcnow()
+        return {
+            **fields,
+            "status": status,
+            "progress": status,
+            "finished_at": now,
+            "expires_at": now + timedelta(seconds=self.retention_seconds),
+        }
+
+    async def _run(self, job: dict):
+        if job["attempts"] > self.max_attempts:
+            await self._update(job, self._finished("failed", error="Exceeded maximum attempts"), unset={"request": ""})
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            request = TryOnRequest(**job["request"])
+            result_image_base64 = await generate_tryon_image(request)
+
+            await self._update(job, {"progress": "saving"})
+            tryon_result = await build_tryon_result(request, result_image_base64)
+            with stage_timer("db_insert"):
+                await db.virtual_tryons.insert_one(tryon_result.dict(exclude={"result_image_base64"}))
+
+            await self._update(job, self._finished("completed", result_id=tryon_result.id), unset={"request": ""})
+            logging.info(f"Try-on job {job['id']} completed")
+        except Exception as e:
+            # Invalid requests will never succeed, anything else is retried after a backoff
+            permanent = isinstance(e, HTTPException) and e.status_code < 500
+            error = e.detail if isinstance(e, HTTPException) else str(e)
+            logging.error(f"Try-on job {job['id']} attempt {job['attempts']} failed: {error}")
+            if permanent or job["attempts"] >= self.max_attempts:
+                await self._update(job, self._finished("failed", error=error), unset={"request": ""})
+            else:
+                retry_at = datetime.utcnow() + timedelta(seconds=self.poll_interval * 2 ** job["attempts"])
+                await self._update(job, {"status": "queued", "progress": "retrying", "error": error, "visible_at": retry_at})
+        finally:
+            heartbeat.cancel()
+
+    async def _worker(self, worker: str):
+        while True:
+            try:
+                job = await self._claim(worker)
+            except Exception as e:
+                logging.warning(f"Try-on {worker} could not claim a job: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run(job)
+
+tryon_jobs = TryOnJobQueue(
+    db.tryon_jobs,
+    workers=int(os.environ.get('TRYON_JOB_WORKERS', '2')),
+    max_queue=int(os.environ.get('TRYON_JOB_MAX_QUEUE', '100')),
+    visibility_timeout=int(os.environ.get('TRYON_JOB_VISIBILITY_TIMEOUT', '300')),
+    max_attempts=int(os.environ.get('TRYON_JOB_MAX_ATTEMPTS', '3')),
+    poll_interval=float(os.environ.get('TRYON_JOB_POLL_INTERVAL', '2')),
+    retention_seconds=int(os.environ.get('TRYON_JOB_RETENTION_SECONDS', str(24 * 3600))),
+)
+
+@api_router.post("/jobs/virtual-tryon", status_code=202)
+async def enqueue_virtual_tryon(request: TryOnRequest):
+    # Reject unsupported styles before they occupy a queue slot
+    validate_tryon_styles(request)
+    # Queued jobs store the smaller normalized uploads
+    request = await prepare_tryon_request(request)
+    job = await tryon_jobs.enqueue(request)
+    logging.info(f"Queued try-on job {job['id']} for pose: {request.pose_style}")
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "status_url": f"/api/jobs/{job['id']}"
+    }
+
+@api_router.get("/jobs/{job_id}")
+async def get_tryon_job(job_id: str):
+    job = await tryon_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Try-on job not found")
+    
+    response = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "progress": job.get("progress"),
+        "attempts": job.get("attempts", 0),
+        "created_at": job["created_at"],
+        "updated_at": job.get("updated_at"),
+        "error": job.get("error"),
+        "result": None
+    }
+    
+    if job["status"] == "completed" and job.get("result_id"):
+        tryon = await db.virtual_tryons.find_one({"id": job["result_id"]})
+        if tryon:
+            response["result"] = {
+                "id": tryon["id"],
+                "result_image_base64": await resolve_tryon_image(tryon),
+                "pose_style": tryon["pose_style"],
+                "blouse_style": tryon["blouse_style"]
+            }
+    
+    return response
 
 # Favorites API
 @api_router.post("/favorites")
@@ -542,12 +3071,107 @@ async def add_to_favorites(favorite: FavoriteTryOn):
         raise HTTPException(status_code=500, detail=f"Failed to add to favorites: {str(e)}")
 
 @api_router.get("/favorites/{user_id}")
-async def get_user_favorites(user_id: str):
+async def get_user_favorites(user_id: str, request: Request):
+    async def attach_images(favorites):
+        images = await asyncio.gather(*(resolve_tryon_image(fav) for fav in favorites))
+        return [{**fav, "result_image_base64": image} for fav, image in zip(favorites, images)]
+    
+    try:
+        cursor = db.virtual_tryons.find({"user_id": user_id, "is_favorite": True}, {"_id": 0}).limit(1000)
+        return await stream_documents(request, cursor, TryOnResult, prepare=attach_images)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get favorites: {str(e)}")
+
+async def set_favorites(request: BulkFavoritesRequest, is_favorite: bool) -> dict:
+    """Flag or unflag many try-ons with one read for per-id outcomes and one update_many"""
+    tryon_ids = list(dict.fromkeys(request.tryon_ids))
+    query = {"id": {"$in": tryon_ids}}
+    if request.user_id and not is_favorite:
+        query["user_id"] = request.user_id
+    
+    try:
+        current = {
+            tryon["id"]: tryon.get("is_favorite", False)
+            for tryon in await db.virtual_tryons.find(query, {"_id": 0, "id": 1, "is_favorite": 1}).to_list(len(tryon_ids))
+        }
+        changed = [tryon_id for tryon_id in tryon_ids if tryon_id in current and current[tryon_id] != is_favorite]
+        
+        if changed:
+            # The flag condition keeps a concurrent change from being counted twice; like the
+            # single add, only the flag is written so a try-on never changes owner here
+            result = await db.virtual_tryons.update_many(
+                {"id": {"$in": changed}, "is_favorite": {"$ne": is_favorite}},
+                {"$set": {"is_favorite": is_favorite}}
+            )
+            logging.info(f"{'Added' if is_favorite else 'Removed'} {result.modified_count} favorites in bulk")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to update favorites: {str(e)}")
+    
+    changed_status, unchanged_status = ("added", "already_favorite") if is_favorite else ("removed", "not_favorite")
+    results = [
+        {
+            "tryon_id": tryon_id,
+            "status": "not_found" if tryon_id not in current else changed_status if tryon_id in changed else unchanged_status
+        }
+        for tryon_id in tryon_ids
+    ]
+    return {"updated": len(changed), "results": results}
+
+@api_router.post("/favorites/bulk-add")
+async def add_favorites_bulk(request: BulkFavoritesRequest):
+    return await set_favorites(request, True)
+
+@api_router.post("/favorites/bulk-remove")
+async def remove_favorites_bulk(request: BulkFavoritesRequest):
+    return await set_favorites(request, False)
+
+FAVORITES_PAGE_SORT = [("timestamp", -1), ("id", -1)]
+# Everything a favorites card shows; the image itself is fetched by URL
+FAVORITES_PAGE_PROJECTION = {
+    "_id": 0, "id": 1, "user_id": 1, "pose_style": 1, "blouse_style": 1,
+    "saree_details": 1, "timestamp": 1, "is_favorite": 1
+}
+
+def tryon_image_url(tryon_id: str, size: Optional[str] = None) -> str:
+    url = f"/api/tryon/{tryon_id}/image"
+    return f"{url}?size={size}" if size else url
+
+@api_router.get("/favorites/{user_id}/page")
+async def get_user_favorites_page(
+    user_id: str,
+    limit: int = Query(24, ge=1, le=100),
+    cursor: Optional[str] = None,
+    image_size: Optional[str] = None,
+    include_total: bool = True
+):
+    """Keyset-paginated favorites, newest first, with image URLs in place of the image payloads"""
+    if image_size is not None and image_size not in IMAGE_DERIVATIVE_SIZES:
+        raise HTTPException(status_code=400, detail=f"Invalid image_size. Must be one of: {list(IMAGE_DERIVATIVE_SIZES)}")
+    
+    query = {"user_id": user_id, "is_favorite": True}
+    page_query = {**query, **decode_page_cursor(cursor)} if cursor else query
+    
     try:
-        favorites = await db.virtual_tryons.find({"user_id": user_id, "is_favorite": True}).to_list(1000)
-        return [TryOnResult(**fav) for fav in favorites]
+        # Fetch one extra item to know whether another page exists; the count only reads the index
+        page = db.virtual_tryons.find(page_query, FAVORITES_PAGE_PROJECTION).sort(FAVORITES_PAGE_SORT).limit(limit + 1)
+        if include_total:
+            favorites, total = await asyncio.gather(page.to_list(limit + 1), db.virtual_tryons.count_documents(query))
+        else:
+            favorites, total = await page.to_list(limit + 1), None
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get favorites: {str(e)}")
+    
+    has_more = len(favorites) > limit
+    favorites = favorites[:limit]
+    for favorite in favorites:
+        favorite["image_url"] = tryon_image_url(favorite["id"], image_size)
+        favorite["thumbnail_url"] = tryon_image_url(favorite["id"], "thumb")
+    
+    return {
+        "items": favorites,
+        "total": total,
+        "next_cursor": encode_page_cursor(favorites[-1]) if has_more else None
+    }
 
 @api_router.delete("/favorites/{tryon_id}")
 async def remove_from_favorites(tryon_id: str):
@@ -575,7 +3199,7 @@ async def get_tryon_image(tryon_id: str):
             raise HTTPException(status_code=404, detail="Try-on result not found")
         
         return {
-            "image_base64": tryon["result_image_base64"],
+            "image_base64": await resolve_tryon_image(tryon),
             "pose_style": tryon["pose_style"],
             "blouse_style": tryon["blouse_style"]
         }
@@ -584,6 +3208,676 @@ async def get_tryon_image(tryon_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get try-on image: {str(e)}")
 
+@api_router.get("/tryon/{tryon_id}/image")
+async def stream_tryon_image(tryon_id: str, http_request: Request, size: Optional[str] = None, format: Optional[str] = None):
+    tryon = await db.virtual_tryons.find_one(
+        {"id": tryon_id},
+        {"_id": 0, "result_image_ref": 1, "result_content_type": 1, "result_derivatives": 1, "result_image_base64": 1}
+    )
+    if not tryon:
+        raise HTTPException(status_code=404, detail="Try-on result not found")
+    
+    if not tryon.get("result_image_ref"):
+        # Legacy inline image that the background migration (schema migration 3) has not reached yet
+        image_bytes = base64.b64decode(tryon["result_image_base64"])
+        tryon["result_image_ref"] = await blob_store.put(image_bytes)
+        tryon["result_content_type"] = sniff_image_type(image_bytes)
+        await db.virtual_tryons.update_one(
+            {"id": tryon_id},
+            {
+                "$set": {"result_image_ref": tryon["result_image_ref"], "result_content_type": tryon["result_content_type"]},
+                "$unset": {"result_image_base64": ""}
+            }
+        )
+    
+    derivatives = tryon.get("result_derivatives")
+    if size is not None and derivatives is None:
+        # Stored before its background render finished, or a derivative shared with another try-on
+        derivatives = await image_derivatives.get(tryon["result_image_ref"])
+    digest, content_type, variant_headers = select_image_variant(
+        http_request, tryon["result_image_ref"], tryon.get("result_content_type") or "image/png",
+        derivatives, size, format
+    )
+    return await blob_response(http_request, digest, content_type, variant_headers)
+
+# Schema migrations
+SCHEMA_MIGRATIONS = []
+# A claim not renewed for this long belongs to a worker that died mid-migration
+MIGRATION_LEASE_SECONDS = int(os.environ.get('MIGRATION_LEASE_SECONDS', '120'))
+
+def schema_migration(version: int, description: str, background: bool = False):
+    """Register an idempotent migration, applied once per database in version order.
+
+    Background migrations move data rather than build indexes, so startup does not wait
+    for them; they run after the synchronous ones in a task of their own.
+    """
+    def register(func):
+        SCHEMA_MIGRATIONS.append((version, description, background, func))
+        SCHEMA_MIGRATIONS.sort(key=lambda migration: migration[0])
+        return func
+    return register
+
+@schema_migration(1, "Indexes for catalog, try-on and favorites queries")
+async def create_core_indexes():
+    await db.saree_catalog.create_index("id", unique=True)
+    await db.saree_catalog.create_index(CATALOG_PAGE_SORT)
+    await db.saree_catalog.create_index([("category", 1)] + CATALOG_PAGE_SORT)
+    await db.virtual_tryons.create_index("id", unique=True)
+    await db.virtual_tryons.create_index([("user_id", 1), ("is_favorite", 1), ("timestamp", -1)])
+
+@schema_migration(2, "Indexes for the result cache and job queue")
+async def create_cache_and_job_indexes():
+    await tryon_cache.ensure_indexes()
+    await tryon_jobs.ensure_indexes()
+
+@schema_migration(3, "Move inline try-on images into the blob store", background=True)
+async def move_tryon_images_to_blob_store():
+    migrated = await migrate_inline_tryon_images()
+    logging.info(f"Moved {migrated} try-on images to the blob store")
+
+@schema_migration(4, "Indexes for try-on assets")
+async def create_asset_indexes():
+    await tryon_assets.ensure_indexes()
+
+@schema_migration(5, "Keyset index for favorites pages")
+async def create_favorites_page_index():
+    await db.virtual_tryons.create_index([("user_id", 1), ("is_favorite", 1)] + FAVORITES_PAGE_SORT)
+    # The new index starts with every key of the old one, which now only costs writes
+    try:
+        await db.virtual_tryons.drop_index("user_id_1_is_favorite_1_timestamp_-1")
+    except OperationFailure:
+        pass
+
+@schema_migration(6, "Text and facet indexes for catalog search")
+async def create_catalog_search_indexes():
+    await db.saree_catalog.create_index(
+        [("name", "text"), ("description", "text"), ("color", "text"), ("pattern", "text"), ("category", "text")],
+        name="catalog_text",
+        weights={"name": 10, "color": 5, "pattern": 5, "category": 3, "description": 1}
+    )
+    await db.saree_catalog.create_index([("color", 1)] + CATALOG_PAGE_SORT)
+    await db.saree_catalog.create_index([("pattern", 1)] + CATALOG_PAGE_SORT)
+
+async def claim_schema_migration(version: int, description: str, owner: str) -> bool:
+    """Take the lease on a migration: fresh, after a failed attempt, or from a worker that stopped renewing it"""
+    now = datetime.utcnow()
+    claim = {"description": description, "status": "running", "owner": owner, "started_at": now, "renewed_at": now}
+    try:
+        await db.schema_migrations.insert_one({"_id": version, **claim})
+        return True
+    except DuplicateKeyError:
+        pass
+    
+    expired = now - timedelta(seconds=MIGRATION_LEASE_SECONDS)
+    result = await db.schema_migrations.update_one(
+        {
+            "_id": version,
+            "$or": [
+                {"status": "failed"},
+                {"status": "running", "renewed_at": {"$lte": expired}},
+                # Claims recorded before leases were renewed only carry started_at
+                {"status": "running", "renewed_at": {"$exists": False}, "started_at": {"$lte": expired}}
+            ]
+        },
+        {"$set": claim, "$unset": {"error": "", "failed_at": ""}}
+    )
+    if result.modified_count:
+        logging.warning(f"Retrying schema migration {version}, it failed or its worker's lease expired")
+    return bool(result.modified_count)
+
+async def renew_schema_migration(version: int, owner: str):
+    while True:
+        await asyncio.sleep(MIGRATION_LEASE_SECONDS / 3)
+        await db.schema_migrations.update_one(
+            {"_id": version, "owner": owner},
+            {"$set": {"renewed_at": datetime.utcnow()}}
+        )
+
+async def apply_schema_migrations(background: bool = False):
+    """Apply pending migrations, recording each in schema_migrations.
+
+    A migration is claimed by inserting its version as ``_id`` before it runs, so when
+    several workers start together only one of them applies it. The claim is a lease
+    renewed while the migration runs; if its worker dies, another one takes it over
+    once the lease expires. ``background`` selects which kind of migration to apply.
+    
+    A failure is recorded as ``status: "failed"`` with its error and re-raised; later
+    versions may build on it, so they wait for the next start, which retries it.
+    """
+    owner = uuid.uuid4().hex
+    for version, description, runs_in_background, migrate in SCHEMA_MIGRATIONS:
+        if runs_in_background != background:
+            continue
+        if not await claim_schema_migration(version, description, owner):
+            continue
+        
+        logging.info(f"Applying schema migration {version}: {description}")
+        renewal = asyncio.create_task(renew_schema_migration(version, owner))
+        try:
+            await migrate()
+        except Exception as e:
+            await db.schema_migrations.update_one(
+                {"_id": version, "owner": owner},
+                {"$set": {"status": "failed", "error": f"{type(e).__name__}: {e}", "failed_at": datetime.utcnow()}}
+            )
+            raise RuntimeError(f"Schema migration {version} ({description}) failed: {e}") from e
+        finally:
+            renewal.cancel()
+        await db.schema_migrations.update_one(
+            {"_id": version, "owner": owner},
+            {"$set": {"status": "applied", "applied_at": datetime.utcnow()}}
+        )
+
+# Every query on a request path, checked by verify_query_plans
+HOT_QUERIES = {
+    "saree_catalog.by_id": lambda: db.saree_catalog.find({"id": ""}),
+    "saree_catalog.by_category": lambda: db.saree_catalog.find({"category": ""}),
+    "saree_catalog.page": lambda: db.saree_catalog.find({}).sort(CATALOG_PAGE_SORT).limit(25),
+    "saree_catalog.page_by_category": lambda: db.saree_catalog.find({"category": ""}).sort(CATALOG_PAGE_SORT).limit(25),
+    "saree_catalog.search_by_color": lambda: db.saree_catalog.find({"color": ""}).sort(CATALOG_PAGE_SORT).limit(25),
+    "saree_catalog.search_by_pattern": lambda: db.saree_catalog.find({"pattern": ""}).sort(CATALOG_PAGE_SORT).limit(25),
+    "saree_catalog.text_search": lambda: db.saree_catalog.find({"$text": {"$search": "silk"}}),
+    "virtual_tryons.by_id": lambda: db.virtual_tryons.find({"id": ""}),
+    "virtual_tryons.favorites": lambda: db.virtual_tryons.find({"user_id": "", "is_favorite": True}),
+    "virtual_tryons.favorites_page": lambda: db.virtual_tryons.find(
+        {"user_id": "", "is_favorite": True}, FAVORITES_PAGE_PROJECTION
+    ).sort(FAVORITES_PAGE_SORT).limit(25),
+    "tryon_cache.by_key": lambda: tryon_cache.collection.find({"key": "", "expires_at": {"$gt": datetime.utcnow()}}),
+    "tryon_jobs.by_id": lambda: tryon_jobs.collection.find({"id": ""}),
+    "tryon_assets.by_id": lambda: tryon_assets.collection.find({"id": "", "expires_at": {"$gt": datetime.utcnow()}}),
+    "tryon_assets.expired": lambda: tryon_assets.collection.find({"expires_at": {"$lte": datetime.utcnow()}}).limit(500),
+    "tryon_jobs.claim": lambda: tryon_jobs.collection.find(
+        {"status": {"$in": TryOnJobQueue.ACTIVE_STATUSES}, "visible_at": {"$lte": datetime.utcnow()}}
+    ).sort("created_at", 1).limit(1),
+}
+
+def plan_stages(plan) -> List[str]:
+    """Every stage name in an explain() plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(plan_stages(value))
+    return stages
+
+async def verify_query_plans() -> dict:
+    """Explain every hot query and raise if any winning plan falls back to a collection scan"""
+    report = {}
+    for name, build_query in HOT_QUERIES.items():
+        explanation = await build_query().explain()
+        report[name] = plan_stages(explanation.get("queryPlanner", {}).get("winningPlan", {}))
+    
+    collection_scans = [name for name, stages in report.items() if "COLLSCAN" in stages]
+    if collection_scans:
+        raise RuntimeError(f"Queries fall back to COLLSCAN: {', '.join(collection_scans)}")
+    return report
+
+async def schema_status() -> dict:
+    """Applied, failed and pending schema migrations as recorded in schema_migrations"""
+    records = {
+        record["_id"]: record
+        async for record in db.schema_migrations.find({}, {"_id": 1, "status": 1, "error": 1})
+    }
+    applied = [version for version, record in records.items() if record.get("status") == "applied"]
+    return {
+        "version": max(applied, default=0),
+        "latest": SCHEMA_MIGRATIONS[-1][0],
+        "pending": [version for version, *_ in SCHEMA_MIGRATIONS if version not in applied],
+        "failed": [
+            {"version": version, "error": record.get("error")}
+            for version, record in sorted(records.items()) if record.get("status") == "failed"
+        ],
+    }
+
+@api_router.get("/health")
+async def get_health():
+    schema = await schema_status()
+    return {"status": "degraded" if schema["failed"] else "ok", "schema": schema}
+
+# Admission control
+class AdmissionRejected(Exception):
+    def __init__(self, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+class GenerationAdmission:
+    """Caps concurrent generations, with a bounded FIFO of requests waiting for a slot.
+
+    Each admitted request holds ``weight`` slots (one per pose it renders). Requests that
+    find the wait queue full, or that wait longer than ``max_wait`` seconds, are rejected
+    so that a spike turns into fast 429s instead of unbounded provider fan-out.
+    """
+
+    def __init__(self, max_active: int, max_waiting: int, max_wait: float):
+        self.max_active = max_active
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self.active = 0
+        self._waiters = deque()
+        self._avg_hold = 1.0  # Moving average of seconds a slot is held, for Retry-After
+        self.stats = {"admitted": 0, "queued": 0, "rejected_queue_full": 0, "rejected_wait_timeout": 0}
+
+    def _retry_after(self) -> float:
+        return self._avg_hold * (len(self._waiters) + 1) / self.max_active
+
+    def _wake(self):
+        while self._waiters:
+            waiter, weight = self._waiters[0]
+            if waiter.done():
+                self._waiters.popleft()
+                continue
+            if self.active + weight > self.max_active:
+                break
+            self._waiters.popleft()
+            self.active += weight
+            waiter.set_result(None)
+
+    async def acquire(self, weight: int):
+        weight = min(weight, self.max_active)
+        if not self._waiters and self.active + weight <= self.max_active:
+            self.active += weight
+            self.stats["admitted"] += 1
+            return
+        if len(self._waiters) >= self.max_waiting:
+            self.stats["rejected_queue_full"] += 1
+            raise AdmissionRejected("Too many try-ons in progress, please retry shortly", self._retry_after())
+        
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append((waiter, weight))
+        self.stats["queued"] += 1
+        try:
+            await asyncio.wait_for(waiter, timeout=self.max_wait)
+        except BaseException as e:
+            # The slot may have been granted just as the wait ended
+            if waiter.done() and not waiter.cancelled():
+                self.release(weight, 0)
+            else:
+                waiter.cancel()
+                self._wake()
+            if isinstance(e, asyncio.TimeoutError):
+                self.stats["rejected_wait_timeout"] += 1
+                raise AdmissionRejected("Timed out waiting for a free try-on slot, please retry shortly", self._retry_after())
+            raise
+        self.stats["admitted"] += 1
+
+    def release(self, weight: int, held_seconds: float):
+        self.active -= min(weight, self.max_active)
+        if held_seconds:
+            self._avg_hold = 0.9 * self._avg_hold + 0.1 * held_seconds
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, weight: int = 1):
+        await self.acquire(weight)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(weight, time.monotonic() - started)
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "active": self.active,
+            "waiting": len(self._waiters),
+            "max_active": self.max_active,
+            "max_waiting": self.max_waiting,
+            "avg_hold_seconds": round(self._avg_hold, 3),
+        }
+
+class ClientRateLimiter:
+    """Token bucket per client, refilled at ``rate`` tokens a second up to ``burst``.
+
+    Buckets live in a bounded LRU so a flood of distinct clients cannot grow memory.
+    """
+
+    def __init__(self, rate: float, burst: float, max_clients: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = BoundedLRU(max_clients)  # client -> (tokens, updated at)
+        self.stats = {"allowed": 0, "rejected": 0}
+
+    def check(self, clients: List[str], cost: float = 1):
+        """Charge ``cost`` to every bucket in ``clients``, or to none of them if any is short"""
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        balances = {}
+        for client in clients:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            balances[client] = min(self.burst, tokens + (now - updated) * self.rate)
+        
+        lowest = min(balances.values())
+        allowed = lowest >= cost
+        for client, tokens in balances.items():
+            self._buckets.put(client, (tokens - cost if allowed else tokens, now))
+        
+        if not allowed:
+            self.stats["rejected"] += 1
+            raise AdmissionRejected("Rate limit exceeded, please slow down", (min(cost, self.burst) - lowest) / self.rate)
+        self.stats["allowed"] += 1
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "clients": len(self._buckets), "rate_per_second": self.rate, "burst": self.burst}
+
+generation_admission = GenerationAdmission(
+    max_active=int(os.environ.get('GENERATION_MAX_CONCURRENCY', '8')),
+    max_waiting=int(os.environ.get('GENERATION_MAX_WAITING', '32')),
+    max_wait=float(os.environ.get('GENERATION_MAX_WAIT_SECONDS', '30')),
+)
+
+client_rate_limiter = ClientRateLimiter(
+    rate=float(os.environ.get('RATE_LIMIT_PER_MINUTE', '60')) / 60,
+    burst=float(os.environ.get('RATE_LIMIT_BURST', '30')),
+    max_clients=int(os.environ.get('RATE_LIMIT_MAX_CLIENTS', '10000')),
+)
+
+# Generation endpoints -> concurrency slots held while they run (the job queue bounds its own work)
+GENERATION_ENDPOINTS = {
+    "/api/virtual-tryon": 1,
+    "/api/virtual-tryon/upload": 1,
+    "/api/virtual-tryon/batch": len(VALID_POSES),
+    "/api/jobs/virtual-tryon": 0,
+}
+
+# Number of proxies in front of the app that append the address they received a request
+# from to X-Forwarded-For. The default of 0 rate limits by the TCP peer address and ignores
+# the header, which any client can set; behind one load balancer or ingress set it to 1.
+# Setting it higher than the real number of proxies lets clients pick their own address.
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', '0'))
+
+def client_address(request: Request) -> str:
+    """Address of the client as seen by the outermost trusted proxy.
+
+    Hops to the left of the ones our proxies appended are whatever the client sent, so
+    only the right-most ``TRUSTED_PROXY_HOPS`` entries of X-Forwarded-For are believed.
+    """
+    peer = request.client.host if request.client else "unknown"
+    if TRUSTED_PROXY_HOPS <= 0:
+        return peer
+    hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    if len(hops) < TRUSTED_PROXY_HOPS:
+        return peer
+    return hops[-TRUSTED_PROXY_HOPS]
+
+def client_identities(request: Request) -> List[str]:
+    """Rate limit buckets charged for a request: always the address, plus the user id when sent.
+
+    The user id header is not authenticated, so it can only add a limit, never replace
+    the per-address one.
+    """
+    identities = [f"ip:{client_address(request)}"]
+    user_id = request.headers.get("x-user-id")
+    if user_id:
+        identities.append(f"user:{user_id}")
+    return identities
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    # Runs before the body is read, so rejected requests never buffer their images
+    weight = GENERATION_ENDPOINTS.get(request.url.path) if request.method == "POST" else None
+    if weight is None:
+        return await call_next(request)
+    
+    try:
+        client_rate_limiter.check(client_identities(request))
+        if not weight:
+            return await call_next(request)
+        async with generation_admission.slot(weight):
+            return await call_next(request)
+    except AdmissionRejected as e:
+        logging.warning(f"Rejected {request.url.path} from {client_address(request)}: {e.detail}")
+        return JSONResponse(status_code=429, content={"detail": e.detail}, headers={"Retry-After": str(e.retry_after)})
+
+# Metrics endpoint
+# Counters kept by the existing stats snapshots, read at scrape time
+metrics.callback(
+    "generation_admission_active", "Concurrency slots held by running generations", "gauge",
+    lambda: [({}, generation_admission.snapshot()["active"])],
+)
+metrics.callback(
+    "generation_admission_waiting", "Generation requests waiting for a concurrency slot", "gauge",
+    lambda: [({}, generation_admission.snapshot()["waiting"])],
+)
+metrics.callback(
+    "generation_admission_rejections_total", "Generation requests answered with 429, by cause", "counter",
+    lambda: [
+        ({"cause": "queue_full"}, generation_admission.stats["rejected_queue_full"]),
+        ({"cause": "wait_timeout"}, generation_admission.stats["rejected_wait_timeout"]),
+        ({"cause": "rate_limit"}, client_rate_limiter.stats["rejected"]),
+    ],
+)
+metrics.callback(
+    "tryon_cache_lookups_total", "Try-on result cache lookups by result", "counter",
+    lambda: [
+        ({"result": "memory_hit"}, tryon_cache.stats["memory_hits"]),
+        ({"result": "persistent_hit"}, tryon_cache.stats["persistent_hits"]),
+        ({"result": "miss"}, tryon_cache.stats["misses"]),
+    ],
+)
+metrics.callback(
+    "provider_circuit_open", "1 while a provider's circuit breaker is not closed", "gauge",
+    lambda: [({"provider": route.name}, int(route.breaker.state != "closed")) for route in provider_router.routes],
+)
+metrics.callback(
+    "chat_session_pool_size", "Gemini chats kept for reuse across requests", "gauge",
+    lambda: [({}, chat_sessions.snapshot()["size"])],
+)
+metrics.callback(
+    "chat_session_pool_busy", "Pooled Gemini chats leased to a running request", "gauge",
+    lambda: [({}, chat_sessions.snapshot()["busy"])],
+)
+
+def stats_counter(name: str, help_text: str, label: str, stats: dict, keys: tuple):
+    """Counter with one series per ``keys`` entry of a component's ``stats`` dict"""
+    return metrics.callback(name, help_text, "counter", lambda: [({label: key}, stats[key]) for key in keys])
+
+stats_counter(
+    "chat_session_events_total", "Gemini chat pool leases and evictions, by event", "event", chat_sessions.stats,
+    ("created", "reused", "waited", "transient", "lru_evictions", "idle_evictions", "discarded", "retired"),
+)
+stats_counter(
+    "generation_admission_events_total", "Generation requests admitted, and those that queued first", "event",
+    generation_admission.stats, ("admitted", "queued"),
+)
+stats_counter(
+    "rate_limit_decisions_total", "Per-client rate limit checks, by decision", "decision",
+    client_rate_limiter.stats, ("allowed", "rejected"),
+)
+metrics.callback(
+    "rate_limit_clients", "Clients with a token bucket", "gauge",
+    lambda: [({}, client_rate_limiter.snapshot()["clients"])],
+)
+stats_counter(
+    "tryon_cache_events_total", "Try-on result cache stores and evictions, by event", "event", tryon_cache.stats,
+    ("stores", "memory_evictions", "persistent_evictions"),
+)
+metrics.callback(
+    "tryon_cache_memory_entries", "Try-on results held in the memory tier", "gauge",
+    lambda: [({}, tryon_cache.snapshot()["memory_entries"])],
+)
+metrics.callback(
+    "tryon_cache_memory_bytes", "Bytes of try-on results held in the memory tier", "gauge",
+    lambda: [({}, tryon_cache.snapshot()["memory_bytes"])],
+)
+stats_counter(
+    "catalog_cache_events_total", "Catalog cache lookups, invalidations and version checks, by event", "event",
+    catalog_cache.stats, ("hits", "misses", "invalidations", "version_checks", "bumps"),
+)
+metrics.callback(
+    "catalog_cache_entries", "Catalog listings and items held in the cache", "gauge",
+    lambda: [({}, catalog_cache.snapshot()["entries"])],
+)
+metrics.callback(
+    "catalog_cache_bytes", "Estimated bytes held in the catalog cache", "gauge",
+    lambda: [({}, catalog_cache.snapshot()["estimated_bytes"])],
+)
+stats_counter(
+    "catalog_facet_cache_events_total", "Catalog search facet cache lookups and invalidations, by event", "event",
+    catalog_facets.stats, ("hits", "misses", "invalidations"),
+)
+metrics.callback(
+    "catalog_facet_cache_entries", "Facet counts held in the catalog search cache", "gauge",
+    lambda: [({}, catalog_facets.snapshot()["entries"])],
+)
+stats_counter(
+    "image_derivative_events_total", "Image derivative index lookups and renders, by event", "event",
+    image_derivatives.stats, ("hits", "misses", "renders"),
+)
+metrics.callback(
+    "image_derivative_index_entries", "Images whose derivatives are held in the in-memory index", "gauge",
+    lambda: [({}, image_derivatives.snapshot()["memory_entries"])],
+)
+stats_counter(
+    "input_image_events_total", "Uploaded component images normalized, memo hits and rejections, by event", "event",
+    input_image_normalizer.stats, ("requests", "images", "memo_hits", "rejected"),
+)
+metrics.callback(
+    "input_image_bytes_total", "Bytes of uploaded component images before and after normalizing", "counter",
+    lambda: [
+        ({"stage": "uploaded"}, input_image_normalizer.stats["bytes_in"]),
+        ({"stage": "normalized"}, input_image_normalizer.stats["bytes_out"]),
+    ],
+)
+stats_counter(
+    "tryon_asset_events_total", "Try-on asset uploads, resolutions and expiries, by event", "event",
+    tryon_assets.stats, ("created", "reused", "resolved", "expired"),
+)
+metrics.callback(
+    "prompt_chars_total", "Characters in rendered prompts, by template", "counter",
+    lambda: [({"template": name}, stats["chars"]) for name, stats in prompt_registry.stats.items()],
+)
+metrics.callback(
+    "prompt_registry_version", "1 for the digest of the prompt templates in use", "gauge",
+    lambda: [({"version": prompt_registry.version}, 1)],
+)
+metrics.callback(
+    "provider_consecutive_failures", "Failures in a row counted by each provider's circuit breaker", "gauge",
+    lambda: [({"provider": route.name}, route.breaker.failures) for route in provider_router.routes],
+)
+
+# Request profiling
+class RequestProfiler:
+    """Opt-in cProfile capture of whole requests, keeping the profiles of slow ones on disk.
+
+    A request is profiled when its ``X-Profile`` header matches ``token`` (always written)
+    or when it is picked at ``sample_rate`` (written only if it took ``slow_seconds`` or
+    more). cProfile follows the thread rather than the request, so one request is profiled
+    at a time and the profile also holds whatever else the event loop ran meanwhile.
+    With no token and a zero sample rate nothing is ever profiled.
+    """
+
+    def __init__(self, directory: Path, sample_rate: float, slow_seconds: float, token: Optional[str], max_files: int):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.token = token
+        self.max_files = max_files
+        self._active = False
+        self.stats = {"profiled": 0, "written": 0, "discarded": 0, "skipped_busy": 0}
+
+    def select(self, request: Request) -> Optional[str]:
+        """``"requested"``, ``"sampled"`` or None when this request should not be profiled"""
+        if self.token and request.headers.get("x-profile") == self.token:
+            reason = "requested"
+        elif self.sample_rate > 0 and random.random() < self.sample_rate:
+            reason = "sampled"
+        else:
+            return None
+        if self._active:
+            self.stats["skipped_busy"] += 1
+            return None
+        return reason
+
+    def start(self) -> cProfile.Profile:
+        self._active = True
+        self.stats["profiled"] += 1
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    async def finish(self, profile: cProfile.Profile, reason: str, route: str, elapsed: float):
+        profile.disable()
+        self._active = False
+        if reason == "sampled" and elapsed < self.slow_seconds:
+            self.stats["discarded"] += 1
+            return
+        
+        slug = route.strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+        filename = f"{datetime.utcnow():%Y%m%dT%H%M%S}_{slug}_{elapsed * 1000:.0f}ms_{uuid.uuid4().hex[:6]}.prof"
+        try:
+            await asyncio.to_thread(self._write, profile, self.directory / filename)
+        except Exception as e:
+            logging.error(f"Failed to write request profile {filename}: {str(e)}")
+            return
+        self.stats["written"] += 1
+        logging.info(f"Wrote {reason} profile of {route} ({elapsed:.2f}s) to {self.directory / filename}")
+
+    def _write(self, profile: cProfile.Profile, path: Path):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profile.dump_stats(str(path))
+        # Keep only the newest profiles
+        for stale in sorted(self.directory.glob("*.prof"), key=lambda p: p.stat().st_mtime)[:-self.max_files]:
+            stale.unlink(missing_ok=True)
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "active": self._active,
+            "sample_rate": self.sample_rate,
+            "slow_seconds": self.slow_seconds,
+            "on_request": bool(self.token),
+        }
+
+request_profiler = RequestProfiler(
+    directory=Path(os.environ.get('PROFILE_DIR', str(ROOT_DIR / 'profiles'))),
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', '0')),
+    slow_seconds=float(os.environ.get('PROFILE_SLOW_SECONDS', '5')),
+    token=os.environ.get('PROFILE_TOKEN') or None,
+    max_files=int(os.environ.get('PROFILE_MAX_FILES', '50')),
+)
+stats_counter(
+    "request_profiler_events_total", "Requests picked for profiling and what became of their profiles, by event", "event",
+    request_profiler.stats, ("profiled", "written", "discarded", "skipped_busy"),
+)
+
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'true').lower() == 'true'
+
+@app.middleware("http")
+async def instrument_request(request: Request, call_next):
+    timing = RequestTiming()
+    current_request_timing.set(timing)
+    if request.url.path in GENERATION_ENDPOINTS and request.headers.get("content-length", "").isdigit():
+        payload_size.observe(int(request.headers["content-length"]), kind="request_body")
+    
+    profile_reason = request_profiler.select(request)
+    profile = request_profiler.start() if profile_reason else None
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        if SERVER_TIMING_ENABLED:
+            response.headers["Server-Timing"] = timing.server_timing()
+        return response
+    finally:
+        # Label by route template so ids in the path don't create a series per request
+        route = request.scope.get("route")
+        route_path = route.path if route else "unmatched"
+        elapsed = timing.elapsed()
+        http_request_duration.observe(elapsed, method=request.method, route=route_path, status=status)
+        if profile is not None:
+            await request_profiler.finish(profile, profile_reason, route_path, elapsed)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -602,6 +3896,77 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def start_provider_clients():
+    provider_clients.start()
+
+@app.on_event("startup")
+async def bootstrap_schema():
+    # Index migrations must land before serving, so a failure stops startup
+    await apply_schema_migrations()
+    
+    # Data migrations keep running while serving; a failure shows up in /api/health
+    async def run_background_migrations():
+        try:
+            await apply_schema_migrations(background=True)
+        except Exception as e:
+            logger.error(f"Background schema migration failed: {e}")
+    asyncio.create_task(run_background_migrations())
+    
+    # Opt-in guard against queries that would scan whole collections
+    if os.environ.get('VERIFY_QUERY_PLANS', 'false').lower() == 'true':
+        await verify_query_plans()
+        logger.info("All hot queries are served by indexes")
+
+@app.on_event("startup")
+async def warm_up_mock_provider():
+    if not api_key or api_key == 'your_api_key_here':
+        asyncio.create_task(mock_provider.warm_up())
+
+@app.on_event("startup")
+async def start_tryon_job_workers():
+    tryon_jobs.start()
+
+@app.on_event("shutdown")
+async def stop_tryon_job_workers():
+    await tryon_jobs.stop()
+
+@app.on_event("startup")
+async def start_tryon_asset_cleanup():
+    tryon_assets.start()
+
+@app.on_event("shutdown")
+async def stop_tryon_asset_cleanup():
+    await tryon_assets.stop()
+
+@app.on_event("shutdown")
+async def shutdown_image_pool():
+    global image_process_pool
+    if image_process_pool is not None:
+        image_process_pool.shutdown(wait=False, cancel_futures=True)
+        # A later startup in the same process gets a fresh pool
+        image_process_pool = None
+
+@app.on_event("shutdown")
+async def close_provider_clients():
+    await provider_clients.close()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    client.close()
+
+if __name__ == "__main__":
+    import sys
+
+    async def run_schema_check():
+        await apply_schema_migrations()
+        await apply_schema_migrations(background=True)
+        for name, stages in (await verify_query_plans()).items():
+            print(f"{name}: {' -> '.join(stages)}")
+
+    if sys.argv[1:] != ["check-indexes"]:
+        sys.exit("usage: python server.py check-indexes")
+    try:
+        asyncio.run(run_schema_check())
+    except RuntimeError as e:
+        sys.exit(str(e))
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Local Benchmark Suite for the Saree Virtual Try-On Backend
+Runs the FastAPI app in-process against an in-memory MongoDB stand-in and the mock
+provider, drives each endpoint at a fixed concurrency and reports throughput, latency
+percentiles and peak RSS as a table and as JSON for comparison between commits
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+
+SCENARIOS = [
+    "catalog_list",
+    "catalog_page",
+    "catalog_search",
+    "tryon",
+    "tryon_cached",
+    "tryon_batch",
+    "favorites_add",
+    "favorites_list",
+    "favorites_page",
+    "image_fetch",
+    "image_base64",
+]
+
+def configure_environment(args):
+    """Point the app at throwaway storage and the mock provider before it is imported"""
+    scratch = tempfile.mkdtemp(prefix="saree_benchmark_")
+    os.environ["MONGO_URL"] = args.mongo_url or "mongodb://localhost:27017"
+    os.environ["DB_NAME"] = f"saree_benchmark_{uuid.uuid4().hex[:8]}"
+    # No key means every try-on goes through the mock provider
+    os.environ["EMERGENT_LLM_KEY"] = ""
+    os.environ["MOCK_PROVIDER_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["MOCK_PROVIDER_JITTER_MS"] = str(args.jitter_ms)
+    os.environ["BLOB_STORE_DIR"] = os.path.join(scratch, "blob_store")
+    os.environ["ASSET_STORE_DIR"] = os.path.join(scratch, "asset_store")
+    os.environ["PROFILE_DIR"] = os.path.join(scratch, "profiles")
+    # Every benchmark request comes from one client, so per-client limits would only measure 429s
+    os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+    os.environ.setdefault("GENERATION_MAX_WAITING", str(max(32, args.concurrency * 2)))
+
+    if not args.mongo_url:
+        import mongomock_motor
+        import motor.motor_asyncio
+        motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+
+    sys.path.insert(0, str(ROOT_DIR / "backend"))
+
+def current_rss_bytes(pid="self") -> int:
+    """Resident set size of a process, from /proc where available"""
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        if pid != "self":
+            return 0  # The worker exited between listing and reading it
+        # ru_maxrss is the lifetime peak, in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+def image_pool_pids(server) -> list:
+    """Worker processes of the server's image pool, where the Pillow and derivative work runs"""
+    pool = server.image_process_pool
+    return list(getattr(pool, "_processes", None) or {}) if pool is not None else []
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except Exception:
+        return "unknown"
+
+class SareeAPIBenchmark:
+    def __init__(self, client, db, args, child_pids=list):
+        self.client = client
+        self.db = db
+        self.args = args
+        self.child_pids = child_pids
+        self.tryon_ids = []
+        self.favorite_ids = []
+        self.results = {}
+
+    def create_test_image_base64(self, width=400, height=600, color=(255, 0, 0)):
+        """Create a test image and return as base64"""
+        from PIL import Image
+        img = Image.new('RGB', (width, height), color)
+        buffer = BytesIO()
+        img.save(buffer, format='JPEG')
+        return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+    async def seed(self):
+        """Catalog entries and finished try-ons for the read scenarios to work on"""
+        image_base64 = self.create_test_image_base64(200, 300, (128, 0, 64))
+        for i in range(self.args.catalog_size):
+            response = await self.client.post("/api/saree-catalog", json={
+                "name": f"Benchmark Saree {i}",
+                "description": "Seeded by the benchmark suite",
+                "image_base64": image_base64,
+                "category": ["traditional", "designer", "casual"][i % 3],
+                "color": ["red", "blue", "green", "gold"][i % 4],
+                "pattern": "floral",
+            })
+            response.raise_for_status()
+
+        for i in range(self.args.seed_tryons):
+            response = await self.client.post("/api/virtual-tryon", json={
+                "pose_style": "front",
+                "blouse_style": "traditional",
+                "saree_item_id": f"seed_{i}",
+            })
+            response.raise_for_status()
+            self.tryon_ids.append(response.json()["id"])
+
+        # Marking a try-on as favorite twice is an error, so every add gets its own copy
+        template = await self.db.virtual_tryons.find_one({"id": self.tryon_ids[0]}, {"_id": 0})
+        self.favorite_ids = [str(uuid.uuid4()) for _ in range(self.args.requests + self.args.warmup)]
+        await self.db.virtual_tryons.insert_many([
+            {**template, "id": tryon_id, "user_id": f"bench_user_{i % 50}"}
+            for i, tryon_id in enumerate(self.favorite_ids)
+        ])
+
+    def build_request(self, scenario: str, i: int):
+        """(method, url, json body) for the i-th request of a scenario"""
+        tryon_id = self.tryon_ids[i % len(self.tryon_ids)]
+        if scenario == "catalog_list":
+            return "GET", "/api/saree-catalog", None
+        if scenario == "catalog_page":
+            return "GET", "/api/saree-catalog/page?limit=20", None
+        if scenario == "catalog_search":
+            # Facet filters only, the in-memory stand-in has no $text support
+            return "GET", f"/api/saree-catalog/search?color={['red', 'blue', 'green', 'gold'][i % 4]}&limit=20", None
+        if scenario == "tryon":
+            # A fresh saree_item_id per request misses the result cache every time
+            return "POST", "/api/virtual-tryon", {
+                "pose_style": "front", "blouse_style": "modern", "saree_item_id": f"bench_{uuid.uuid4().hex}"
+            }
+        if scenario == "tryon_cached":
+            return "POST", "/api/virtual-tryon", {"pose_style": "side", "blouse_style": "modern"}
+        if scenario == "tryon_batch":
+            return "POST", "/api/virtual-tryon/batch", {
+                "poses": ["front", "side"], "blouse_style": "traditional", "saree_item_id": f"bench_{uuid.uuid4().hex}"
+            }
+        if scenario == "favorites_add":
+            return "POST", "/api/favorites", {"tryon_id": self.favorite_ids[i], "user_id": f"bench_user_{i % 50}"}
+        if scenario == "favorites_list":
+            return "GET", f"/api/favorites/bench_user_{i % 50}", None
+        if scenario == "favorites_page":
+            return "GET", f"/api/favorites/bench_user_{i % 50}/page?limit=24", None
+        if scenario == "image_fetch":
+            return "GET", f"/api/tryon/{tryon_id}/image", None
+        if scenario == "image_base64":
+            return "GET", f"/api/tryon/{tryon_id}/base64", None
+        raise ValueError(f"Unknown scenario {scenario}")
+
+    async def run_scenario(self, scenario: str) -> dict:
+        # Warm-up requests take indexes after the measured ones so they never repeat them
+        for i in range(self.args.requests, self.args.requests + self.args.warmup):
+            method, url, body = self.build_request(scenario, i)
+            await self.client.request(method, url, json=body)
+
+        latencies = []
+        statuses = {}
+        next_index = iter(range(self.args.requests))
+        peak_rss = peak_child_rss = 0
+        sampling = True
+
+        async def sample_rss():
+            # Each sample adds up the whole process tree, the image pool included
+            nonlocal peak_rss, peak_child_rss
+            while sampling:
+                child_rss = sum(current_rss_bytes(pid) for pid in self.child_pids())
+                peak_rss = max(peak_rss, current_rss_bytes() + child_rss)
+                peak_child_rss = max(peak_child_rss, child_rss)
+                await asyncio.sleep(0.05)
+
+        async def worker():
+            for i in next_index:
+                method, url, body = self.build_request(scenario, i)
+                started = time.perf_counter()
+                try:
+                    response = await self.client.request(method, url, json=body)
+                    status = response.status_code
+                except Exception:
+                    status = "exception"
+                latencies.append(time.perf_counter() - started)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+        sampler = asyncio.create_task(sample_rss())
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+        duration = time.perf_counter() - started
+        sampling = False
+        await sampler
+
+        latencies.sort()
+        errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+        return {
+            "requests": len(latencies),
+            "concurrency": self.args.concurrency,
+            "duration_seconds": round(duration, 3),
+            "throughput_rps": round(len(latencies) / duration, 2) if duration else 0.0,
+            "latency_ms": {
+                "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+                "p50": round(percentile(latencies, 0.50) * 1000, 2),
+                "p95": round(percentile(latencies, 0.95) * 1000, 2),
+                "p99": round(percentile(latencies, 0.99) * 1000, 2),
+                "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            },
+            "status_codes": statuses,
+            "errors": errors,
+            "peak_rss_mb": round(peak_rss / (1024 * 1024), 1),
+            "peak_child_rss_mb": round(peak_child_rss / (1024 * 1024), 1),
+        }
+
+    async def run_all(self, scenarios):
+        print(f"🌱 Seeding {self.args.catalog_size} catalog entries and {self.args.seed_tryons} try-ons...", file=sys.stderr)
+        await self.seed()
+        for scenario in scenarios:
+            print(f"🏁 {scenario}: {self.args.requests} requests at concurrency {self.args.concurrency}", file=sys.stderr)
+            self.results[scenario] = await self.run_scenario(scenario)
+        return self.results
+
+def print_report(report: dict, baseline: dict = None):
+    print(f"\n📊 Benchmark results ({report['commit']}, mock latency {report['config']['latency_ms']}ms)")
+    header = f"{'scenario':<16}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'rss MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, result in report["scenarios"].items():
+        latency = result["latency_ms"]
+        print(f"{name:<16}{result['throughput_rps']:>10}{latency['p50']:>10}{latency['p95']:>10}{latency['p99']:>10}"
+              f"{result['errors']:>8}{result['peak_rss_mb']:>9}")
+
+    if baseline:
+        print(f"\n🔍 Change against {baseline.get('commit', 'baseline')}")
+        for name, result in report["scenarios"].items():
+            before = baseline.get("scenarios", {}).get(name)
+            if not before:
+                continue
+            changes = []
+            for label, now, then in [
+                ("rps", result["throughput_rps"], before["throughput_rps"]),
+                ("p50", result["latency_ms"]["p50"], before["latency_ms"]["p50"]),
+                ("p95", result["latency_ms"]["p95"], before["latency_ms"]["p95"]),
+                ("p99", result["latency_ms"]["p99"], before["latency_ms"]["p99"]),
+            ]:
+                changes.append(f"{label} {(now - then) / then * 100:+.1f}%" if then else f"{label} n/a")
+            print(f"{name:<16}{', '.join(changes)}")
+
+async def run_benchmark(args, scenarios) -> dict:
+    import httpx
+    import server
+
+    # ASGITransport does not send lifespan events, so run the startup hooks directly
+    await server.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=300) as client:
+            benchmark = SareeAPIBenchmark(client, server.db, args, child_pids=lambda: image_pool_pids(server))
+            results = await benchmark.run_all(scenarios)
+    finally:
+        await server.app.router.shutdown()
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "catalog_size": args.catalog_size,
+            "mongo": "real" if args.mongo_url else "mongomock",
+        },
+        "scenarios": results,
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        # Sampled while the pool was alive; RUSAGE_CHILDREN misses workers not yet reaped
+        "max_child_rss_mb": max((result["peak_child_rss_mb"] for result in results.values()), default=0.0),
+    }
+
+def main():
+    """Main benchmark execution"""
+    parser = argparse.ArgumentParser(description="Benchmark the backend API in-process")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10, help="Requests in flight at once")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests before each scenario")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Simulated provider latency for try-ons")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random extra provider latency")
+    parser.add_argument("--catalog-size", type=int, default=100, help="Catalog entries to seed")
+    parser.add_argument("--seed-tryons", type=int, default=20, help="Try-ons to seed for image and favorite scenarios")
+    parser.add_argument("--mongo-url", help="Use this MongoDB instead of the in-memory stand-in")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--json", action="store_true", help="Print the JSON report instead of the table")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+    if args.seed_tryons < 1:
+        parser.error("--seed-tryons must be at least 1, the image and favorite scenarios need a try-on to copy")
+
+    configure_environment(args)
+    try:
+        report = asyncio.run(run_benchmark(args, scenarios))
+    except KeyboardInterrupt:
+        print("\n⚠️  Benchmark interrupted by user")
+        return 1
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+        print_report(report, baseline)
+
+    return 1 if any(result["errors"] for result in report["scenarios"].values()) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
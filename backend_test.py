@@ -37,6 +37,18 @@ class SareeAPITester:
             "response_data": response_data
         })
 
+    def read_metric(self, sample):
+        """Value of one sample line from /metrics, e.g. 'tryon_cache_lookups_total{result="miss"}'"""
+        try:
+            response = requests.get(f"{self.base_url}/metrics", timeout=30)
+            for line in response.text.splitlines():
+                name, _, value = line.rpartition(" ")
+                if name == sample:
+                    return float(value)
+        except Exception as e:
+            print(f"   Could not read {sample} from /metrics: {str(e)}")
+        return 0.0
+
     def run_api_test(self, name, method, endpoint, expected_status, data=None, timeout=30):
         """Run a single API test"""
         url = f"{self.api_url}/{endpoint}"
@@ -125,6 +137,23 @@ class SareeAPITester:
             
             # Test GET by category
             self.run_api_test("Get Sarees by Category", "GET", "saree-catalog/traditional", 200)
+            
+            # Test paginated listing without inline images
+            page_ok, page = self.run_api_test("Get Saree Catalog Page", "GET", "saree-catalog/page?limit=2", 200)
+            if page_ok:
+                items = page.get('items', [])
+                lean = all('image_base64' not in item and item.get('image_url') for item in items)
+                self.log_test("Catalog Page Omits Inline Images", lean, f"{len(items)} items, next_cursor: {bool(page.get('next_cursor'))}")
+            
+            # Test full-text search with facet counts
+            search_ok, search = self.run_api_test("Search Saree Catalog", "GET", "saree-catalog/search?q=floral&category=traditional", 200)
+            if search_ok:
+                has_facets = all(facet in search.get('facets', {}) for facet in ('category', 'color', 'pattern'))
+                self.log_test("Catalog Search Facets", has_facets, f"total: {search.get('total')}")
+            
+            if response.get('id'):
+                image = requests.get(f"{self.api_url}/saree-catalog/{response['id']}/image", timeout=30)
+                self.log_test("Stream Catalog Image", image.status_code == 200, f"Status: {image.status_code}")
         
         return success
 
@@ -310,6 +339,163 @@ class SareeAPITester:
         
         return len(performance_results) > 0
 
+    def test_batch_tryon_endpoint(self):
+        """Test concurrent multi-pose generation in a single request"""
+        print("\n👯 Testing Batch Multi-Pose Try-On...")
+        
+        batch_data = {
+            "saree_body_base64": self.create_test_image_base64(300, 400, (128, 0, 64)),  # Plum
+            "poses": ["front", "side"],
+            "blouse_style": "traditional"
+        }
+        
+        start_time = time.time()
+        success, response = self.run_api_test("Batch Try-On (Front + Side)", "POST", "virtual-tryon/batch", 200, batch_data, timeout=180)
+        batch_time = time.time() - start_time
+        
+        if success:
+            poses = sorted(result.get('pose_style') for result in response.get('results', []))
+            same_session = bool(response.get('session_id'))
+            self.log_test("Batch Returns Both Poses", poses == ["front", "side"] and same_session,
+                          f"Poses: {poses}, completed in {batch_time:.2f} seconds")
+        
+        return success
+
+    def test_multipart_upload_endpoint(self):
+        """Test the multipart try-on variant that takes raw image files"""
+        print("\n📤 Testing Multipart Try-On Upload...")
+        
+        files = {
+            "saree_body": ("body.jpg", base64.b64decode(self.create_test_image_base64(300, 400, (0, 100, 0))), "image/jpeg"),
+            "saree_pallu": ("pallu.jpg", base64.b64decode(self.create_test_image_base64(200, 300, (255, 215, 0))), "image/jpeg"),
+        }
+        data = {"pose_style": "front", "blouse_style": "modern"}
+        
+        try:
+            response = requests.post(f"{self.api_url}/virtual-tryon/upload", data=data, files=files, timeout=180)
+            success = response.status_code == 200 and bool(response.json().get('result_image_base64'))
+            self.log_test("Multipart Try-On Upload", success, f"Status: {response.status_code}")
+            
+            # A non-image file is refused before generation
+            bad = requests.post(f"{self.api_url}/virtual-tryon/upload", data=data,
+                                files={"saree_body": ("notes.txt", b"not an image", "text/plain")}, timeout=30)
+            self.log_test("Multipart Upload Rejects Non-Image", bad.status_code == 400, f"Status: {bad.status_code}")
+            return success
+        except Exception as e:
+            self.log_test("Multipart Try-On Upload", False, f"Error: {str(e)}")
+            return False
+
+    def test_asset_endpoints(self):
+        """Test uploading a component once and referencing it by asset id"""
+        print("\n📎 Testing Try-On Assets...")
+        
+        image_bytes = base64.b64decode(self.create_test_image_base64(300, 400, (75, 0, 130)))  # Indigo
+        try:
+            response = requests.post(f"{self.api_url}/assets", files={"file": ("body.jpg", image_bytes, "image/jpeg")}, timeout=30)
+            asset_id = response.json().get('asset_id') if response.status_code == 201 else None
+            self.log_test("Upload Try-On Asset", bool(asset_id), f"Status: {response.status_code}")
+        except Exception as e:
+            self.log_test("Upload Try-On Asset", False, f"Error: {str(e)}")
+            return False
+        
+        if not asset_id:
+            return False
+        
+        self.run_api_test("Get Try-On Asset", "GET", f"assets/{asset_id}", 200)
+        success, _ = self.run_api_test("Try-On With Asset Id", "POST", "virtual-tryon", 200, {
+            "saree_body_asset_id": asset_id,
+            "pose_style": "front",
+            "blouse_style": "traditional"
+        }, timeout=180)
+        self.run_api_test("Try-On With Unknown Asset Id", "POST", "virtual-tryon", 404, {
+            "saree_body_asset_id": "0" * 64,
+            "pose_style": "front"
+        })
+        return success
+
+    def test_job_queue_endpoints(self):
+        """Test asynchronous try-on jobs: enqueue, poll status, fetch result"""
+        print("\n📬 Testing Try-On Job Queue...")
+        
+        job_data = {
+            "saree_body_base64": self.create_test_image_base64(300, 400, (0, 100, 0)),  # Dark green
+            "pose_style": "side",
+            "blouse_style": "sleeveless"
+        }
+        
+        success, response = self.run_api_test("Enqueue Try-On Job", "POST", "jobs/virtual-tryon", 202, job_data)
+        if not success or not response.get('job_id'):
+            return False
+        
+        job_id = response['job_id']
+        deadline = time.time() + 180
+        status = response.get('status')
+        while status not in ('completed', 'failed') and time.time() < deadline:
+            time.sleep(3)
+            _, job = self.run_api_test("Poll Try-On Job", "GET", f"jobs/{job_id}", 200)
+            status = job.get('status')
+        
+        completed = status == 'completed' and bool(job.get('result', {}).get('result_image_base64'))
+        self.log_test("Try-On Job Completed", completed, f"Final status: {status}")
+        
+        self.run_api_test("Get Non-existent Job", "GET", "jobs/invalid_job_id", 404)
+        
+        return completed
+
+    def test_result_cache(self):
+        """Test that repeating an identical try-on is served from the result cache"""
+        print("\n🗄️  Testing Try-On Result Cache...")
+        
+        def cache_hits():
+            return sum(
+                self.read_metric(f'tryon_cache_lookups_total{{result="{result}"}}')
+                for result in ("memory_hit", "persistent_hit")
+            )
+        before = cache_hits()
+        
+        tryon_data = {
+            "saree_body_base64": self.create_test_image_base64(300, 400, (0, 128, 128)),  # Teal
+            "pose_style": "front",
+            "blouse_style": "traditional"
+        }
+        
+        self.run_api_test("Cache Warm-Up Try-On", "POST", "virtual-tryon", 200, tryon_data, timeout=180)
+        
+        start_time = time.time()
+        success, _ = self.run_api_test("Cached Repeat Try-On", "POST", "virtual-tryon", 200, tryon_data, timeout=180)
+        repeat_time = time.time() - start_time
+        
+        if success:
+            hit = cache_hits() > before
+            self.log_test("Cache Hit Recorded", hit, f"Repeat served in {repeat_time:.2f} seconds")
+            return hit
+        
+        return False
+
+    def test_image_streaming(self, tryon_id=None):
+        """Test binary image streaming with ETag revalidation and Range requests"""
+        if not tryon_id:
+            print("⚠️  Skipping image streaming tests - no valid try-on ID")
+            return False
+        
+        url = f"{self.api_url}/tryon/{tryon_id}/image"
+        try:
+            full = requests.get(url, timeout=30)
+            etag = full.headers.get('ETag')
+            self.log_test("Stream Try-On Image", full.status_code == 200 and full.headers.get('Content-Type', '').startswith('image/') and bool(etag),
+                          f"Status: {full.status_code}, {len(full.content)} bytes")
+            
+            cached = requests.get(url, headers={'If-None-Match': etag}, timeout=30)
+            self.log_test("Conditional Image GET", cached.status_code == 304, f"Status: {cached.status_code}")
+            
+            partial = requests.get(url, headers={'Range': 'bytes=0-99'}, timeout=30)
+            self.log_test("Ranged Image GET", partial.status_code == 206 and partial.content == full.content[:100],
+                          f"Status: {partial.status_code}, Content-Range: {partial.headers.get('Content-Range')}")
+            return full.status_code == 200
+        except Exception as e:
+            self.log_test("Stream Try-On Image", False, f"Error: {str(e)}")
+            return False
+
     def test_favorites_endpoints(self, tryon_id=None):
         """Test favorites endpoints"""
         if not tryon_id:
@@ -327,9 +513,19 @@ class SareeAPITester:
         if success:
             # Test get user favorites
             self.run_api_test("Get User Favorites", "GET", "favorites/test_user_123", 200)
+            self.run_api_test("Get User Favorites Page", "GET", "favorites/test_user_123/page?limit=12", 200)
             
             # Test remove from favorites
             self.run_api_test("Remove from Favorites", "DELETE", f"favorites/{tryon_id}", 200)
+            
+            # Test bulk add and remove, reporting the unknown id per item
+            self.run_api_test("Bulk Add Favorites", "POST", "favorites/bulk-add", 200, {
+                "tryon_ids": [tryon_id, "invalid_id"],
+                "user_id": "test_user_123"
+            })
+            self.run_api_test("Bulk Remove Favorites", "POST", "favorites/bulk-remove", 200, {
+                "tryon_ids": [tryon_id, "invalid_id"]
+            })
         
         return success
 
@@ -358,6 +554,21 @@ class SareeAPITester:
             "blouse_style": "invalid_blouse"
         })
         
+        # Test upload that is not an image (rejected before any generation work)
+        self.run_api_test("Try-On Invalid Upload", "POST", "virtual-tryon", 400, {
+            "saree_body_base64": base64.b64encode(b"not an image").decode('utf-8'),
+            "pose_style": "front",
+            "blouse_style": "traditional"
+        })
+        
+        # Test batch with one unsupported pose (rejected before any pose is rendered)
+        self.run_api_test("Batch Try-On Invalid Pose", "POST", "virtual-tryon/batch", 400, {
+            "poses": ["front", "back"],
+            "blouse_style": "traditional"
+        })
+        rejected = self.read_metric('input_image_events_total{event="rejected"}')
+        self.log_test("Invalid Upload Counted In Metrics", rejected >= 1, f"Rejected uploads: {rejected:.0f}")
+        
         # Test invalid saree category
         self.run_api_test("Get Invalid Category", "GET", "saree-catalog/invalid_category", 200)
         
@@ -393,6 +604,24 @@ class SareeAPITester:
         # Performance tests
         self.test_performance_and_timeouts()
         
+        # Batch multi-pose tests
+        self.test_batch_tryon_endpoint()
+        
+        # Multipart upload tests
+        self.test_multipart_upload_endpoint()
+        
+        # Asset reference tests
+        self.test_asset_endpoints()
+        
+        # Job queue tests
+        self.test_job_queue_endpoints()
+        
+        # Result cache tests
+        self.test_result_cache()
+        
+        # Image streaming tests
+        self.test_image_streaming(tryon_id)
+        
         # Favorites tests
         print("\n❤️  Testing Favorites...")
         self.test_favorites_endpoints(tryon_id)
@@ -33,6 +33,9 @@ const Favorites = () => {
   const [selectedItems, setSelectedItems] = useState([]);
   const [showFilters, setShowFilters] = useState(false);
   const [sortBy, setSortBy] = useState('newest'); // 'newest', 'oldest', 'pose'
+  const [nextCursor, setNextCursor] = useState(null);
+  const [totalFavorites, setTotalFavorites] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   // Sample favorites data (in a real app, this would come from backend)
   const sampleFavorites = [
@@ -83,14 +86,22 @@ const Favorites = () => {
     }
   ];
 
-  // Fetch user favorites
+  // Fetch user favorites, one page at a time; images are loaded by URL
+  const fetchFavoritesPage = (cursor = null) =>
+    axios.get(`${API}/favorites/demo_user/page`, {
+      params: { limit: 48, cursor, image_size: 'medium', include_total: cursor === null }
+    });
+
   const fetchFavorites = async () => {
     setLoading(true);
     try {
-      const response = await axios.get(`${API}/favorites/demo_user`);
-      if (response.data && response.data.length > 0) {
-        setFavorites(response.data);
-        setFilteredFavorites(response.data);
+      const response = await fetchFavoritesPage();
+      const items = response.data?.items || [];
+      if (items.length > 0) {
+        setFavorites(items);
+        setFilteredFavorites(items);
+        setNextCursor(response.data.next_cursor);
+        setTotalFavorites(response.data.total);
       } else {
         // Use sample data if no data from backend
         setFavorites(sampleFavorites);
@@ -106,6 +117,20 @@ const Favorites = () => {
     }
   };
 
+  const loadMoreFavorites = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const response = await fetchFavoritesPage(nextCursor);
+      setFavorites(prev => [...prev, ...(response.data?.items || [])]);
+      setNextCursor(response.data?.next_cursor || null);
+    } catch (error) {
+      console.error('Failed to load more favorites:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     fetchFavorites();
   }, []);
@@ -145,6 +170,7 @@ const Favorites = () => {
       await axios.delete(`${API}/favorites/${favoriteId}`);
       setFavorites(prev => prev.filter(fav => fav.id !== favoriteId));
       setSelectedItems(prev => prev.filter(id => id !== favoriteId));
+      setTotalFavorites(prev => (prev === null ? prev : prev - 1));
     } catch (error) {
       console.error('Failed to remove from favorites:', error);
       alert('Failed to remove from favorites');
@@ -154,9 +180,11 @@ const Favorites = () => {
   // Download image
   const downloadImage = (favorite) => {
     const link = document.createElement('a');
-    const imageData = favorite.result_image_base64 
-      ? `data:image/png;base64,${favorite.result_image_base64}`
-      : getPlaceholderImage(favorite.pose_style);
+    const imageData = favorite.image_url
+      ? `${BACKEND_URL}${favorite.image_url}`
+      : favorite.result_image_base64
+        ? `data:image/png;base64,${favorite.result_image_base64}`
+        : getPlaceholderImage(favorite.pose_style);
     
     link.href = imageData;
     link.download = `saree-tryon-${favorite.pose_style}-${Date.now()}.png`;
@@ -170,10 +198,15 @@ const Favorites = () => {
     if (selectedItems.length === 0) return;
     
     try {
-      await Promise.all(
-        selectedItems.map(id => axios.delete(`${API}/favorites/${id}`))
-      );
+      // One request for the whole selection, with an outcome per try-on
+      const response = await axios.post(`${API}/favorites/bulk-remove`, {
+        tryon_ids: selectedItems
+      });
+      const removedIds = (response.data?.results || [])
+        .filter(result => result.status === 'removed')
+        .map(result => result.tryon_id);
       setFavorites(prev => prev.filter(fav => !selectedItems.includes(fav.id)));
+      setTotalFavorites(prev => (prev === null ? prev : prev - removedIds.length));
       setSelectedItems([]);
     } catch (error) {
       console.error('Failed to remove selected items:', error);
@@ -338,6 +371,7 @@ const Favorites = () => {
         <div className="mb-6">
           <p className="text-white/80">
             {filteredFavorites.length} favorite{filteredFavorites.length !== 1 ? 's' : ''}
+            {totalFavorites !== null && totalFavorites > favorites.length && ` of ${totalFavorites}`}
             {searchQuery && ` for "${searchQuery}"`}
           </p>
         </div>
@@ -403,10 +437,13 @@ const Favorites = () => {
                 {/* Image */}
                 <div className={`${viewMode === 'list' ? 'w-48 h-48 flex-shrink-0' : 'aspect-[3/4]'} relative mb-4 rounded-lg overflow-hidden`}>
                   <img
-                    src={favorite.result_image_base64 
-                      ? `data:image/png;base64,${favorite.result_image_base64}`
-                      : getPlaceholderImage(favorite.pose_style)
+                    src={favorite.thumbnail_url
+                      ? `${BACKEND_URL}${viewMode === 'list' ? favorite.thumbnail_url : favorite.image_url}`
+                      : favorite.result_image_base64
+                        ? `data:image/png;base64,${favorite.result_image_base64}`
+                        : getPlaceholderImage(favorite.pose_style)
                     }
+                    loading="lazy"
                     alt={`${favorite.pose_style} pose virtual try-on`}
                     className="w-full h-full object-cover"
                   />
@@ -496,6 +533,19 @@ const Favorites = () => {
             ))}
           </div>
         )}
+
+        {/* Load more */}
+        {!loading && nextCursor && (
+          <div className="text-center mt-8">
+            <button
+              onClick={loadMoreFavorites}
+              disabled={loadingMore}
+              className="btn-secondary"
+            >
+              {loadingMore ? 'Loading...' : 'Load more'}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -34,6 +34,11 @@ const SareeCatalog = () => {
   const [selectedColor, setSelectedColor] = useState('all');
   const [showFilters, setShowFilters] = useState(false);
   const [selectedSaree, setSelectedSaree] = useState(null);
+  const [facets, setFacets] = useState(null);
+  const [totalSarees, setTotalSarees] = useState(0);
+  const [nextOffset, setNextOffset] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [usingSamples, setUsingSamples] = useState(false);
 
   const categories = [
     { value: 'all', label: 'All Categories' },
@@ -135,35 +140,82 @@ const SareeCatalog = () => {
     }
   ];
 
+  const hasActiveFilters = Boolean(searchQuery) || selectedCategory !== 'all' || selectedColor !== 'all';
+
+  // Search the catalog on the server; images load by URL and facet counts come with each page
+  const searchCatalog = (offset = 0) =>
+    axios.get(`${API}/saree-catalog/search`, {
+      params: {
+        q: searchQuery || undefined,
+        category: selectedCategory !== 'all' ? selectedCategory : undefined,
+        color: selectedColor !== 'all' ? selectedColor : undefined,
+        limit: 48,
+        offset,
+        image_size: 'medium'
+      }
+    });
+
   // Fetch sarees from backend
   const fetchSarees = async () => {
+    if (usingSamples) return;
     setLoading(true);
     try {
-      const response = await axios.get(`${API}/saree-catalog`);
-      if (response.data && response.data.length > 0) {
-        setSarees(response.data);
-        setFilteredSarees(response.data);
+      const response = await searchCatalog();
+      const catalogItems = response.data?.items || [];
+
+      if (catalogItems.length > 0 || hasActiveFilters) {
+        setSarees(catalogItems);
+        setFacets(response.data.facets);
+        setTotalSarees(response.data.total);
+        setNextOffset(response.data.next_offset);
       } else {
         // Use sample data if no data from backend
+        setUsingSamples(true);
         setSarees(sampleSarees);
-        setFilteredSarees(sampleSarees);
       }
     } catch (error) {
       console.error('Failed to fetch sarees:', error);
       // Fallback to sample data
+      setUsingSamples(true);
       setSarees(sampleSarees);
-      setFilteredSarees(sampleSarees);
     } finally {
       setLoading(false);
     }
   };
 
+  const loadMoreSarees = async () => {
+    if (nextOffset === null) return;
+    setLoadingMore(true);
+    try {
+      const response = await searchCatalog(nextOffset);
+      setSarees(prev => [...prev, ...(response.data?.items || [])]);
+      setNextOffset(response.data?.next_offset ?? null);
+    } catch (error) {
+      console.error('Failed to load more sarees:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  // Re-run the search when the query or a filter changes, waiting for a pause in typing
   useEffect(() => {
-    fetchSarees();
-  }, []);
+    const timer = setTimeout(fetchSarees, searchQuery ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [searchQuery, selectedCategory, selectedColor]);
 
-  // Filter sarees based on search and filters
+  // Facet count shown next to a filter option
+  const facetCount = (facet, value) => {
+    if (!facets || value === 'all') return '';
+    const bucket = (facets[facet] || []).find(item => item.value === value);
+    return ` (${bucket ? bucket.count : 0})`;
+  };
+
+  // Filter sarees based on search and filters; server results are already filtered
   useEffect(() => {
+    if (!usingSamples) {
+      setFilteredSarees(sarees);
+      return;
+    }
     let filtered = sarees;
 
     // Search filter
@@ -186,7 +238,7 @@ const SareeCatalog = () => {
     }
 
     setFilteredSarees(filtered);
-  }, [sarees, searchQuery, selectedCategory, selectedColor]);
+  }, [sarees, searchQuery, selectedCategory, selectedColor, usingSamples]);
 
   // Try on with selected saree
   const tryOnSaree = (saree) => {
@@ -314,7 +366,7 @@ const SareeCatalog = () => {
                     >
                       {categories.map((category) => (
                         <option key={category.value} value={category.value}>
-                          {category.label}
+                          {category.label}{facetCount('category', category.value)}
                         </option>
                       ))}
                     </select>
@@ -330,7 +382,7 @@ const SareeCatalog = () => {
                     >
                       {colors.map((color) => (
                         <option key={color.value} value={color.value}>
-                          {color.label}
+                          {color.label}{facetCount('color', color.value)}
                         </option>
                       ))}
                     </select>
@@ -345,6 +397,7 @@ const SareeCatalog = () => {
         <div className="mb-6">
           <p className="text-white/80">
             Showing {filteredSarees.length} saree{filteredSarees.length !== 1 ? 's' : ''}
+            {!usingSamples && totalSarees > filteredSarees.length && ` of ${totalSarees}`}
             {searchQuery && ` for "${searchQuery}"`}
           </p>
         </div>
@@ -394,8 +447,15 @@ const SareeCatalog = () => {
                 {/* Image */}
                 <div className={`${viewMode === 'list' ? 'w-48 h-48 flex-shrink-0' : 'aspect-[3/4]'} relative mb-4 rounded-lg overflow-hidden`}>
                   <img
-                    src={saree.image_base64 ? `data:image/jpeg;base64,${saree.image_base64}` : getPlaceholderImage(saree.color, saree.category)}
+                    src={
+                      saree.image_url
+                        ? `${BACKEND_URL}${saree.image_url}`
+                        : saree.image_base64
+                          ? `data:image/jpeg;base64,${saree.image_base64}`
+                          : getPlaceholderImage(saree.color, saree.category)
+                    }
                     alt={saree.name}
+                    loading="lazy"
                     className="w-full h-full object-cover"
                   />
                   
@@ -467,6 +527,19 @@ const SareeCatalog = () => {
             ))}
           </div>
         )}
+
+        {/* Load more */}
+        {!loading && !usingSamples && nextOffset !== null && (
+          <div className="text-center mt-8">
+            <button
+              onClick={loadMoreSarees}
+              disabled={loadingMore}
+              className="btn-secondary"
+            >
+              {loadingMore ? 'Loading...' : 'Load more'}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
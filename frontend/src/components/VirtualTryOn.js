@@ -25,6 +25,8 @@ import axios from 'axios';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+const createSessionId = () => `session_${Date.now()}_${Math.random().toString(36).substr(2, 9)}`;
+
 const VirtualTryOn = () => {
   const navigate = useNavigate();
   
@@ -41,6 +43,9 @@ const VirtualTryOn = () => {
   const [blouseStyle, setBlouseStyle] = useState('traditional');
   const [selectedCatalogItem, setSelectedCatalogItem] = useState(null);
   
+  // One session for the whole try-on flow, so later blouse changes keep the same model
+  const [sessionId, setSessionId] = useState(createSessionId);
+  
   // Results - now storing both front and side view results
   const [tryOnResults, setTryOnResults] = useState({
     front: null,
@@ -141,6 +146,19 @@ const VirtualTryOn = () => {
     return sareeBody !== null || selectedCatalogItem !== null;
   };
 
+  // Upload a component once and reuse its asset id for every later try-on
+  const uploadAsset = async (component, setComponent) => {
+    if (!component) return null;
+    if (component.assetId) return component.assetId;
+
+    const formData = new FormData();
+    formData.append('file', component.file);
+    const response = await axios.post(`${API}/assets`, formData);
+    const assetId = response.data.asset_id;
+    setComponent((current) => (current && current.file === component.file ? { ...current, assetId } : current));
+    return assetId;
+  };
+
   // Generate virtual try-on for both front and side views
   const generateTryOn = async () => {
     if (!canGenerateResult()) {
@@ -155,39 +173,42 @@ const VirtualTryOn = () => {
     try {
       const poses = ['front', 'side'];
       const results = {};
+
+      const [bodyAssetId, palluAssetId, borderAssetId] = await Promise.all([
+        uploadAsset(sareeBody, setSareeBody),
+        uploadAsset(sareePallu, setSareePallu),
+        uploadAsset(sareeBorder, setSareeBorder)
+      ]);
+
+      setLoadingMessage('Generating front and side views...');
+
+      // Both poses are rendered by the backend under the same session
+      const requestData = {
+        saree_body_asset_id: bodyAssetId,
+        saree_pallu_asset_id: palluAssetId,
+        saree_border_asset_id: borderAssetId,
+        saree_item_id: selectedCatalogItem?.id || null,
+        poses: poses,
+        blouse_style: blouseStyle,
+        session_id: sessionId  // Add session ID for consistency
+      };
       
-      // Generate a unique session ID to maintain model consistency
-      const sessionId = `session_${Date.now()}_${Math.random().toString(36).substr(2, 9)}`;
-
-      for (let i = 0; i < poses.length; i++) {
-        const pose = poses[i];
-        setLoadingMessage(`Generating ${pose} view... (${i + 1}/2)`);
-
-        // Prepare request data with session ID for consistency
-        const requestData = {
-          saree_body_base64: sareeBody?.base64 || null,
-          saree_pallu_base64: sareePallu?.base64 || null,
-          saree_border_base64: sareeBorder?.base64 || null,
-          saree_item_id: selectedCatalogItem?.id || null,
-          pose_style: pose,
-          blouse_style: blouseStyle,
-          session_id: sessionId  // Add session ID for consistency
-        };
-        
-        const response = await axios.post(`${API}/virtual-tryon`, requestData, {
-          timeout: 120000 // 2 minutes timeout
-        });
+      const response = await axios.post(`${API}/virtual-tryon/batch`, requestData, {
+        timeout: 120000 // 2 minutes timeout
+      });
 
-        if (response.data && response.data.result_image_base64) {
-          results[pose] = {
-            id: response.data.id,
-            image: `data:image/png;base64,${response.data.result_image_base64}`,
-            poseStyle: response.data.pose_style,
-            blouseStyle: response.data.blouse_style
-          };
-        } else {
+      const poseResults = response.data?.results || [];
+      for (const pose of poses) {
+        const poseResult = poseResults.find((result) => result.pose_style === pose);
+        if (!poseResult || !poseResult.result_image_base64) {
           throw new Error(`No result image received for ${pose} view`);
         }
+        results[pose] = {
+          id: poseResult.id,
+          image: `data:image/png;base64,${poseResult.result_image_base64}`,
+          poseStyle: poseResult.pose_style,
+          blouseStyle: poseResult.blouse_style
+        };
       }
 
       setTryOnResults(results);
@@ -244,6 +265,8 @@ const VirtualTryOn = () => {
     setSelectedCatalogItem(null);
     setTryOnResults({ front: null, side: null });
     setError('');
+    // A new saree starts a new session
+    setSessionId(createSessionId());
   };
 
   // Render upload zone
@@ -0,0 +1,55 @@
+"""
+In-process test setup: the app runs against an in-memory MongoDB stand-in and the mock
+provider, configured the same way as backend_benchmark.py
+"""
+
+import os
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).parent.parent
+
+# The server reads its configuration at import time
+SCRATCH_DIR = tempfile.mkdtemp(prefix="saree_tests_")
+os.environ["MONGO_URL"] = "mongodb://localhost:27017"
+os.environ["DB_NAME"] = f"saree_tests_{uuid.uuid4().hex[:8]}"
+os.environ["EMERGENT_LLM_KEY"] = ""
+os.environ["BLOB_STORE_DIR"] = os.path.join(SCRATCH_DIR, "blob_store")
+os.environ["ASSET_STORE_DIR"] = os.path.join(SCRATCH_DIR, "asset_store")
+os.environ["PROFILE_DIR"] = os.path.join(SCRATCH_DIR, "profiles")
+os.environ["RATE_LIMIT_PER_MINUTE"] = "0"
+
+import mongomock_motor
+import motor.motor_asyncio
+
+motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+sys.path.insert(0, str(ROOT_DIR / "backend"))
+
+import server as server_module
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def server():
+    return server_module
+
+
+@pytest.fixture
+def client():
+    """Test client with the startup and shutdown hooks run around it"""
+    with TestClient(server_module.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def run(client):
+    """Run a coroutine on the client's event loop, where the app's own tasks live"""
+    def run_coroutine(coroutine):
+        async def wrapper():
+            return await coroutine
+        return client.portal.call(wrapper)
+    return run_coroutine
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+INVALID_TRYON = {"pose_style": "back", "blouse_style": "modern"}
+
+
+def request_from(peer, forwarded_for=None):
+    headers = [(b"x-forwarded-for", forwarded_for.encode())] if forwarded_for else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 4000)})
+
+
+def test_client_address_ignores_forwarded_for_by_default(server):
+    assert server.TRUSTED_PROXY_HOPS == 0
+    assert server.client_address(request_from("10.0.0.5", "1.2.3.4")) == "10.0.0.5"
+
+
+def test_client_address_believes_only_trusted_hops(server, monkeypatch):
+    monkeypatch.setattr(server, "TRUSTED_PROXY_HOPS", 1)
+    assert server.client_address(request_from("10.0.0.5", "6.6.6.6, 1.2.3.4")) == "1.2.3.4"
+    assert server.client_address(request_from("10.0.0.5")) == "10.0.0.5"
+
+
+def test_rate_limiter_charges_all_buckets_or_none(server):
+    limiter = server.ClientRateLimiter(rate=1 / 60, burst=2, max_clients=100)
+    limiter.check(["ip:a", "user:u"])
+    limiter.check(["ip:b", "user:u"])
+    with pytest.raises(server.AdmissionRejected) as rejected:
+        limiter.check(["ip:c", "user:u"])
+    assert rejected.value.retry_after >= 1
+    # ip:c kept its tokens because the request was refused as a whole
+    limiter.check(["ip:c"])
+    limiter.check(["ip:c"])
+    assert limiter.stats == {"allowed": 4, "rejected": 1}
+
+
+def test_rate_limiter_forgets_least_recent_clients(server):
+    limiter = server.ClientRateLimiter(rate=1 / 60, burst=1, max_clients=2)
+    limiter.check(["ip:a"])
+    limiter.check(["ip:b"])
+    limiter.check(["ip:c"])
+    assert len(limiter._buckets) == 2
+    assert "ip:a" not in limiter._buckets
+
+
+def test_rate_limited_request_gets_429_with_retry_after(server, client, monkeypatch):
+    monkeypatch.setattr(server, "client_rate_limiter", server.ClientRateLimiter(rate=1 / 60, burst=1, max_clients=100))
+    # A spoofed X-Forwarded-For does not move the request to a fresh bucket
+    first = client.post("/api/virtual-tryon", json=INVALID_TRYON, headers={"X-Forwarded-For": "1.1.1.1"})
+    assert first.status_code != 429
+    second = client.post("/api/virtual-tryon", json=INVALID_TRYON, headers={"X-Forwarded-For": "2.2.2.2"})
+    assert second.status_code == 429
+    assert int(second.headers["retry-after"]) >= 1
+    # Reads are never rate limited
+    assert client.get("/api/").status_code == 200
+
+
+def test_full_generation_queue_gets_429(server, client, monkeypatch):
+    admission = server.GenerationAdmission(max_active=1, max_waiting=0, max_wait=1)
+    monkeypatch.setattr(server, "generation_admission", admission)
+    asyncio.run(admission.acquire(1))
+
+    response = client.post("/api/virtual-tryon", json=INVALID_TRYON)
+    assert response.status_code == 429
+    assert "Too many try-ons" in response.json()["detail"]
+    assert admission.stats["rejected_queue_full"] == 1
+
+
+def test_generation_wait_timeout_gets_429(server, client, monkeypatch):
+    admission = server.GenerationAdmission(max_active=1, max_waiting=4, max_wait=0.05)
+    monkeypatch.setattr(server, "generation_admission", admission)
+    asyncio.run(admission.acquire(1))
+
+    response = client.post("/api/virtual-tryon", json=INVALID_TRYON)
+    assert response.status_code == 429
+    assert "Timed out" in response.json()["detail"]
+    assert admission.stats["rejected_wait_timeout"] == 1
+    assert admission.snapshot()["waiting"] == 0
+
+
+def test_released_slot_admits_the_next_waiter(server):
+    async def scenario():
+        admission = server.GenerationAdmission(max_active=1, max_waiting=4, max_wait=1)
+        await admission.acquire(1)
+        waiting = asyncio.ensure_future(admission.acquire(1))
+        await asyncio.sleep(0)
+        assert admission.snapshot()["waiting"] == 1
+        admission.release(1, 0.1)
+        await waiting
+        assert admission.active == 1
+        assert admission.stats["admitted"] == 2
+
+    asyncio.run(scenario())
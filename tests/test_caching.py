@@ -0,0 +1,95 @@
+import asyncio
+import base64
+import textwrap
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+
+def image_bytes(width, height, format="PNG"):
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), (120, 30, 160)).save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def test_bounded_lru_evicts_least_recently_used(server):
+    lru = server.BoundedLRU(2)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    assert lru.get("a") == 1
+    lru.put("c", 3)
+    assert "b" not in lru
+    assert [lru.get("a"), lru.get("c")] == [1, 3]
+    assert lru.evictions == 1
+
+
+def test_bounded_lru_is_bounded_by_size(server):
+    lru = server.BoundedLRU(10, max_size=10, size=len)
+    lru.put("a", "x" * 6)
+    lru.put("b", "x" * 4)
+    lru.put("c", "x" * 3)
+    assert "a" not in lru
+    assert lru.total_size == 7
+    # A value that cannot fit is not stored, and replaces nothing
+    lru.put("d", "x" * 11)
+    assert "d" not in lru
+    assert lru.pop("b") == "xxxx"
+    assert lru.total_size == 3
+
+
+def test_single_flight_shares_one_run(server):
+    async def scenario():
+        flight = server.SingleFlight()
+        calls = []
+        release = asyncio.Event()
+
+        async def load():
+            calls.append(1)
+            await release.wait()
+            return "value"
+
+        first = asyncio.ensure_future(flight.run("key", load))
+        second = asyncio.ensure_future(flight.run("key", load))
+        await asyncio.sleep(0)
+        # A cancelled caller does not cancel the run the other one is waiting on
+        first.cancel()
+        release.set()
+        assert await second == "value"
+        assert first.cancelled()
+        assert calls == [1]
+        await asyncio.sleep(0)
+        assert "key" not in flight
+
+        assert await flight.run("key", load) == "value"
+        assert calls == [1, 1]
+
+    asyncio.run(scenario())
+
+
+def test_line_wrapped_base64_upload_is_accepted(server):
+    data = image_bytes(32, 32)
+    wrapped = "\n".join(textwrap.wrap(base64.b64encode(data).decode(), 76))
+    assert server.input_image_normalizer._decode("body", wrapped) == data
+
+
+def test_invalid_base64_upload_is_rejected(server):
+    png_header = base64.b64encode(image_bytes(8, 8)[:48]).decode()
+    with pytest.raises(server.HTTPException) as error:
+        server.input_image_normalizer._decode("body", png_header + "abc")
+    assert error.value.status_code == 400
+
+
+def test_normalizing_keeps_an_upload_the_jpeg_would_not_shrink(server):
+    # A flat-colour PNG compresses far better than any JPEG of it
+    data = image_bytes(64, 64)
+    assert server.normalize_input_image(data, 1536, 85) == data
+
+
+def test_normalizing_always_downscales_large_uploads(server):
+    data = image_bytes(400, 300)
+    normalized = server.normalize_input_image(data, 100, 85)
+    assert normalized != data
+    with Image.open(BytesIO(normalized)) as image:
+        assert image.format == "JPEG"
+        assert max(image.size) == 100
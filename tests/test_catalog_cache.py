@@ -0,0 +1,83 @@
+import base64
+import uuid
+from io import BytesIO
+
+from PIL import Image
+
+
+def jpeg_base64():
+    buffer = BytesIO()
+    Image.new("RGB", (40, 60), (180, 20, 40)).save(buffer, format="JPEG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def new_saree(color, category="bridal"):
+    return {
+        "name": f"Saree {uuid.uuid4().hex[:6]}", "description": "Silk", "image_base64": jpeg_base64(),
+        "category": category, "color": color, "pattern": "zari",
+    }
+
+
+def listed_ids(response):
+    assert response.status_code == 200
+    return {saree["id"] for saree in response.json()}
+
+
+def test_catalog_write_invalidates_cached_listings(client):
+    before_all = listed_ids(client.get("/api/saree-catalog"))
+    before_category = listed_ids(client.get("/api/saree-catalog/bridal"))
+    # Served from the cache now
+    assert listed_ids(client.get("/api/saree-catalog")) == before_all
+
+    added = client.post("/api/saree-catalog", json=new_saree("ivory")).json()
+
+    assert listed_ids(client.get("/api/saree-catalog")) == before_all | {added["id"]}
+    assert listed_ids(client.get("/api/saree-catalog/bridal")) == before_category | {added["id"]}
+
+
+def test_catalog_write_invalidates_cached_facets(server, client):
+    color = f"teal-{uuid.uuid4().hex[:6]}"
+    client.post("/api/saree-catalog", json=new_saree(color))
+    first = client.get("/api/saree-catalog/search", params={"color": color})
+    assert first.json()["total"] == 1
+    hits = server.catalog_facets.stats["hits"]
+    assert client.get("/api/saree-catalog/search", params={"color": color}).json()["total"] == 1
+    assert server.catalog_facets.stats["hits"] == hits + 1
+
+    client.post("/api/saree-catalog", json=new_saree(color))
+    assert client.get("/api/saree-catalog/search", params={"color": color}).json()["total"] == 2
+
+
+def test_facets_computed_across_a_catalog_write_are_not_cached(server):
+    facets = server.catalog_facets
+    generation = facets.generation
+    facets.invalidate()
+    facets.put(("stale",), {"total": 1}, generation)
+    assert facets.get(("stale",)) is None
+
+
+def test_item_deleted_during_backfill_is_a_404(server, client, run):
+    saree_id = str(uuid.uuid4())
+    run(server.db.saree_catalog.insert_one({"id": saree_id, **new_saree("saffron")}))
+    # Cached before the delete, which bypassed the API and so did not bump the catalog version
+    assert run(server.catalog_cache.get_item(saree_id))
+    run(server.db.saree_catalog.delete_one({"id": saree_id}))
+
+    response = client.get(f"/api/saree-catalog/{saree_id}/image")
+    assert response.status_code == 404
+    assert client.get(f"/api/saree-catalog/{saree_id}/image").status_code == 404
+
+
+def test_legacy_item_is_backfilled_without_invalidating_listings(server, client, run):
+    saree_id = str(uuid.uuid4())
+    run(server.db.saree_catalog.insert_one({"id": saree_id, **new_saree("indigo")}))
+    run(server.catalog_cache.bump())
+    client.get("/api/saree-catalog")
+    invalidations = server.catalog_cache.stats["invalidations"]
+
+    response = client.get(f"/api/saree-catalog/{saree_id}/image")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+    stored = run(server.db.saree_catalog.find_one({"id": saree_id}))
+    assert stored["image_ref"]
+    assert server.catalog_cache.stats["invalidations"] == invalidations
@@ -0,0 +1,86 @@
+import asyncio
+
+
+class FakeChat:
+    created = 0
+
+    def __init__(self):
+        FakeChat.created += 1
+        self.number = FakeChat.created
+
+
+def make_pool(server, **overrides):
+    options = {"max_sessions": 4, "idle_ttl": 60, "lease_wait": 1, "max_turns": 8, **overrides}
+    return server.ChatSessionPool(**options)
+
+
+def test_same_session_requests_take_turns_on_one_chat(server):
+    pool = make_pool(server)
+    order = []
+
+    async def pose(name):
+        async with pool.lease("session", FakeChat) as chat:
+            order.append((name, "start", chat.number))
+            await asyncio.sleep(0.05)
+            order.append((name, "end", chat.number))
+            return chat
+
+    async def main():
+        return await asyncio.gather(pose("front"), pose("side"))
+
+    front, side = asyncio.run(main())
+    assert front is side
+    assert [event[:2] for event in order] == [("front", "start"), ("front", "end"), ("side", "start"), ("side", "end")]
+    assert pool.stats["created"] == 1 and pool.stats["reused"] == 1 and pool.stats["transient"] == 0
+
+
+def test_waiting_past_lease_wait_falls_back_to_transient_chat(server):
+    pool = make_pool(server, lease_wait=0.05)
+
+    async def main():
+        async with pool.lease("session", FakeChat) as held:
+            async with pool.lease("session", FakeChat) as other:
+                return held, other
+
+    held, other = asyncio.run(main())
+    assert held is not other
+    assert pool.stats["transient"] == 1
+
+
+def test_failed_send_discards_chat_and_wakes_waiters_with_fresh_one(server):
+    pool = make_pool(server)
+
+    async def failing():
+        async with pool.lease("session", FakeChat):
+            await asyncio.sleep(0.02)
+            raise RuntimeError("provider error")
+
+    async def waiting():
+        await asyncio.sleep(0.01)
+        async with pool.lease("session", FakeChat) as chat:
+            return chat
+
+    async def main():
+        failed, chat = await asyncio.gather(failing(), waiting(), return_exceptions=True)
+        return failed, chat
+
+    failed, chat = asyncio.run(main())
+    assert isinstance(failed, RuntimeError)
+    assert pool.stats["discarded"] == 1 and pool.stats["created"] == 2
+    assert pool._sessions["session"].chat is chat
+
+
+def test_chat_is_retired_after_max_turns(server):
+    pool = make_pool(server, max_turns=2)
+
+    async def main():
+        chats = []
+        for _ in range(3):
+            async with pool.lease("session", FakeChat) as chat:
+                chats.append(chat)
+        return chats
+
+    first, second, third = asyncio.run(main())
+    assert first is second
+    assert third is not second
+    assert pool.stats["retired"] == 1
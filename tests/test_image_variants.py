@@ -0,0 +1,73 @@
+import base64
+import uuid
+from io import BytesIO
+
+from PIL import Image
+
+
+def png_bytes(width=64, height=96):
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), (200, 40, 90)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def store_tryon(server, run, derivatives=None):
+    """Insert a finished try-on whose image is in the blob store, returning its id"""
+    image_bytes = png_bytes()
+    digest = run(server.blob_store.put(image_bytes))
+    tryon_id = str(uuid.uuid4())
+    run(server.db.virtual_tryons.insert_one({
+        "id": tryon_id,
+        "result_image_ref": digest,
+        "result_content_type": "image/png",
+        "result_derivatives": derivatives,
+        "pose_style": "front",
+        "blouse_style": "modern",
+        "saree_details": {},
+    }))
+    return tryon_id, digest
+
+
+def test_original_is_immutable(server, client, run):
+    tryon_id, digest = store_tryon(server, run)
+    response = client.get(f"/api/tryon/{tryon_id}/image")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == server.IMMUTABLE_CACHE_CONTROL
+    assert response.headers["etag"] == f'"{digest}"'
+
+
+def test_missing_derivative_falls_back_without_immutable_caching(server, client, run):
+    tryon_id, digest = store_tryon(server, run)
+    response = client.get(f"/api/tryon/{tryon_id}/image?size=thumb")
+    assert response.status_code == 200
+    assert response.content == png_bytes()
+    assert response.headers["cache-control"] == server.FALLBACK_CACHE_CONTROL
+    assert response.headers["vary"] == "Accept"
+
+    response = client.get(f"/api/tryon/{tryon_id}/image?size=medium&format=jpeg")
+    assert response.headers["cache-control"] == server.FALLBACK_CACHE_CONTROL
+    assert "vary" not in response.headers
+
+
+def test_rendered_derivative_is_immutable(server, client, run):
+    derivatives = run(server.store_image_derivatives(png_bytes(800, 1200)))
+    tryon_id, _ = store_tryon(server, run, derivatives)
+    response = client.get(f"/api/tryon/{tryon_id}/image?size=thumb", headers={"Accept": "image/webp"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert response.headers["cache-control"] == server.IMMUTABLE_CACHE_CONTROL
+    assert response.headers["vary"] == "Accept"
+    assert max(Image.open(BytesIO(response.content)).size) == 256
+
+
+def test_undecodable_catalog_image_thumb_is_not_immutable(server, client, run):
+    saree_id = str(uuid.uuid4())
+    digest = run(server.blob_store.put(b"not an image"))
+    run(server.db.saree_catalog.insert_one({
+        "id": saree_id, "name": "Broken", "description": "d", "category": "casual", "color": "red",
+        "pattern": "plain", "image_base64": base64.b64encode(b"not an image").decode(),
+        "image_ref": digest, "image_content_type": "image/jpeg", "image_derivatives": None,
+    }))
+    response = client.get(f"/api/saree-catalog/{saree_id}/image?size=thumb")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == server.FALLBACK_CACHE_CONTROL
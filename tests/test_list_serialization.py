@@ -0,0 +1,97 @@
+import json
+import uuid
+from datetime import datetime
+
+import pytest
+from pydantic import ValidationError
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+NDJSON = "application/x-ndjson"
+
+
+def status_documents():
+    return [
+        {"id": str(uuid.uuid4()), "client_name": "plain", "timestamp": datetime(2024, 5, 1, 12, 30)},
+        {"id": str(uuid.uuid4()), "client_name": "Zoë – साड़ी \"quoted\"", "timestamp": datetime(2024, 5, 1, 12, 30, 5, 123000)},
+        {"id": str(uuid.uuid4()), "client_name": "emoji 🪡\t<tab>", "timestamp": datetime(2023, 1, 2, 3, 4, 5, 6000)},
+    ]
+
+
+def saree_documents():
+    return [
+        {
+            "id": str(uuid.uuid4()), "name": f"Banarasi {index}", "description": "Silk with zari\nborder",
+            "image_base64": "iVBORw0KGgo=", "category": "bridal", "color": "red", "pattern": "zari",
+            "timestamp": datetime(2024, 2, 3, 4, 5, 6, index * 1000), "image_ref": "extra field, not in the model",
+        }
+        for index in range(7)
+    ]
+
+
+def fastapi_body(model, documents):
+    """What FastAPI renders for a ``List[model]`` response built from the documents"""
+    return JSONResponse(jsonable_encoder([model(**document) for document in documents])).body
+
+
+def stored(server, run, documents):
+    collection = server.db[f"serialization_{uuid.uuid4().hex[:8]}"]
+    if documents:
+        run(collection.insert_many([dict(document) for document in documents]))
+    return collection
+
+
+def render(server, run, collection, model, ndjson=False):
+    async def collect():
+        cursor = collection.find({}, {"_id": 0})
+        return b"".join([chunk async for chunk in server.encode_documents(cursor, model, ndjson=ndjson)])
+    return run(collect())
+
+
+@pytest.mark.parametrize("batch_size", [1, 3, 100])
+@pytest.mark.parametrize("model_name, make_documents", [
+    ("StatusCheck", status_documents), ("SareeItem", saree_documents), ("SareeItem", list),
+])
+def test_json_array_matches_fastapi_rendering(server, client, run, monkeypatch, batch_size, model_name, make_documents):
+    monkeypatch.setattr(server, "LIST_BATCH_SIZE", batch_size)
+    model = getattr(server, model_name)
+    collection = stored(server, run, make_documents())
+    documents = run(collection.find({}, {"_id": 0}).to_list(None))
+
+    assert render(server, run, collection, model) == fastapi_body(model, documents)
+
+
+def test_document_missing_a_required_field_fails_like_the_model(server):
+    with pytest.raises(ValidationError):
+        server.model_document(server.StatusCheck, {"id": "legacy", "timestamp": datetime(2024, 1, 1)})
+
+
+@pytest.mark.parametrize("batch_size", [1, 3, 100])
+def test_ndjson_has_one_document_per_line(server, client, run, monkeypatch, batch_size):
+    monkeypatch.setattr(server, "LIST_BATCH_SIZE", batch_size)
+    collection = stored(server, run, saree_documents())
+    documents = run(collection.find({}, {"_id": 0}).to_list(None))
+
+    body = render(server, run, collection, server.SareeItem, ndjson=True)
+    assert body.endswith(b"\n")
+    lines = body.split(b"\n")[:-1]
+    assert [json.loads(line) for line in lines] == json.loads(fastapi_body(server.SareeItem, documents))
+
+
+def test_empty_ndjson_body_is_empty(server, client, run):
+    assert render(server, run, stored(server, run, []), server.SareeItem, ndjson=True) == b""
+    assert render(server, run, stored(server, run, []), server.SareeItem) == b"[]"
+
+
+@pytest.mark.parametrize("stream_threshold", [10, 1024 * 1024])
+def test_status_endpoint_negotiates_ndjson(server, client, monkeypatch, stream_threshold):
+    # A tiny threshold sends the same bytes through the streaming path
+    monkeypatch.setattr(server, "LIST_STREAM_THRESHOLD", stream_threshold)
+    for name in ("ndjson-a", "ndjson-b"):
+        client.post("/api/status", json={"client_name": name})
+
+    as_json = client.get("/api/status")
+    assert as_json.headers["content-type"] == "application/json"
+    as_ndjson = client.get("/api/status", headers={"Accept": NDJSON})
+    assert as_ndjson.headers["content-type"] == NDJSON
+    assert [json.loads(line) for line in as_ndjson.text.splitlines()] == as_json.json()
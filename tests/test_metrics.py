@@ -0,0 +1,15 @@
+import logging
+
+
+def test_every_metric_collects(client, caplog):
+    with caplog.at_level(logging.ERROR):
+        response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "Failed to collect" not in caplog.text
+    assert 'catalog_cache_events_total{event="hits"}' in response.text
+    assert 'input_image_bytes_total{stage="normalized"}' in response.text
+
+
+def test_stats_routes_are_folded_into_metrics(client):
+    for path in ("cache/stats", "admission/stats", "profiling/stats", "providers/sessions", "saree-catalog/cache/stats"):
+        assert client.get(f"/api/{path}").status_code in (404, 405)
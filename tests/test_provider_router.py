@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+
+
+def make_route(server, name, generate, timeout=5, failure_threshold=2):
+    breaker = server.CircuitBreaker(failure_threshold=failure_threshold, cooldown_seconds=60)
+    return server.ProviderRoute(name, generate, timeout=timeout, max_concurrency=4, breaker=breaker)
+
+
+def answer(image, delay=0):
+    async def generate(context):
+        await asyncio.sleep(delay)
+        return image
+    return generate
+
+
+async def fail(context):
+    raise RuntimeError("provider error")
+
+
+def generate_with(router):
+    return asyncio.run(router.generate(None))
+
+
+def test_breaker_opens_probes_once_and_closes(server):
+    breaker = server.CircuitBreaker(failure_threshold=2, cooldown_seconds=60)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    # After the cool-down exactly one probe is let through
+    breaker.opened_at -= 60
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+
+def test_failed_probe_reopens_breaker(server):
+    breaker = server.CircuitBreaker(failure_threshold=2, cooldown_seconds=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.opened_at -= 60
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_open_breaker_routes_to_fallback(server):
+    primary = make_route(server, "primary", answer("primary"))
+    fallback = make_route(server, "fallback", answer("fallback"))
+    primary.breaker.record_failure()
+    primary.breaker.record_failure()
+
+    router = server.ProviderRouter([primary, fallback], hedge_after=0)
+    assert generate_with(router) == "fallback"
+    assert primary.stats["skipped"] == 1
+    assert primary.stats["calls"] == 0
+
+
+def test_half_open_probe_success_closes_breaker(server):
+    primary = make_route(server, "primary", answer("primary"))
+    fallback = make_route(server, "fallback", answer("fallback"))
+    primary.breaker.record_failure()
+    primary.breaker.record_failure()
+    primary.breaker.opened_at -= 60
+
+    router = server.ProviderRouter([primary, fallback], hedge_after=0)
+    assert generate_with(router) == "primary"
+    assert primary.breaker.state == "closed"
+    assert fallback.stats["calls"] == 0
+
+
+def test_failure_falls_back_and_counts_against_breaker(server):
+    primary = make_route(server, "primary", fail)
+    fallback = make_route(server, "fallback", answer("fallback"))
+
+    router = server.ProviderRouter([primary, fallback], hedge_after=0)
+    assert generate_with(router) == "fallback"
+    assert primary.stats["failures"] == 1
+    assert primary.breaker.failures == 1
+
+
+def test_timeout_falls_back(server):
+    primary = make_route(server, "primary", answer("primary", delay=1), timeout=0.05)
+    fallback = make_route(server, "fallback", answer("fallback"))
+
+    router = server.ProviderRouter([primary, fallback], hedge_after=0)
+    assert generate_with(router) == "fallback"
+    assert primary.stats["timeouts"] == 1
+    assert primary.breaker.failures == 1
+
+
+def test_hedged_call_wins_and_cancels_the_slow_provider(server):
+    primary = make_route(server, "primary", answer("primary", delay=1))
+    fallback = make_route(server, "fallback", answer("fallback", delay=0.01))
+
+    async def scenario():
+        result = await router.generate(None)
+        # Let the cancelled attempt record its outcome
+        await asyncio.sleep(0)
+        return result
+
+    router = server.ProviderRouter([primary, fallback], hedge_after=0.05)
+    assert asyncio.run(scenario()) == "fallback"
+    assert primary.stats["cancelled"] == 1
+    # Losing a hedge is not a provider failure
+    assert primary.breaker.failures == 0
+    assert primary.breaker.state == "closed"
+
+
+def test_hedge_keeps_first_answer_when_it_arrives_first(server):
+    primary = make_route(server, "primary", answer("primary", delay=0.1))
+    fallback = make_route(server, "fallback", answer("fallback", delay=1))
+
+    router = server.ProviderRouter([primary, fallback], hedge_after=0.02)
+    assert generate_with(router) == "primary"
+    assert fallback.stats["calls"] == 1
+
+
+def test_every_provider_failing_is_a_500(server):
+    router = server.ProviderRouter(
+        [make_route(server, "primary", fail), make_route(server, "fallback", fail)], hedge_after=0
+    )
+    with pytest.raises(server.HTTPException) as error:
+        generate_with(router)
+    assert error.value.status_code == 500
+    assert "primary: provider error" in error.value.detail
+    assert "fallback: provider error" in error.value.detail
+
+
+def test_no_provider_available_is_a_500(server):
+    primary = make_route(server, "primary", answer("primary"), failure_threshold=1)
+    primary.breaker.record_failure()
+
+    router = server.ProviderRouter([primary], hedge_after=0)
+    with pytest.raises(server.HTTPException) as error:
+        generate_with(router)
+    assert "no provider available" in error.value.detail
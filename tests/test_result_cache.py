@@ -0,0 +1,37 @@
+import uuid
+
+
+def make_cache(server, memory_bytes, memory_items=1024):
+    return server.TryOnResultCache(
+        server.db[f"tryon_cache_{uuid.uuid4().hex[:8]}"],
+        memory_items=memory_items, memory_bytes=memory_bytes, max_entries=100, ttl_seconds=3600,
+    )
+
+
+def test_memory_tier_is_bounded_by_bytes(server, client, run):
+    cache = make_cache(server, memory_bytes=1000)
+    for key in ("a", "b", "c"):
+        run(cache.put(key, key * 400))
+
+    snapshot = cache.snapshot()
+    assert snapshot["memory_entries"] == 2
+    assert snapshot["memory_bytes"] == 800
+    assert cache.stats["memory_evictions"] == 1
+    # The evicted entry is still served from the persistent tier
+    assert run(cache.get("a")) == "a" * 400
+    assert cache.stats["persistent_hits"] == 1
+
+
+def test_image_larger_than_the_memory_tier_is_only_persisted(server, client, run):
+    cache = make_cache(server, memory_bytes=100)
+    image_base64 = "QUJD" * 26
+    run(cache.put("big", image_base64))
+    assert cache.snapshot()["memory_entries"] == 0
+    assert run(cache.get("big")) == image_base64
+
+
+def test_memory_tier_entry_cap_is_a_backstop(server, client, run):
+    cache = make_cache(server, memory_bytes=10_000, memory_items=2)
+    for key in ("a", "b", "c"):
+        run(cache.put(key, key * 4))
+    assert cache.snapshot()["memory_entries"] == 2
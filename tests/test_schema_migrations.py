@@ -0,0 +1,92 @@
+import base64
+import uuid
+
+import pytest
+
+
+def test_inline_images_move_to_blob_store_and_corrupt_ones_are_marked(server, client, run):
+    good_id, bad_id = str(uuid.uuid4()), str(uuid.uuid4())
+    image_bytes = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+    run(server.db.virtual_tryons.insert_many([
+        {"id": good_id, "result_image_base64": base64.b64encode(image_bytes).decode()},
+        {"id": bad_id, "result_image_base64": "abc"},
+    ]))
+
+    assert run(server.migrate_inline_tryon_images()) == 1
+    good = run(server.db.virtual_tryons.find_one({"id": good_id}))
+    assert "result_image_base64" not in good
+    assert run(server.blob_store.get(good["result_image_ref"])) == image_bytes
+    assert good["result_content_type"] == "image/png"
+
+    bad = run(server.db.virtual_tryons.find_one({"id": bad_id}))
+    assert bad["result_image_base64"] == "abc"
+    assert bad["result_image_migration_error"]
+
+    # Marked documents are not picked up again
+    assert run(server.migrate_inline_tryon_images()) == 0
+
+
+def test_failed_migration_is_recorded_and_retried(server, client, run, monkeypatch):
+    calls = []
+    attempts = {"flaky": 0}
+
+    async def flaky():
+        attempts["flaky"] += 1
+        if attempts["flaky"] == 1:
+            raise OSError("disk full")
+        calls.append("flaky")
+
+    async def later():
+        calls.append("later")
+
+    first = 9001
+    monkeypatch.setattr(server, "SCHEMA_MIGRATIONS", [
+        (first, "Flaky", False, flaky),
+        (first + 1, "Builds on the flaky one", False, later),
+    ])
+
+    with pytest.raises(RuntimeError, match=f"Schema migration {first}"):
+        run(server.apply_schema_migrations())
+    assert calls == []
+    health = client.get("/api/health").json()
+    assert health["status"] == "degraded"
+    assert health["schema"]["failed"] == [{"version": first, "error": "OSError: disk full"}]
+    assert health["schema"]["pending"] == [first, first + 1]
+
+    run(server.apply_schema_migrations())
+    assert calls == ["flaky", "later"]
+    health = client.get("/api/health").json()
+    assert health["status"] == "ok"
+    assert health["schema"]["version"] == first + 1
+    assert health["schema"]["pending"] == []
+
+
+class FakeQuery:
+    def __init__(self, winning_plan):
+        self.winning_plan = winning_plan
+
+    async def explain(self):
+        return {"queryPlanner": {"winningPlan": self.winning_plan}}
+
+
+INDEXED_PLAN = {"stage": "LIMIT", "inputStage": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}}
+SCAN_PLAN = {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}
+
+
+def test_plan_stages_walks_nested_plans(server):
+    plan = {"stage": "OR", "inputStages": [{"stage": "IXSCAN"}, {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}]}
+    assert server.plan_stages(plan) == ["OR", "IXSCAN", "FETCH", "IXSCAN"]
+
+
+def test_verify_query_plans_reports_indexed_queries(server, client, run, monkeypatch):
+    monkeypatch.setattr(server, "HOT_QUERIES", {"catalog.page": lambda: FakeQuery(INDEXED_PLAN)})
+    assert run(server.verify_query_plans()) == {"catalog.page": ["LIMIT", "FETCH", "IXSCAN"]}
+
+
+def test_verify_query_plans_rejects_collection_scans(server, client, run, monkeypatch):
+    monkeypatch.setattr(server, "HOT_QUERIES", {
+        "catalog.page": lambda: FakeQuery(INDEXED_PLAN),
+        "catalog.unindexed": lambda: FakeQuery(SCAN_PLAN),
+    })
+    with pytest.raises(RuntimeError, match="catalog.unindexed"):
+        run(server.verify_query_plans())
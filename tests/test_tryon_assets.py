@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from PIL import Image
+
+
+def png_bytes():
+    buffer = BytesIO()
+    Image.new("RGB", (48, 48), (30, 120, 60)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def expire(server, run, asset_id):
+    run(server.tryon_assets.collection.update_one(
+        {"id": asset_id},
+        {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}}
+    ))
+
+
+class CreateDuring:
+    """Collection wrapper that uploads the same image again around one of cleanup's steps"""
+
+    def __init__(self, collection, store, data, method, run_create, after):
+        self._collection = collection
+        self._store = store
+        self._data = data
+        self._method = method
+        self._run_create = run_create
+        self._after = after
+        self.created = None
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if name != self._method:
+            return attribute
+
+        async def wrapped(query, *args, **kwargs):
+            if self.created is not None or not self._run_create(query, *args):
+                return await attribute(query, *args, **kwargs)
+            if not self._after:
+                self.created = await self._store.create(self._data)
+            result = await attribute(query, *args, **kwargs)
+            if self._after:
+                self.created = await self._store.create(self._data)
+            return result
+        return wrapped
+
+
+def assert_cleanup_keeps_revived_asset(server, client, run, monkeypatch, method, run_create, after):
+    store = server.tryon_assets
+    data = png_bytes()
+    asset_id = run(store.create(data))["asset_id"]
+    expire(server, run, asset_id)
+
+    wrapper = CreateDuring(store.collection, store, data, method, run_create, after)
+    monkeypatch.setattr(store, "collection", wrapper)
+    assert run(store.cleanup()) == 0
+    monkeypatch.undo()
+
+    assert wrapper.created["asset_id"] == asset_id
+    assert client.get(f"/api/assets/{asset_id}").status_code == 200
+    assert run(store.blobs.get(asset_id))
+    assert list(store.blobs.root.glob("**/*.deleted")) == []
+
+
+def test_create_after_cleanup_claims_the_record(server, client, run, monkeypatch):
+    # The re-upload rewrites the blob before cleanup moves it aside, so cleanup must put it back
+    assert_cleanup_keeps_revived_asset(
+        server, client, run, monkeypatch, "update_one",
+        lambda query, update: "deleting" in update.get("$set", {}), after=True,
+    )
+
+
+def test_create_before_cleanup_deletes_the_record(server, client, run, monkeypatch):
+    assert_cleanup_keeps_revived_asset(
+        server, client, run, monkeypatch, "delete_one",
+        lambda query: "deleting" in query, after=False,
+    )
+
+
+def test_cleanup_removes_expired_asset(server, client, run):
+    store = server.tryon_assets
+    asset_id = run(store.create(png_bytes()))["asset_id"]
+    expire(server, run, asset_id)
+
+    assert run(store.cleanup()) == 1
+    assert client.get(f"/api/assets/{asset_id}").status_code == 404
+    assert not store.blobs.path_for(asset_id).exists()